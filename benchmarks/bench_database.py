@@ -0,0 +1,65 @@
+"""Time Database reads through rust_core against the Python fallback.
+
+    python benchmarks/bench_database.py --entries 5000 --rounds 20
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import Database, RUST_AVAILABLE  # noqa: E402
+
+
+def populate(db: Database, entries: int):
+    db.add_category('ssh')
+    db.set_setting('theme', 'dark')
+    db.bulk_upsert({
+        'category': ('tokens', 'apis', 'ssh')[i % 3],
+        'provider': f'provider{i % 50}',
+        'config_name': f'config{i}',
+        'info': {'index': i, 'tags': ['bench', str(i % 7)]},
+        'blob': os.urandom(64),
+        'favorite': i % 11 == 0,
+        'notes': f'note {i}' if i % 2 else None,
+        'expires_at': f'2030-01-{i % 28 + 1:02d}T00:00:00' if i % 5 == 0 else None,
+    } for i in range(entries))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=5000, help='Rows to populate the scratch vault with')
+    parser.add_argument('--rounds', type=int, default=20, help='Timed calls per method and backend')
+    args = parser.parse_args()
+    if not RUST_AVAILABLE:
+        sys.exit('rust_core is not available; build it with `maturin develop` first')
+
+    os.chdir(tempfile.mkdtemp(prefix='sequential-bench-'))
+    db = Database(cache_size=0)
+    populate(db, args.entries)
+    calls = {
+        'get_blob_entry': lambda: db.get_blob_entry('apis', 'provider1', 'config1'),
+        'get_blob_bytes': lambda: db.get_blob_bytes('apis', 'provider1', 'config1'),
+        'list_categories': db.list_categories,
+        'get_setting': lambda: db.get_setting('theme'),
+        'get_all_entries': db.get_all_entries,
+        'get_all_entries[tokens]': lambda: db.get_all_entries('tokens'),
+    }
+    for name, call in calls.items():
+        timings = {}
+        for use_rust in (False, True):
+            db._use_rust = use_rust
+            call()
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                call()
+            timings[use_rust] = (time.perf_counter() - start) / args.rounds
+        print(f"{name:26} python {timings[False] * 1000:9.3f} ms  rust {timings[True] * 1000:9.3f} ms  "
+              f"x{timings[False] / max(timings[True], 1e-9):5.2f}")
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,9 @@
 from .database import Database
 from .security import EncryptionManager
 from .secure_memory import SecureMemory, secure_erase, allocate_secure_bytes
-from .scanner import scan_text_for_secrets, scan_files
+from .scanner import (scan_text_for_secrets, scan_files, scan_file_chunked, scan_directory, iter_scan_text,
+                      iter_scan_files, SecretHit)
+from .git_history import scan_git_history
 from .crypto_advanced import AdvancedCrypto
 from .validators import (
     validate_discord_token,
@@ -19,6 +21,12 @@ __all__ = [
     "allocate_secure_bytes",
     "scan_text_for_secrets",
     "scan_files",
+    "scan_file_chunked",
+    "scan_directory",
+    "iter_scan_text",
+    "iter_scan_files",
+    "SecretHit",
+    "scan_git_history",
     "AdvancedCrypto",
     "validate_discord_token",
     "validate_github_token",
@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import base64
+import signal
+import socket
+import struct
+import logging
+import threading
+import socketserver
+from typing import List, Optional
+
+logger = logging.getLogger('sequential.agent')
+
+SOCKET_ENV = 'SEQ_AGENT_SOCK'
+DEFAULT_SOCKET = os.path.join('.sequential', 'agent.sock')
+DEFAULT_IDLE_TIMEOUT = 15 * 60
+LOCK_SIGNALS = ('SIGHUP', 'SIGINT', 'SIGTERM', 'SIGUSR1')
+
+
+def socket_path() -> str:
+    return os.environ.get(SOCKET_ENV) or DEFAULT_SOCKET
+
+
+def lock_running_agent(path: Optional[str] = None) -> bool:
+    """Lock the agent at `path`; False if there is none, ConnectionError if it cannot be locked.
+
+    Callers rotating the master key use this first: an agent left running would keep
+    sealing new secrets under the old key, and those could not be opened afterwards.
+    """
+    path = path or socket_path()
+    if not os.path.exists(path):
+        return False
+    client = AgentClient.connect(path)
+    if client is None:
+        raise ConnectionError(f'An agent socket exists at {path} but nothing answers on it; '
+                              'stop the agent or remove the socket')
+    try:
+        client.lock()
+    except (OSError, ValueError) as e:
+        raise ConnectionError(f'Could not lock the agent at {path}: {e}')
+    return True
+
+
+def _peer_uid(sock: socket.socket) -> Optional[int]:
+    """UID of the process on the other end of a Unix socket, where the platform reports it."""
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    return struct.unpack('3i', creds)[1]
+
+
+class _AgentHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        agent = self.server.agent
+        uid = _peer_uid(self.request)
+        if uid is not None and uid != os.getuid():
+            logger.warning('Rejected agent connection from uid %s', uid)
+            return
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                reply = agent.dispatch(json.loads(line))
+            except Exception as e:
+                reply = {'ok': False, 'error': str(e)}
+            self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class _AgentServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class AgentServer:
+    """Holds an unlocked EncryptionManager and serves encrypt/decrypt over a Unix socket.
+
+    The socket is created mode 0600 and, where the OS reports peer credentials,
+    connections from other users are refused. The key is wiped and the agent exits
+    after `idle_timeout` seconds without a request, on a `lock` request, or on
+    SIGHUP/SIGINT/SIGTERM/SIGUSR1.
+
+    Protocol: one JSON object per line in each direction. Requests are
+    {"op": "encrypt", "plaintext": str, "provider": str|null}, {"op": "decrypt", "ciphertext": base64},
+    their list forms encrypt_many/decrypt_many ("plaintexts", "ciphertexts"),
+    {"op": "ping"} and {"op": "lock"}; replies carry "ok" plus either the result
+    or "error".
+    """
+
+    def __init__(self, encryption, path: Optional[str] = None, idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        self.encryption = encryption
+        self.path = path or socket_path()
+        self.idle_timeout = idle_timeout
+        self.last_activity = time.monotonic()
+        self._stop = threading.Event()
+        self._server = None
+
+    def dispatch(self, request: dict) -> dict:
+        self.last_activity = time.monotonic()
+        if self._stop.is_set():
+            # locking: nothing more may be sealed with a key that is about to be wiped
+            return {'ok': False, 'error': 'agent is locked'}
+        op = request.get('op')
+        if op == 'encrypt':
+            cipher = self.encryption.encrypt(request['plaintext'], provider=request.get('provider'))
+            return {'ok': True, 'ciphertext': base64.b64encode(cipher).decode('ascii')}
+        if op == 'decrypt':
+            plain = self.encryption.decrypt(base64.b64decode(request['ciphertext']))
+            return {'ok': True, 'plaintext': plain}
+        if op == 'encrypt_many':
+            ciphers = self.encryption.encrypt_many(request['plaintexts'], providers=request.get('providers'))
+            return {'ok': True, 'ciphertexts': [base64.b64encode(c).decode('ascii') for c in ciphers]}
+        if op == 'decrypt_many':
+            blobs = [base64.b64decode(c) for c in request['ciphertexts']]
+            return {'ok': True, 'plaintexts': self.encryption.decrypt_many(blobs, strict=request.get('strict', True))}
+        if op == 'ping':
+            return {'ok': True, 'pid': os.getpid(), 'idle_timeout': self.idle_timeout}
+        if op == 'lock':
+            self._stop.set()
+            return {'ok': True}
+        return {'ok': False, 'error': f'unknown op {op!r}'}
+
+    def bind(self):
+        """Create the listening socket; call before daemonizing so errors reach the caller."""
+        if os.path.exists(self.path):
+            if AgentClient(self.path).ping():
+                raise RuntimeError(f'An agent is already listening on {self.path}')
+            os.remove(self.path)
+        old_umask = os.umask(0o177)
+        try:
+            self._server = _AgentServer(self.path, _AgentHandler)
+        finally:
+            os.umask(old_umask)
+        self._server.agent = self
+
+    def serve(self):
+        """Serve until locked, idle or signalled, then wipe the key and remove the socket."""
+        if self._server is None:
+            self.bind()
+        for name in LOCK_SIGNALS:
+            if hasattr(signal, name):
+                signal.signal(getattr(signal, name), lambda signum, frame: self._stop.set())
+        thread = threading.Thread(target=self._server.serve_forever, name='seq-agent', daemon=True)
+        thread.start()
+        logger.info('Agent listening on %s', self.path)
+        try:
+            while not self._stop.is_set():
+                remaining = self.idle_timeout - (time.monotonic() - self.last_activity)
+                if remaining <= 0:
+                    logger.info('Agent idle for %ds, locking', self.idle_timeout)
+                    break
+                self._stop.wait(min(remaining, 1.0))
+        finally:
+            self._server.shutdown()
+            self._server.server_close()
+            self.encryption.lock()
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+class AgentClient:
+    """Drop-in for EncryptionManager.encrypt/decrypt that forwards to a running agent."""
+
+    def __init__(self, path: Optional[str] = None, timeout: float = 30.0):
+        self.path = path or socket_path()
+        self.timeout = timeout
+        self._sock = None
+        self._file = None
+
+    @classmethod
+    def connect(cls, path: Optional[str] = None) -> Optional['AgentClient']:
+        """A client for the agent at `path`, or None when no agent answers there."""
+        client = cls(path)
+        return client if client.ping() else None
+
+    def _call(self, request: dict) -> dict:
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            self._sock, self._file = sock, sock.makefile('rwb')
+        self._file.write(json.dumps(request).encode('utf-8') + b'\n')
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            self.close()
+            raise ConnectionError('Agent closed the connection')
+        reply = json.loads(line)
+        if not reply.get('ok'):
+            raise ValueError(reply.get('error', 'agent request failed'))
+        return reply
+
+    def ping(self) -> bool:
+        try:
+            self._call({'op': 'ping'})
+            return True
+        except (OSError, ValueError):
+            self.close()
+            return False
+
+    def encrypt(self, plaintext: str, provider: Optional[str] = None) -> bytes:
+        reply = self._call({'op': 'encrypt', 'plaintext': plaintext, 'provider': provider})
+        return base64.b64decode(reply['ciphertext'])
+
+    def decrypt(self, ciphertext: bytes) -> str:
+        return self._call({'op': 'decrypt', 'ciphertext': base64.b64encode(bytes(ciphertext)).decode('ascii')})['plaintext']
+
+    def encrypt_many(self, plaintexts, providers=None) -> List[bytes]:
+        reply = self._call({'op': 'encrypt_many', 'plaintexts': list(plaintexts),
+                            'providers': None if providers is None else list(providers)})
+        return [base64.b64decode(c) for c in reply['ciphertexts']]
+
+    def decrypt_many(self, ciphertexts, strict: bool = True) -> List[Optional[str]]:
+        blobs = [base64.b64encode(bytes(c)).decode('ascii') for c in ciphertexts]
+        return self._call({'op': 'decrypt_many', 'ciphertexts': blobs, 'strict': strict})['plaintexts']
+
+    def lock(self):
+        self._call({'op': 'lock'})
+        self.close()
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._file.close()
+                self._sock.close()
+            finally:
+                self._sock = self._file = None
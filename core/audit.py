@@ -1,12 +1,18 @@
 import os
 import json
+import base64
+import binascii
 from datetime import datetime
 from typing import Dict, Any
+from core.security import EncryptionManager
 
 
 class AuditLogger:
     """Append-only encrypted audit log. Each entry is a JSON object stored on its own line,
     encrypted with the master key via EncryptionManager passed to constructor.
+
+    Lines hold base64 of the ciphertext, since binary AES-GCM output can contain
+    newlines; older Fernet lines are stored as the token itself.
     """
 
     BASE = '.sequential'
@@ -22,20 +28,25 @@ class AuditLogger:
         raw = json.dumps(entry).encode('utf-8')
         cipher = self.enc.encrypt(raw.decode('utf-8'))
         with open(self.LOG_FILE, 'ab') as f:
-            f.write(cipher + b"\n")
+            f.write(base64.b64encode(cipher) + b"\n")
 
     def read_recent(self, limit: int = 200):
         if not os.path.exists(self.LOG_FILE):
             return []
-        out = []
         with open(self.LOG_FILE, 'rb') as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    plain = self.enc.decrypt(line)
-                    out.append(json.loads(plain))
-                except Exception:
-                    continue
+            lines = [line.strip() for line in f if line.strip()]
+        blobs = []
+        for line in lines:
+            try:
+                blobs.append(line if line.startswith(EncryptionManager.FERNET_PREFIX) else base64.b64decode(line, validate=True))
+            except binascii.Error:
+                continue
+        out = []
+        for plain in self.enc.decrypt_many(blobs, strict=False):
+            if plain is None:
+                continue
+            try:
+                out.append(json.loads(plain))
+            except Exception:
+                continue
         return out[-limit:]
\ No newline at end of file
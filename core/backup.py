@@ -21,6 +21,8 @@ class BackupManager:
         tmp = os.path.join(self.BACKUP_DIR, f'backup_{ts}.zip')
         with zipfile.ZipFile(tmp, 'w', zipfile.ZIP_DEFLATED) as zf:
             # include sqlite and json
+            self.db.checkpoint()
+            self.db.compact()
             if os.path.exists(self.db.sqlite_path):
                 zf.write(self.db.sqlite_path, arcname=os.path.basename(self.db.sqlite_path))
             if os.path.exists(self.db.json_path):
@@ -28,7 +30,13 @@ class BackupManager:
             # include .sequential files
             for root, dirs, files in os.walk('.sequential'):
                 for f in files:
+                    # derived data, rebuilt by the next scan
+                    if f.startswith('scan_cache.db'):
+                        continue
                     path = os.path.join(root, f)
+                    # e.g. the agent's socket, which cannot be archived
+                    if not os.path.isfile(path):
+                        continue
                     zf.write(path)
         # encrypt zip
         with open(tmp, 'rb') as f:
@@ -53,7 +61,10 @@ class BackupManager:
         tmp = backup_path + '.tmp.zip'
         with open(tmp, 'wb') as f:
             f.write(raw)
+        # release pooled sqlite handles before the database file is replaced
+        self.db.close()
         with zipfile.ZipFile(tmp, 'r') as zf:
             zf.extractall('.')
         os.remove(tmp)
+        self.db.reload()
         return backup_path
\ No newline at end of file
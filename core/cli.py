@@ -1,11 +1,43 @@
+import os
+import sys
 import argparse
 import json
 import base64
+from core.agent import AgentClient, AgentServer, DEFAULT_IDLE_TIMEOUT, SOCKET_ENV, lock_running_agent
 from core.database import Database
 from core.security import EncryptionManager
 from core.configs import ConfigManager
 from core.migration import migrate_filesystem_to_db
 from core.backup import BackupManager
+from core.rotation import EnvelopeUpgrader, MasterKeyRotation
+from core.crypto_advanced import ProviderKeyring
+from core.kdf import calibrate
+
+
+def _unlock(db):
+    """A freshly unlocked EncryptionManager using the database's provider data keys."""
+    enc = EncryptionManager(None)
+    try:
+        enc.use_keyring(ProviderKeyring.for_manager(db, enc))
+    except ValueError as e:
+        enc.lock()
+        sys.exit(f'{e}; is the master password correct?')
+    return enc
+
+
+def _encryption(db):
+    """The running agent if one answers, otherwise a freshly unlocked EncryptionManager."""
+    return AgentClient.connect() or _unlock(db)
+
+
+def _lock_agent():
+    """Lock the running agent, if there is one; exits if it cannot be reached and locked."""
+    try:
+        locked = lock_running_agent()
+    except ConnectionError as e:
+        sys.exit(f'{e} before rotating')
+    if locked:
+        print('Locked the running agent; start it again once the rotation is done', file=sys.stderr)
 
 
 def main():
@@ -33,27 +65,92 @@ def main():
     rotate = sub.add_parser('rotate-master')
     rotate.add_argument('old')
     rotate.add_argument('new')
+    rotate.add_argument('--calibrate', action='store_true', help='Re-tune KDF costs for this machine')
+    rotate.add_argument('--target-ms', type=int, default=500, help='Key derivation time to calibrate for')
+    calib = sub.add_parser('calibrate', help='Show the KDF costs that fit a derivation time on this machine')
+    calib.add_argument('--target-ms', type=int, default=500)
+    sub.add_parser('upgrade', help='Re-encrypt legacy blobs into the current envelope format')
+    agent = sub.add_parser('agent', help='Unlock once and serve encrypt/decrypt to later seq commands')
+    agent.add_argument('--timeout', type=float, default=DEFAULT_IDLE_TIMEOUT, help='Idle seconds before locking')
+    agent.add_argument('--foreground', action='store_true', help='Do not detach from the terminal')
+    sub.add_parser('lock', help='Wipe the key held by a running agent')
 
     args = parser.parse_args()
-    db = Database()
-    enc = EncryptionManager(None)
-    cfg = ConfigManager(db, enc)
-    backup = BackupManager(enc, db)
 
+    if args.cmd == 'agent':
+        db = Database()
+        server = AgentServer(_unlock(db), idle_timeout=args.timeout)
+        server.bind()
+        print(f'{SOCKET_ENV}={os.path.abspath(server.path)}; export {SOCKET_ENV};')
+        sys.stdout.flush()
+        if not args.foreground:
+            # SQLite connections must not cross fork(); the child reconnects on first use
+            db.close()
+            if os.fork():
+                # skip interpreter cleanup, which would run finalizers over state the agent now owns
+                os._exit(0)
+            os.setsid()
+            # let `eval "$(seq agent)"` see end of output
+            devnull = os.open(os.devnull, os.O_RDWR)
+            for fd in (0, 1, 2):
+                os.dup2(devnull, fd)
+            os.close(devnull)
+        server.serve()
+        return
+    if args.cmd == 'lock':
+        client = AgentClient.connect()
+        if client is None:
+            print('No agent running')
+        else:
+            client.lock()
+            print('Agent locked')
+        return
+    if args.cmd == 'calibrate':
+        # no key or database needed, only timings
+        params = calibrate(args.target_ms / 1000)
+        for name, value in params._asdict().items():
+            print(f'{name}: {value}')
+        print(f'Apply with: seq rotate-master OLD NEW --calibrate --target-ms {args.target_ms}')
+        return
+
+    db = Database()
     if args.cmd == 'list':
         print(json.dumps(db.list_all(), indent=2))
+    elif args.cmd == 'get':
+        enc = _encryption(db)
+        blob = db.get_blob_bytes(args.category, args.provider, args.config)
+        if blob:
+            print(enc.decrypt(blob))
+        else:
+            value = ConfigManager(db, enc).load_from_filesystem(args.category, args.provider, args.config)
+            if value is None:
+                sys.exit(f'No credential stored for {args.category}/{args.provider}/{args.config}')
+            print(value)
+    elif args.cmd == 'set':
+        value = args.value if args.value is not None else sys.stdin.read().rstrip('\n')
+        db.set_blob_bytes(args.category, args.provider, args.config, _encryption(db).encrypt(value, provider=args.provider), {})
+        print('Stored', args.config)
     elif args.cmd == 'migrate':
-        n = migrate_filesystem_to_db(db, cfg)
+        n = migrate_filesystem_to_db(db, ConfigManager(db, None))
         print(f'Migrated {n} entries')
     elif args.cmd == 'backup-create':
-        p = backup.create_backup()
+        p = BackupManager(_encryption(db), db).create_backup()
         print('Created', p)
     elif args.cmd == 'backup-restore':
-        backup.restore_backup(args.path)
+        BackupManager(_encryption(db), db).restore_backup(args.path)
         print('Restored', args.path)
     elif args.cmd == 'rotate-master':
-        enc.rotate_master_password(args.old, args.new, db, cfg)
+        # rotation derives both keys from the passwords given, so it never goes through the agent
+        _lock_agent()
+        params = calibrate(args.target_ms / 1000) if args.calibrate else None
+        rotation = MasterKeyRotation(db, ConfigManager(db, None), kdf_params=params,
+                                     progress=lambda phase, done, total: print(f'{phase}: {done}/{total}', file=sys.stderr))
+        rotation.run(args.old, args.new).lock()
         print('Rotation complete')
+    elif args.cmd == 'upgrade':
+        # needs the key itself, not an agent, to tell which blobs are current
+        n = EnvelopeUpgrader(db, _unlock(db)).run()
+        print(f'Upgraded {n} blobs')
     else:
         parser.print_help()
 
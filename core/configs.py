@@ -1,11 +1,12 @@
 import os
-from typing import Optional
+from typing import Optional, Tuple
+from core.secure_memory import SecretCache
 
 
 class ConfigManager:
     BASE = '.sequential'
 
-    def __init__(self, db, encryption):
+    def __init__(self, db, encryption, secrets: Optional[SecretCache] = None):
         os.makedirs(self.BASE, exist_ok=True)
         os.makedirs(os.path.join(self.BASE, 'tokens', 'encrypted'), exist_ok=True)
         os.makedirs(os.path.join(self.BASE, 'tokens', 'key'), exist_ok=True)
@@ -13,6 +14,9 @@ class ConfigManager:
         os.makedirs(os.path.join(self.BASE, 'apis', 'key'), exist_ok=True)
         self.db = db
         self.encryption = encryption
+        # decrypted values by (category, provider, config); see load_secret()
+        self.secrets = secrets if secrets is not None else SecretCache()
+        self._in_db = {}
 
     def _file_paths(self, category, provider, cfg):
         ext = '.token' if category == 'tokens' else '.api'
@@ -22,7 +26,31 @@ class ConfigManager:
         key_file = os.path.join(key_dir, f".{provider.lower()}_{cfg}.key")
         return token_file, key_file
 
+    def load_secret(self, category, provider, cfg) -> Tuple[Optional[str], bool]:
+        """(decrypted credential, whether it came from the database rather than a file).
+
+        Served from `secrets` while fresh, skipping both the blob fetch and the
+        decryption; anything that writes the credential must call forget() first so
+        the cache cannot outlive the value.
+        """
+        key = (category, provider, cfg)
+        value = self.secrets.get(key)
+        if value is not None:
+            return value, self._in_db.get(key, True)
+        blob = self.db.get_blob_bytes(category, provider, cfg)
+        in_db = blob is not None
+        value = self.encryption.decrypt(blob) if in_db else self.load_from_filesystem(category, provider, cfg)
+        if value is not None:
+            self.secrets.put(key, value)
+            self._in_db[key] = in_db
+        return value, in_db
+
+    def forget(self, category, provider, cfg):
+        self.secrets.invalidate((category, provider, cfg))
+        self._in_db.pop((category, provider, cfg), None)
+
     def save_to_filesystem(self, category, provider, cfg, encrypted_bytes: bytes) -> dict:
+        self.forget(category, provider, cfg)
         token_file, key_file = self._file_paths(category, provider, cfg)
         with open(token_file, 'wb') as f:
             f.write(encrypted_bytes)
@@ -43,6 +71,7 @@ class ConfigManager:
             return None
 
     def delete_filesystem(self, category, provider, cfg):
+        self.forget(category, provider, cfg)
         token_file, key_file = self._file_paths(category, provider, cfg)
         if os.path.exists(token_file):
             os.remove(token_file)
@@ -1,9 +1,15 @@
 import os
 import base64
+import hashlib
+import hmac
 import logging
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Optional
 from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.keywrap import aes_key_wrap, aes_key_unwrap
+from core.secure_memory import SecureMemory, secure_erase
 
 logger = logging.getLogger('sequential.crypto_advanced')
 
@@ -22,11 +28,23 @@ class AdvancedCrypto:
     per-provider key (HKDF) and then wrap (encrypt) the per-provider key with the master key.
     
     Uses Rust implementation when available for improved performance.
+
+    Derived and unwrapped keys are kept in an LRU of up to `cache_size` entries, each
+    held in SecureMemory and zeroized when evicted, on clear_cache() and on
+    update_master_key(). Pass cache_size=0 to disable it.
+
+    The master key is copied into a bytearray so wipe() can zero it in place.
     """
+    CACHE_SIZE = 128
 
-    def __init__(self, master_key: bytes):
-        self.master_key = master_key
+    def __init__(self, master_key: bytes, cache_size: Optional[int] = None):
+        self.master_key = bytearray(master_key)
         self._use_rust = False
+        self.cache_size = self.CACHE_SIZE if cache_size is None else cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
         
         if RUST_AVAILABLE:
             try:
@@ -36,32 +54,272 @@ class AdvancedCrypto:
             except Exception as e:
                 logger.warning(f"Rust AdvancedCrypto initialization failed, using Python fallback: {e}")
 
+    def _cached(self, key: tuple, load) -> bytes:
+        if not self.cache_size:
+            return load()
+        with self._cache_lock:
+            secret = self._cache.get(key)
+            if secret is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return secret.get_data()
+            self.cache_misses += 1
+        value = bytes(load())
+        self._store(key, value)
+        return value
+
+    def _store(self, key: tuple, value: bytes):
+        if not self.cache_size:
+            return
+        with self._cache_lock:
+            previous = self._cache.pop(key, None)
+            if previous is not None:
+                previous.zeroize()
+            self._cache[key] = SecureMemory(value)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)[1].zeroize()
+
+    def clear_cache(self):
+        with self._cache_lock:
+            for secret in self._cache.values():
+                secret.zeroize()
+            self._cache.clear()
+
+    def cache_info(self) -> Dict[str, int]:
+        with self._cache_lock:
+            return {'hits': self.cache_hits, 'misses': self.cache_misses,
+                    'size': len(self._cache), 'maxsize': self.cache_size}
+
     def derive_provider_key(self, provider_name: str) -> bytes:
+        return self._cached(('derive', provider_name), lambda: self._derive(provider_name))
+
+    def _derive(self, provider_name: str) -> bytes:
         if self._use_rust:
             try:
                 return self._rust.derive_provider_key(provider_name)
             except Exception as e:
                 logger.warning(f"Rust derive_provider_key failed, using Python fallback: {e}")
+        return self._hkdf(provider_name.encode('utf-8'), 32)
+
+    def _hkdf(self, info: bytes, length: int) -> bytes:
         hkdf = HKDF(
             algorithm=hashes.SHA256(),
-            length=32,
+            length=length,
             salt=None,
-            info=provider_name.encode('utf-8'),
+            info=info,
         )
         return hkdf.derive(self.master_key)
 
+    def derive_multiple_keys(self, provider_names: List[str]) -> List[bytes]:
+        """derive_provider_key() for a list; only names missing from the cache are derived."""
+        names = list(provider_names)
+        keys = {}
+        if self.cache_size:
+            with self._cache_lock:
+                for name in names:
+                    secret = self._cache.get(('derive', name))
+                    if secret is not None:
+                        self._cache.move_to_end(('derive', name))
+                        keys[name] = secret.get_data()
+                self.cache_hits += len(keys)
+                self.cache_misses += len(set(names)) - len(keys)
+        missing = [name for name in dict.fromkeys(names) if name not in keys]
+        if missing:
+            derived = None
+            if self._use_rust:
+                try:
+                    derived = self._rust.derive_multiple_keys(missing)
+                except Exception as e:
+                    logger.warning(f"Rust derive_multiple_keys failed, using Python fallback: {e}")
+            if derived is None:
+                derived = [self._hkdf(name.encode('utf-8'), 32) for name in missing]
+            for name, key in zip(missing, derived):
+                keys[name] = bytes(key)
+                self._store(('derive', name), keys[name])
+        return [keys[name] for name in names]
+
+    def derive_key_with_context(self, provider_name: str, context: str, length: int = 32) -> bytes:
+        """HKDF key for a provider and a purpose, e.g. ('github', 'hmac'); info is 'provider:context'."""
+        return self._cached(('context', provider_name, context, length),
+                            lambda: self._derive_with_context(provider_name, context, length))
+
+    def _derive_with_context(self, provider_name: str, context: str, length: int) -> bytes:
+        if self._use_rust:
+            try:
+                return self._rust.derive_key_with_context(provider_name, context, length)
+            except Exception as e:
+                logger.warning(f"Rust derive_key_with_context failed, using Python fallback: {e}")
+        return self._hkdf(f'{provider_name}:{context}'.encode('utf-8'), length)
+
     def wrap_provider_key(self, provider_key: bytes) -> bytes:
         if self._use_rust:
             try:
                 return self._rust.wrap_provider_key(provider_key)
             except Exception as e:
                 logger.warning(f"Rust wrap_provider_key failed, using Python fallback: {e}")
-        return aes_key_wrap(self.master_key[:32], provider_key)
+        return aes_key_wrap(memoryview(self.master_key)[:32], provider_key)
 
     def unwrap_provider_key(self, wrapped: bytes) -> bytes:
+        return self._cached(('unwrap', bytes(wrapped)), lambda: self._unwrap(wrapped))
+
+    def _unwrap(self, wrapped: bytes) -> bytes:
         if self._use_rust:
             try:
                 return self._rust.unwrap_provider_key(wrapped)
             except Exception as e:
                 logger.warning(f"Rust unwrap_provider_key failed, using Python fallback: {e}")
-        return aes_key_unwrap(self.master_key[:32], wrapped)
+        return aes_key_unwrap(memoryview(self.master_key)[:32], wrapped)
+
+    def update_master_key(self, new_master_key: bytes):
+        """Switch to a new master key; every cached key belonged to the old one and is wiped."""
+        if self._use_rust:
+            try:
+                self._rust.update_master_key(new_master_key)
+            except Exception as e:
+                logger.warning(f"Rust update_master_key failed, using Python fallback: {e}")
+                self._use_rust = False
+        secure_erase(self.master_key)
+        self.master_key = bytearray(new_master_key)
+        self.clear_cache()
+
+    def wipe(self):
+        """Zero the master key and every cached key; the instance is unusable afterwards."""
+        self.clear_cache()
+        secure_erase(self.master_key)
+        # the Rust object zeroizes its copy when dropped
+        self._rust = None
+        self._use_rust = False
+
+
+class ProviderKeyring:
+    """Per-provider data keys, stored in the database wrapped by the master key.
+
+    Each provider's credentials are encrypted under a random 256-bit data key of its
+    own. Data keys are wrapped with AES-KW under a key-encryption key derived from the
+    master key and kept in the provider_keys table, one row per (data key, master key).
+    A master password rotation therefore rewraps one small key per provider instead of
+    re-encrypting every credential. Unwrapped keys live in AdvancedCrypto's cache.
+    wipe() zeroes the key-encryption key along with them.
+
+    Rows are filed under an HMAC of the key-encryption key, so a mistyped password
+    never shares an id with the real master key. Rows filed under `legacy_id`, the
+    salt-derived id used before, are adopted if they unwrap. A keyring whose key
+    cannot open any stored data key raises ValueError instead of creating new ones.
+    """
+
+    def __init__(self, db, kek: bytes, legacy_id: Optional[bytes] = None):
+        self.db = db
+        self.master_key_id = self.id_for(kek)
+        self._crypto = AdvancedCrypto(kek)
+        self._lock = Lock()
+        self._by_provider = {}
+        self._wrapped = {}
+        self._legacy_id = legacy_id.hex() if legacy_id is not None else None
+        try:
+            self._load()
+            if not self._wrapped:
+                self._adopt()
+        except Exception:
+            self.wipe()
+            raise
+
+    @classmethod
+    def for_manager(cls, db, encryption) -> 'ProviderKeyring':
+        return cls(db, encryption.key_encryption_key(), encryption.key_id)
+
+    @staticmethod
+    def id_for(kek: bytes) -> str:
+        """The master_key_id that data keys wrapped under `kek` are stored with."""
+        return hmac.new(bytes(kek), b'sequential-master-key-id', hashlib.sha256).hexdigest()[:8]
+
+    def _adopt(self):
+        legacy_id = self._legacy_id
+        rows = self.db.list_provider_keys(legacy_id) if legacy_id else []
+        opened = [row for row in rows if self._opens(row[2])]
+        others = self.db.count_provider_keys(exclude=[self.master_key_id, legacy_id or ''])
+        if others or (rows and not opened):
+            raise ValueError('The master key does not open the stored provider data keys')
+        # rows a wrong password wrote under the shared legacy id stay behind
+        for key_id, provider, wrapped in opened:
+            self.db.add_provider_key(key_id, provider, self.master_key_id, wrapped)
+        if opened:
+            self._load()
+
+    def _opens(self, wrapped: bytes) -> bool:
+        try:
+            self._crypto.unwrap_provider_key(wrapped)
+            return True
+        except Exception:
+            return False
+
+    def _load(self):
+        for key_id, provider, wrapped in self.db.list_provider_keys(self.master_key_id):
+            self._by_provider[provider] = key_id
+            self._wrapped[key_id] = wrapped
+
+    def data_key(self, provider: str):
+        """(key_id, key) for the provider, creating and storing a new data key on first use."""
+        with self._lock:
+            key_id = self._by_provider.get(provider)
+            if key_id is None:
+                key_id = self._create(provider)
+            return key_id, self._unwrap(key_id)
+
+    def key_for(self, key_id: str) -> bytes:
+        """The data key with the given id, e.g. one named by a ciphertext header."""
+        with self._lock:
+            if key_id not in self._wrapped:
+                self._load()
+            if key_id not in self._wrapped:
+                raise ValueError(f'Unknown provider data key {key_id}')
+            return self._unwrap(key_id)
+
+    def _create(self, provider: str) -> str:
+        if not self._wrapped:
+            # another process may have stored the first keys since this keyring was opened
+            self._adopt()
+            if provider in self._by_provider:
+                return self._by_provider[provider]
+        while True:
+            key = os.urandom(32)
+            key_id = hashlib.sha256(b'sequential-dek-id' + key).hexdigest()[:8]
+            wrapped = self._crypto.wrap_provider_key(key)
+            if self.db.add_provider_key(key_id, provider, self.master_key_id, wrapped):
+                self._by_provider[provider] = key_id
+                self._wrapped[key_id] = wrapped
+                logger.debug('Created data key %s for %s', key_id, provider)
+                return key_id
+            # another process won the race for this provider, or the id collided
+            self._load()
+            if provider in self._by_provider:
+                return self._by_provider[provider]
+
+    def _unwrap(self, key_id: str) -> bytes:
+        return bytes(self._crypto.unwrap_provider_key(self._wrapped[key_id]))
+
+    def check(self) -> bool:
+        """False if a stored data key does not unwrap, i.e. the master key is wrong."""
+        with self._lock:
+            return all(self._opens(wrapped) for wrapped in self._wrapped.values())
+
+    def rewrap(self, encryption) -> int:
+        """Store every data key wrapped under `encryption`'s master key as well; idempotent.
+
+        The rows under the current master key stay until Database.prune_provider_keys().
+        """
+        kek = encryption.key_encryption_key()
+        target, target_id = AdvancedCrypto(kek, cache_size=0), self.id_for(kek)
+        rows = self.db.list_provider_keys(self.master_key_id)
+        try:
+            for key_id, provider, wrapped in rows:
+                key = bytes(self._crypto.unwrap_provider_key(wrapped))
+                self.db.add_provider_key(key_id, provider, target_id, target.wrap_provider_key(key))
+        finally:
+            target.wipe()
+        return len(rows)
+
+    def wipe(self):
+        with self._lock:
+            if self._crypto is not None:
+                self._crypto.wipe()
+                self._crypto = None
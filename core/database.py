@@ -1,11 +1,17 @@
 import os
+import re
+import copy
 import json
 import base64
 import sqlite3
 import logging
-from threading import Lock
-from datetime import datetime
-from typing import Dict, Any, Optional
+import weakref
+import threading
+from collections import OrderedDict
+from threading import Lock, RLock, local
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterable, Iterator, Optional, Tuple
 
 logger = logging.getLogger('sequential.db')
 logger.setLevel(logging.DEBUG)
@@ -13,40 +19,464 @@ handler = logging.StreamHandler()
 handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
 logger.addHandler(handler)
 
+try:
+    import fcntl
+except ImportError:
+    # no cross-process journal locking off POSIX
+    fcntl = None
+
+try:
+    from rust_core import Database as RustDatabase
+    RUST_AVAILABLE = True
+except ImportError as e:
+    logger.warning(f"Rust Database not available, using Python fallback: {e}")
+    RUST_AVAILABLE = False
+
+SECONDS_PER_DAY = 86400
+
+
+def expiry_to_epoch(expires_at: Optional[str]) -> Optional[int]:
+    """Normalize an ISO-8601 expiry to UTC epoch seconds; naive timestamps are taken as UTC."""
+    if not expires_at:
+        return None
+    try:
+        parsed = datetime.fromisoformat(expires_at.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
 
 class Database:
     JSON_FILE = 'server_settings.json'
     SQLITE_FILE = 'server_settings.db'
+    JOURNAL_SUFFIX = '.journal'
+    JOURNAL_COMPACT_THRESHOLD = 2000
+    STATEMENT_CACHE_SIZE = 256
+    PAGE_SIZE = 500
+    BLOB_CHUNK_SIZE = 64 * 1024
+    ENTRY_COLUMNS = 'category, provider, config_name, info, favorite, notes, expires_at, updated_at'
+    SQLITE_PRAGMAS = (
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('temp_store', 'MEMORY'),
+        ('cache_size', '-16000'),
+        ('busy_timeout', '5000'),
+    )
 
-    def __init__(self, sqlite_path: Optional[str] = None, use_psql: bool = False, pg_conn_str: Optional[str] = None):
-        self.lock = Lock()
+    def __new__(cls, sqlite_path: Optional[str] = None, use_psql: bool = False, *args, **kwargs):
+        # Database(use_psql=True) hands out the Postgres backend behind the same interface
+        if use_psql and cls is Database:
+            from core.postgres import PostgresDatabase
+            cls = PostgresDatabase
+        return super().__new__(cls)
+
+    def __init__(self, sqlite_path: Optional[str] = None, use_psql: bool = False, pg_conn_str: Optional[str] = None,
+                 cache_size: int = 512):
+        self.lock = RLock()
+        self._compact_lock = Lock()
+        # serializes journal file access between threads; flock() does it between processes
+        self._journal_file_lock = Lock()
+        self._lock_file = None
+        self._pending_journal = None
+        self._json_undo = []
+        self._local = local()
+        self._pool_lock = Lock()
+        # (thread, connection) for every connection opened, the thread weakly referenced
+        self._connections = []
+        self._fts = False
+        # read-through cache for entry listings, categories and settings; 0 disables it
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = Lock()
+        self._cache_generation = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
         self.json_path = self.JSON_FILE
+        self.journal_path = self.json_path + self.JOURNAL_SUFFIX
+        self._compacting_path = self.journal_path + '.compacting'
+        self._lock_path = self.json_path + '.lock'
         self.sqlite_path = sqlite_path or self.SQLITE_FILE
         self.use_psql = use_psql
         self.pg_conn_str = pg_conn_str
 
         self._init_json()
-        self._init_sqlite()
+        self._init_schema()
+        self._init_rust()
 
     def _init_json(self):
         if not os.path.exists(self.json_path):
             with open(self.json_path, 'w') as f:
                 json.dump({}, f)
+        self._load_json()
+
+    def _load_json(self):
+        """Load the last snapshot and replay the change journal on top of it."""
+        with self._journal_lock():
+            self._open_journal()
+
+    def _open_journal(self):
+        """(Re)build the JSON mirror from disk and open the journal. Caller must hold _journal_lock()."""
+        data = self._read_snapshot()
+        stale = os.path.exists(self._compacting_path)
+        if stale:
+            self._replay_journal(data, self._compacting_path)
+        records, offset = (self._replay_journal(data, self.journal_path)
+                           if os.path.exists(self.journal_path) else (0, 0))
+        self._json_data = data
+        self._journal_records = records
+        if stale:
+            # a compaction was interrupted; fold everything into a fresh snapshot now
+            self._write_snapshot(data)
+            open(self.journal_path, 'w').close()
+            os.remove(self._compacting_path)
+            self._journal_records, offset = 0, 0
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        self._journal_offset = offset
 
-    def _read_json(self) -> Dict[str, Any]:
+    def _read_snapshot(self) -> Dict[str, Any]:
         try:
             with open(self.json_path, 'r') as f:
                 return json.load(f)
         except Exception:
             return {}
 
-    def _write_json(self, data: Dict[str, Any]):
-        with open(self.json_path, 'w') as f:
-            json.dump(data, f, indent=2)
+    @contextmanager
+    def _journal_lock(self):
+        """Hold the journal exclusively against other threads and other processes."""
+        with self._journal_file_lock:
+            if fcntl is None:
+                yield
+                return
+            if self._lock_file is None:
+                self._lock_file = open(self._lock_path, 'a')
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _sync_journal(self):
+        """Apply records other processes appended since this one last looked.
 
-    def _init_sqlite(self):
-        conn = sqlite3.connect(self.sqlite_path)
+        A journal replaced by another process's compaction means the snapshot changed
+        too, so the mirror is rebuilt from disk. Caller must hold self.lock and _journal_lock().
+        """
         try:
+            current = os.stat(self.journal_path).st_ino
+        except FileNotFoundError:
+            current = None
+        # a closed journal (after close()) is reopened the same way
+        if self._journal.closed or current != os.fstat(self._journal.fileno()).st_ino:
+            self._journal.close()
+            self._open_journal()
+            return
+        records, self._journal_offset = self._replay_journal(self._json_data, self.journal_path, self._journal_offset)
+        self._journal_records += records
+
+    @staticmethod
+    def _replay_journal(data: Dict[str, Any], path: str, offset: int = 0) -> Tuple[int, int]:
+        """Apply the records from byte `offset` on; returns (records applied, end offset)."""
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            raw = f.read()
+        return Database._apply_records(data, raw.decode('utf-8', 'replace').splitlines()), offset + len(raw)
+
+    @staticmethod
+    def _apply_records(data: Dict[str, Any], lines: Iterable[str]) -> int:
+        count = 0
+        for line in lines:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                # torn trailing write from a crash
+                continue
+            category, key = rec['category'], rec['key']
+            if rec['op'] == 'set':
+                data.setdefault(category, {})[key] = rec['value']
+            elif rec['op'] == 'delete' and key in data.get(category, {}):
+                del data[category][key]
+                if not data[category]:
+                    del data[category]
+            count += 1
+        return count
+
+    def _write_snapshot(self, data: Dict[str, Any]):
+        tmp = self.json_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self.json_path)
+
+    def _append_journal(self, record: Dict[str, Any]):
+        line = json.dumps(record, default=str) + '\n'
+        if self._pending_journal is not None:
+            self._pending_journal.append(line)
+        else:
+            self._write_journal([line])
+
+    def _write_journal(self, lines):
+        """Append lines already applied to the mirror. Caller must hold self.lock."""
+        with self._journal_lock():
+            self._sync_journal()
+            # records from other processes were replayed over this process's newer ones
+            self._apply_records(self._json_data, lines)
+            self._journal.write(''.join(lines))
+            self._journal.flush()
+            self._journal_offset = os.fstat(self._journal.fileno()).st_size
+        self._journal_records += len(lines)
+        if self._journal_records >= self.JOURNAL_COMPACT_THRESHOLD and not self._compact_lock.locked():
+            threading.Thread(target=self.compact, name='json-compaction', daemon=True).start()
+
+    def _remember(self, category: str, key: str):
+        if self._pending_journal is not None:
+            self._json_undo.append((category, key, self._json_data.get(category, {}).get(key)))
+
+    def _json_put(self, category: str, key: str, value: Dict[str, Any]):
+        """Replace one JSON mirror entry. Caller must hold self.lock."""
+        self._remember(category, key)
+        self._json_data.setdefault(category, {})[key] = value
+        self._append_journal({'op': 'set', 'category': category, 'key': key, 'value': value})
+
+    def _json_remove(self, category: str, key: str) -> bool:
+        """Drop one JSON mirror entry. Caller must hold self.lock."""
+        entries = self._json_data.get(category)
+        if not entries or key not in entries:
+            return False
+        self._remember(category, key)
+        del entries[key]
+        if not entries:
+            del self._json_data[category]
+        self._append_journal({'op': 'delete', 'category': category, 'key': key})
+        return True
+
+    def _json_update(self, category: str, key: str, **fields):
+        """Merge fields into an existing JSON mirror entry. Caller must hold self.lock."""
+        entry = self._json_data.get(category, {}).get(key)
+        if entry is not None:
+            self._json_put(category, key, {**entry, **fields, 'updated_at': datetime.utcnow().isoformat()})
+
+    def compact(self):
+        """Fold the change journal into server_settings.json and start a fresh journal.
+
+        Runs automatically in a background thread once the journal passes
+        JOURNAL_COMPACT_THRESHOLD records; call it directly to flush synchronously.
+        The snapshot is rebuilt from the files, not from memory, so records other
+        processes appended are kept. Writers wait until it is done.
+        """
+        # same order as writers: self.lock, then the journal lock
+        with self._compact_lock, self.lock, self._journal_lock():
+            self._sync_journal()
+            if not self._journal_records:
+                return
+            self._journal.close()
+            os.replace(self.journal_path, self._compacting_path)
+            self._journal = open(self.journal_path, 'a', encoding='utf-8')
+            self._journal_records = 0
+            self._journal_offset = 0
+            snapshot = self._read_snapshot()
+            self._replay_journal(snapshot, self._compacting_path)
+            self._write_snapshot(snapshot)
+            os.remove(self._compacting_path)
+            logger.debug('Compacted JSON journal into %s', self.json_path)
+
+    def reload(self):
+        """Discard in-memory JSON state and reload it from disk (e.g. after a restore)."""
+        with self._compact_lock, self.lock:
+            self._journal.close()
+            self._load_json()
+        # a restored backup can predate tables, columns and indexes added since
+        self._init_schema()
+        self._init_rust()
+        self.cache_clear()
+
+    def _init_rust(self):
+        """Open the Rust read path over the same files once the schema is in place."""
+        self._rust = None
+        self._use_rust = False
+        if RUST_AVAILABLE:
+            try:
+                self._rust = RustDatabase(self.sqlite_path, self.use_psql, self.pg_conn_str)
+                self._use_rust = True
+            except Exception as e:
+                logger.warning(f"Rust Database init failed, using Python fallback: {e}")
+
+    def _rust_backend(self):
+        """The Rust handle, or None when disabled or when this thread has a batch() open.
+
+        The Rust connection cannot see a batch's uncommitted writes, so reads inside a
+        batch stay on the thread's own connection.
+        """
+        if self._use_rust and not getattr(self._local, 'batch_depth', 0):
+            return self._rust
+        return None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return the calling thread's pooled connection, opening it on first use.
+
+        A connection stays open while its thread runs, so repeated calls reuse the page
+        cache and the prepared-statement cache instead of reconnecting. Connections of
+        threads that have exited are closed whenever another thread opens one.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.sqlite_path, check_same_thread=False,
+                                   cached_statements=self.STATEMENT_CACHE_SIZE)
+            for name, value in self.SQLITE_PRAGMAS:
+                conn.execute(f'PRAGMA {name}={value}')
+            self._local.conn = conn
+            with self._pool_lock:
+                self._prune_connections()
+                self._connections.append((weakref.ref(threading.current_thread()), conn))
+        return conn
+
+    def _prune_connections(self):
+        """Close the connections of threads that have exited. Caller must hold self._pool_lock."""
+        live = []
+        for thread_ref, conn in self._connections:
+            thread = thread_ref()
+            if thread is not None and thread.is_alive():
+                live.append((thread_ref, conn))
+            else:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+        self._connections = live
+
+    def close(self):
+        self.compact()
+        with self.lock:
+            self._journal.close()
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+        with self._pool_lock:
+            for _, conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections.clear()
+            self._local = local()
+        self._rust = None
+        self._use_rust = False
+
+    @contextmanager
+    def _connection(self):
+        """Yield the connection the calling thread should use for one unit of work."""
+        yield self._connect()
+
+    @contextmanager
+    def _transaction(self, *invalidates: str):
+        """Yield the thread's connection, committing on exit unless a batch() is open.
+
+        Cached reads of the given kinds are dropped once the write is committed; an open
+        batch() clears the whole cache when it finishes instead.
+        """
+        with self._connection() as conn:
+            if getattr(self._local, 'batch_depth', 0):
+                yield conn
+            else:
+                with conn:
+                    yield conn
+                if invalidates:
+                    self._invalidate(*invalidates)
+
+    def _stream(self, sql: str, params=()) -> Iterator[tuple]:
+        """Run a read query and yield its rows, fetching PAGE_SIZE at a time."""
+        with self._connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute(sql, params)
+                while True:
+                    rows = cur.fetchmany(self.PAGE_SIZE)
+                    if not rows:
+                        break
+                    yield from rows
+            finally:
+                cur.close()
+
+    def _cached(self, key: tuple, load):
+        # an open batch() only invalidates when it finishes, so read through until then
+        if not self.cache_size or getattr(self._local, 'batch_depth', 0):
+            return load()
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return self._cache[key]
+            self.cache_misses += 1
+            generation = self._cache_generation
+        value = load()
+        with self._cache_lock:
+            # skip the store if a write was committed while we were loading
+            if generation == self._cache_generation:
+                self._cache[key] = value
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return value
+
+    def _invalidate(self, *kinds: str):
+        with self._cache_lock:
+            self._cache_generation += 1
+            for key in [k for k in self._cache if k[0] in kinds]:
+                del self._cache[key]
+
+    def cache_clear(self):
+        with self._cache_lock:
+            self._cache_generation += 1
+            self._cache.clear()
+
+    def cache_info(self) -> Dict[str, int]:
+        with self._cache_lock:
+            return {'hits': self.cache_hits, 'misses': self.cache_misses,
+                    'size': len(self._cache), 'maxsize': self.cache_size}
+
+    @contextmanager
+    def batch(self):
+        """Group writes into a single SQLite transaction and a single journal flush.
+
+        Nested batches join the outermost one. If the block raises, the transaction is
+        rolled back and the in-memory JSON mirror is restored to its previous state.
+        """
+        with self.lock:
+            depth = getattr(self._local, 'batch_depth', 0)
+            self._local.batch_depth = depth + 1
+            try:
+                if depth:
+                    yield self
+                    return
+                self._pending_journal = []
+                try:
+                    with self._connection() as conn, conn:
+                        yield self
+                except BaseException:
+                    self._pending_journal = None
+                    for category, key, previous in reversed(self._json_undo):
+                        if previous is None:
+                            entries = self._json_data.get(category, {})
+                            entries.pop(key, None)
+                            if not entries:
+                                self._json_data.pop(category, None)
+                        else:
+                            self._json_data.setdefault(category, {})[key] = previous
+                    raise
+                lines, self._pending_journal = self._pending_journal, None
+                if lines:
+                    self._write_journal(lines)
+            finally:
+                self._json_undo = []
+                self._local.batch_depth = depth
+                if not depth:
+                    self.cache_clear()
+
+    def checkpoint(self):
+        """Fold the WAL back into the main database file, e.g. before copying it."""
+        self._connect().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def _init_schema(self):
+        with self._transaction() as conn:
             cur = conn.cursor()
             cur.execute('''
                 CREATE TABLE IF NOT EXISTS metadata (
@@ -71,10 +501,18 @@ class Database:
                     value TEXT
                 )
             ''')
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS provider_keys (
+                    key_id TEXT NOT NULL,
+                    provider TEXT NOT NULL,
+                    master_key_id TEXT NOT NULL,
+                    wrapped BLOB NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (key_id, master_key_id),
+                    UNIQUE (provider, master_key_id)
+                )
+            ''')
             self._migrate_schema(cur)
-            conn.commit()
-        finally:
-            conn.close()
 
     def _migrate_schema(self, cur):
         cur.execute("PRAGMA table_info(metadata)")
@@ -85,20 +523,67 @@ class Database:
             cur.execute('ALTER TABLE metadata ADD COLUMN notes TEXT')
         if 'expires_at' not in columns:
             cur.execute('ALTER TABLE metadata ADD COLUMN expires_at TIMESTAMP')
+        if 'expires_epoch' not in columns:
+            cur.execute('ALTER TABLE metadata ADD COLUMN expires_epoch INTEGER')
+            cur.execute("SELECT rowid, expires_at FROM metadata WHERE expires_at IS NOT NULL AND expires_at != ''")
+            cur.executemany('UPDATE metadata SET expires_epoch = ? WHERE rowid = ?',
+                            [(expiry_to_epoch(expires_at), rowid) for rowid, expires_at in cur.fetchall()])
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_metadata_expires_epoch ON metadata (expires_epoch)')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_metadata_listing ON metadata (favorite, category, provider, config_name)')
         for cat in ['tokens', 'apis']:
             cur.execute('INSERT OR IGNORE INTO categories (name) VALUES (?)', (cat,))
+        self._fts = self._init_fts(cur)
+
+    def _init_fts(self, cur) -> bool:
+        """Create the FTS5 index over metadata and the triggers that keep it in sync.
+
+        The index is an external-content table keyed on metadata's rowid. Returns False
+        when this SQLite build lacks FTS5, in which case search falls back to LIKE scans.
+        """
+        cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'metadata_fts'")
+        exists = cur.fetchone() is not None
+        try:
+            cur.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS metadata_fts USING fts5(
+                    provider, config_name, notes, info,
+                    content='metadata', content_rowid='rowid', prefix='2 3'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            logger.warning('FTS5 unavailable, search will use LIKE scans: %s', e)
+            return False
+        cur.execute('''
+            CREATE TRIGGER IF NOT EXISTS metadata_fts_ai AFTER INSERT ON metadata BEGIN
+                INSERT INTO metadata_fts (rowid, provider, config_name, notes, info)
+                VALUES (new.rowid, new.provider, new.config_name, new.notes, new.info);
+            END
+        ''')
+        cur.execute('''
+            CREATE TRIGGER IF NOT EXISTS metadata_fts_ad AFTER DELETE ON metadata BEGIN
+                INSERT INTO metadata_fts (metadata_fts, rowid, provider, config_name, notes, info)
+                VALUES ('delete', old.rowid, old.provider, old.config_name, old.notes, old.info);
+            END
+        ''')
+        cur.execute('''
+            CREATE TRIGGER IF NOT EXISTS metadata_fts_au AFTER UPDATE OF provider, config_name, notes, info ON metadata BEGIN
+                INSERT INTO metadata_fts (metadata_fts, rowid, provider, config_name, notes, info)
+                VALUES ('delete', old.rowid, old.provider, old.config_name, old.notes, old.info);
+                INSERT INTO metadata_fts (rowid, provider, config_name, notes, info)
+                VALUES (new.rowid, new.provider, new.config_name, new.notes, new.info);
+            END
+        ''')
+        if not exists:
+            cur.execute("INSERT INTO metadata_fts (metadata_fts) VALUES ('rebuild')")
+        return True
 
     # JSON-centric API (backward compatibility)
     def get(self, category: str, provider_config: str) -> Optional[Dict[str, Any]]:
         with self.lock:
-            data = self._read_json()
-            return data.get(category, {}).get(provider_config)
+            return copy.deepcopy(self._json_data.get(category, {}).get(provider_config))
 
     def set(self, category: str, provider_config: str, info: Dict[str, Any]):
         with self.lock:
-            data = self._read_json()
-            data.setdefault(category, {})[provider_config] = {**info, 'updated_at': datetime.utcnow().isoformat()}
-            self._write_json(data)
+            self._json_put(category, provider_config, {**info, 'updated_at': datetime.utcnow().isoformat()})
             logger.debug('Wrote JSON metadata for %s/%s', category, provider_config)
 
             provider, cfg = provider_config.split('_', 1)
@@ -106,12 +591,7 @@ class Database:
 
     def delete(self, category: str, provider_config: str):
         with self.lock:
-            data = self._read_json()
-            if category in data and provider_config in data[category]:
-                del data[category][provider_config]
-                if not data[category]:
-                    del data[category]
-                self._write_json(data)
+            if self._json_remove(category, provider_config):
                 logger.debug('Deleted JSON metadata for %s/%s', category, provider_config)
 
             provider, cfg = provider_config.split('_', 1)
@@ -119,48 +599,154 @@ class Database:
 
     def list_all(self) -> Dict[str, Any]:
         with self.lock:
-            return self._read_json()
+            return copy.deepcopy(self._json_data)
 
     # sqlite operations
     def _sqlite_upsert(self, category, provider, cfg, info_text, blob_bytes):
-        conn = sqlite3.connect(self.sqlite_path)
-        try:
+        """Upsert one metadata row; a None info_text or blob_bytes keeps the stored value."""
+        with self._transaction('entries') as conn:
             cur = conn.cursor()
             cur.execute('''
                 INSERT INTO metadata (category, provider, config_name, info, blob, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?)
+                VALUES (?, ?, ?, COALESCE(?, '{}'), ?, ?)
                 ON CONFLICT(category, provider, config_name) DO UPDATE SET
-                    info = excluded.info,
+                    info = COALESCE(?, metadata.info),
                     blob = COALESCE(excluded.blob, metadata.blob),
                     updated_at = excluded.updated_at
-            ''', (category, provider, cfg, info_text, blob_bytes, datetime.utcnow()))
-            conn.commit()
-        finally:
-            conn.close()
+            ''', (category, provider, cfg, info_text, blob_bytes, datetime.utcnow(), info_text))
 
     def _sqlite_delete(self, category, provider, cfg):
-        conn = sqlite3.connect(self.sqlite_path)
-        try:
+        with self._transaction('entries') as conn:
             cur = conn.cursor()
             cur.execute('DELETE FROM metadata WHERE category=? AND provider=? AND config_name=?', (category, provider, cfg))
-            conn.commit()
-        finally:
-            conn.close()
 
     def set_blob(self, category, provider, cfg, meta: Dict[str, Any]):
+        """Store meta['blob'] (base64 text) and the rest of meta as the entry's info."""
+        blob_b64 = meta.get('blob')
+        blob_bytes = base64.b64decode(blob_b64) if blob_b64 else None
+        self.set_blob_bytes(category, provider, cfg, blob_bytes, {k: v for k, v in meta.items() if k != 'blob'})
+
+    def set_blob_bytes(self, category, provider, cfg, blob: Optional[bytes], info: Optional[Dict[str, Any]] = None):
+        """Store an encrypted blob as raw bytes.
+
+        `info` replaces the entry's metadata when given; otherwise the stored metadata
+        is kept and a missing entry is created. A None blob keeps the stored blob.
+        """
         with self.lock:
-            blob_b64 = meta.get('blob')
-            blob_bytes = base64.b64decode(blob_b64) if blob_b64 else None
-            info = {k: v for k, v in meta.items() if k != 'blob'}
-            # JSON mirror
-            self.set(category, f"{provider}_{cfg}", info)
-            # sqlite store
-            self._sqlite_upsert(category, provider, cfg, json.dumps(info), blob_bytes)
+            self._mirror_blob_write(category, provider, cfg, info)
+            self._sqlite_upsert(category, provider, cfg, None if info is None else json.dumps(info),
+                                None if blob is None else bytes(blob))
             logger.debug('Stored blob in sqlite for %s/%s/%s', category, provider, cfg)
 
+    def _mirror_blob_write(self, category, provider, cfg, info: Optional[Dict[str, Any]]):
+        key = f"{provider}_{cfg}"
+        if info is None:
+            info = self._json_data.get(category, {}).get(key) or {'provider': provider, 'config_name': cfg}
+        self._json_put(category, key, {**info, 'updated_at': datetime.utcnow().isoformat()})
+
+    def write_blob_stream(self, category, provider, cfg, stream, size: int, info: Optional[Dict[str, Any]] = None):
+        """Store `size` bytes read from the file-like `stream` as the entry's blob.
+
+        The blob is allocated with zeroblob() and filled BLOB_CHUNK_SIZE bytes at a time
+        through SQLite's incremental blob I/O, so large secrets such as certificates or
+        key bundles are never held in memory whole. Needs Python 3.11+ for blobopen();
+        older interpreters read the stream into memory first.
+        """
+        with self.batch():
+            self._mirror_blob_write(category, provider, cfg, info)
+            self._sqlite_upsert(category, provider, cfg, None if info is None else json.dumps(info), None)
+            with self._transaction('entries') as conn:
+                cur = conn.cursor()
+                if not hasattr(conn, 'blobopen'):
+                    cur.execute('UPDATE metadata SET blob = ? WHERE category = ? AND provider = ? AND config_name = ?',
+                                (self._read_exact(stream, size), category, provider, cfg))
+                    return
+                cur.execute('''UPDATE metadata SET blob = zeroblob(?)
+                              WHERE category = ? AND provider = ? AND config_name = ?''', (size, category, provider, cfg))
+                cur.execute('SELECT rowid FROM metadata WHERE category = ? AND provider = ? AND config_name = ?',
+                            (category, provider, cfg))
+                with conn.blobopen('metadata', 'blob', cur.fetchone()[0]) as blob:
+                    remaining = size
+                    while remaining:
+                        chunk = stream.read(min(self.BLOB_CHUNK_SIZE, remaining))
+                        if not chunk:
+                            raise ValueError(f'Blob stream ended {remaining} bytes short of {size}')
+                        blob.write(chunk)
+                        remaining -= len(chunk)
+
+    @staticmethod
+    def _read_exact(stream, size: int) -> bytes:
+        data = stream.read(size)
+        if len(data) != size:
+            raise ValueError(f'Blob stream ended {size - len(data)} bytes short of {size}')
+        return data
+
+    def bulk_upsert(self, entries: Iterable[Dict[str, Any]]) -> int:
+        """Insert or update many entries in one transaction with one journal flush.
+
+        Each entry needs 'category', 'provider' and 'config_name' and may carry 'info',
+        'blob' (raw bytes or base64 text), 'notes', 'expires_at' and 'favorite'. Fields
+        that are missing or None leave the stored value unchanged.
+        Returns the number of entries written.
+        """
+        now = datetime.utcnow()
+        stamp = now.isoformat()
+        rows = []
+        with self.batch():
+            for entry in entries:
+                category, provider, cfg = entry['category'], entry['provider'], entry['config_name']
+                info = entry.get('info')
+                blob = entry.get('blob')
+                if isinstance(blob, str):
+                    blob = base64.b64decode(blob)
+                favorite = entry.get('favorite')
+                fields = {k: entry[k] for k in ('favorite', 'notes', 'expires_at') if entry.get(k) is not None}
+                key = f"{provider}_{cfg}"
+                if info is not None:
+                    mirror = dict(info)
+                else:
+                    mirror = self._json_data.get(category, {}).get(key) or {'provider': provider, 'config_name': cfg}
+                self._json_put(category, key, {**mirror, **fields, 'updated_at': stamp})
+                rows.append({
+                    'category': category, 'provider': provider, 'config_name': cfg,
+                    'info': json.dumps(info) if info is not None else None,
+                    'blob': blob,
+                    'favorite': None if favorite is None else int(bool(favorite)),
+                    'notes': entry.get('notes'),
+                    'expires_at': entry.get('expires_at'),
+                    'expires_epoch': expiry_to_epoch(entry.get('expires_at')),
+                    'updated_at': now,
+                })
+            with self._transaction('entries') as conn:
+                self._upsert_rows(conn, rows)
+        logger.debug('Bulk upserted %d entries', len(rows))
+        return len(rows)
+
+    def _upsert_rows(self, conn, rows: list):
+        """Write bulk_upsert() rows; None fields keep whatever is already stored."""
+        conn.executemany('''
+            INSERT INTO metadata (category, provider, config_name, info, blob, favorite, notes,
+                                  expires_at, expires_epoch, updated_at)
+            VALUES (:category, :provider, :config_name, COALESCE(:info, '{}'), :blob,
+                    COALESCE(:favorite, 0), :notes, :expires_at, :expires_epoch, :updated_at)
+            ON CONFLICT(category, provider, config_name) DO UPDATE SET
+                info = COALESCE(:info, metadata.info),
+                blob = COALESCE(excluded.blob, metadata.blob),
+                favorite = COALESCE(:favorite, metadata.favorite),
+                notes = COALESCE(:notes, metadata.notes),
+                expires_at = COALESCE(:expires_at, metadata.expires_at),
+                expires_epoch = CASE WHEN :expires_at IS NULL THEN metadata.expires_epoch ELSE :expires_epoch END,
+                updated_at = excluded.updated_at
+        ''', rows)
+
     def get_blob_entry(self, category, provider, cfg) -> Optional[Dict[str, Any]]:
-        conn = sqlite3.connect(self.sqlite_path)
-        try:
+        rust = self._rust_backend()
+        if rust is not None:
+            try:
+                return rust.get_blob_entry(category, provider, cfg)
+            except Exception as e:
+                logger.warning(f"Rust get_blob_entry failed, using Python fallback: {e}")
+        with self._transaction() as conn:
             cur = conn.cursor()
             cur.execute('SELECT info, blob, updated_at FROM metadata WHERE category=? AND provider=? AND config_name=?', (category, provider, cfg))
             row = cur.fetchone()
@@ -170,12 +756,120 @@ class Database:
             info = json.loads(info_text) if info_text else {}
             blob_b64 = base64.b64encode(blob).decode('utf-8') if blob else None
             return {'info': info, 'blob': blob_b64, 'updated_at': updated}
-        finally:
-            conn.close()
+
+    def get_blob_bytes(self, category, provider, cfg) -> Optional[bytes]:
+        """The entry's encrypted blob as raw bytes, or None when it has none."""
+        rust = self._rust_backend()
+        if rust is not None:
+            try:
+                return rust.get_blob_bytes(category, provider, cfg)
+            except Exception as e:
+                logger.warning(f"Rust get_blob_bytes failed, using Python fallback: {e}")
+        with self._transaction() as conn:
+            cur = conn.cursor()
+            cur.execute('SELECT blob FROM metadata WHERE category=? AND provider=? AND config_name=?', (category, provider, cfg))
+            row = cur.fetchone()
+            return bytes(row[0]) if row and row[0] else None
+
+    def iter_blobs(self, after: Optional[Tuple[str, str, str]] = None,
+                   exclude_prefix: Optional[bytes] = None) -> Iterator[Tuple[str, str, str, bytes]]:
+        """Stream (category, provider, config_name, blob) for every stored blob in key order.
+
+        Pages are PAGE_SIZE-row keyset seeks on the primary key; `after` resumes behind a
+        (category, provider, config_name) key. Blobs starting with `exclude_prefix` are
+        filtered out by the database and never read.
+        """
+        position = after
+        skip, skip_params = self._prefix_filter(exclude_prefix)
+        while True:
+            clause, params = ('', ()) if position is None else ('AND (category, provider, config_name) > (?, ?, ?)', tuple(position))
+            with self._transaction() as conn:
+                cur = conn.cursor()
+                cur.execute(f'''SELECT category, provider, config_name, blob FROM metadata
+                               WHERE blob IS NOT NULL {skip} {clause}
+                               ORDER BY category, provider, config_name LIMIT ?''', skip_params + params + (self.PAGE_SIZE,))
+                rows = cur.fetchall()
+            for category, provider, cfg, blob in rows:
+                if blob:
+                    yield category, provider, cfg, bytes(blob)
+            if len(rows) < self.PAGE_SIZE:
+                return
+            position = rows[-1][:3]
+
+    def count_blobs(self, exclude_prefix: Optional[bytes] = None) -> int:
+        skip, skip_params = self._prefix_filter(exclude_prefix)
+        with self._transaction() as conn:
+            cur = conn.cursor()
+            cur.execute(f'SELECT COUNT(*) FROM metadata WHERE blob IS NOT NULL {skip}', skip_params)
+            return cur.fetchone()[0]
+
+    @staticmethod
+    def _prefix_filter(prefix: Optional[bytes]) -> Tuple[str, tuple]:
+        if not prefix:
+            return '', ()
+        return 'AND substr(blob, 1, ?) != ?', (len(prefix), bytes(prefix))
+
+    def replace_blobs(self, rows: Iterable[Tuple[str, str, str, bytes, bytes]]) -> int:
+        """Swap blobs in place for (category, provider, config_name, expected, replacement) rows.
+
+        A row only applies while the stored blob still equals `expected`, so a concurrent
+        write is never overwritten by a background re-encryption. Metadata and updated_at
+        are left alone. Returns the number of blobs replaced.
+        """
+        params = [(bytes(new), category, provider, cfg, bytes(expected))
+                  for category, provider, cfg, expected, new in rows]
+        if not params:
+            return 0
+        with self.lock, self._transaction() as conn:
+            cur = conn.cursor()
+            replaced = 0
+            for row in params:
+                cur.execute('''UPDATE metadata SET blob = ?
+                               WHERE category = ? AND provider = ? AND config_name = ? AND blob = ?''', row)
+                replaced += cur.rowcount
+        return replaced
+
+    def iter_blob_chunks(self, category, provider, cfg, chunk_size: int = None) -> Iterator[bytes]:
+        """Yield the entry's blob in chunks of at most `chunk_size` bytes.
+
+        Uses incremental blob I/O where available (Python 3.11+), so only one chunk is
+        in memory at a time. Finish iterating before rewriting the same entry.
+        """
+        chunk_size = chunk_size or self.BLOB_CHUNK_SIZE
+        with self._transaction() as conn:
+            cur = conn.cursor()
+            if not hasattr(conn, 'blobopen'):
+                yield from self._blob_slices(cur, category, provider, cfg, chunk_size)
+                return
+            cur.execute('''SELECT rowid FROM metadata
+                          WHERE category = ? AND provider = ? AND config_name = ? AND blob IS NOT NULL''',
+                        (category, provider, cfg))
+            row = cur.fetchone()
+            if not row:
+                return
+            with conn.blobopen('metadata', 'blob', row[0], readonly=True) as blob:
+                while True:
+                    chunk = blob.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+
+    @staticmethod
+    def _blob_slices(cur, category, provider, cfg, chunk_size: int) -> Iterator[bytes]:
+        where = 'WHERE category = ? AND provider = ? AND config_name = ?'
+        cur.execute(f'SELECT length(blob) FROM metadata {where}', (category, provider, cfg))
+        row = cur.fetchone()
+        length = row[0] if row and row[0] else 0
+        for offset in range(0, length, chunk_size):
+            cur.execute(f'SELECT substr(blob, ?, ?) FROM metadata {where}', (offset + 1, chunk_size, category, provider, cfg))
+            row = cur.fetchone()
+            if not row or not row[0]:
+                break
+            yield bytes(row[0])
 
     def export_provider(self, category, provider) -> Dict[str, Any]:
         out = {}
-        all_meta = self._read_json().get(category, {})
+        all_meta = self.list_all().get(category, {})
         for key, meta in all_meta.items():
             if key.startswith(provider + '_'):
                 out[key] = meta
@@ -193,69 +887,106 @@ class Database:
     def import_from_file(self, path: str):
         with open(path, 'r') as f:
             data = json.load(f)
+        entries = []
         for key, meta in data.items():
             parts = key.split('_', 1)
             if len(parts) != 2:
                 continue
             provider, cfg = parts
-            blob = meta.get('blob')
-            info = {k: v for k, v in meta.items() if k != 'blob'}
-            self.set('tokens', key, info)
-            if blob:
-                self.set_blob('tokens', provider, cfg, {'blob': blob})
+            entries.append({
+                'category': 'tokens',
+                'provider': provider,
+                'config_name': cfg,
+                'info': {k: v for k, v in meta.items() if k != 'blob'},
+                'blob': meta.get('blob') or None,
+            })
+        self.bulk_upsert(entries)
 
     def list_categories(self) -> list:
-        conn = sqlite3.connect(self.sqlite_path)
-        try:
-            cur = conn.cursor()
-            cur.execute('SELECT name FROM categories ORDER BY name')
-            return [row[0] for row in cur.fetchall()]
-        finally:
-            conn.close()
+        def load():
+            rust = self._rust_backend()
+            if rust is not None:
+                try:
+                    return rust.list_categories()
+                except Exception as e:
+                    logger.warning(f"Rust list_categories failed, using Python fallback: {e}")
+            with self._transaction() as conn:
+                cur = conn.cursor()
+                cur.execute('SELECT name FROM categories ORDER BY name')
+                return [row[0] for row in cur.fetchall()]
+        return list(self._cached(('categories',), load))
 
     def add_category(self, name: str):
-        conn = sqlite3.connect(self.sqlite_path)
-        try:
+        with self._transaction('categories') as conn:
             cur = conn.cursor()
-            cur.execute('INSERT OR IGNORE INTO categories (name) VALUES (?)', (name,))
-            conn.commit()
-        finally:
-            conn.close()
+            cur.execute('INSERT INTO categories (name) VALUES (?) ON CONFLICT (name) DO NOTHING', (name,))
 
     def delete_category(self, name: str):
         if name in ('tokens', 'apis'):
             return False
-        conn = sqlite3.connect(self.sqlite_path)
-        try:
+        with self._transaction('categories') as conn:
             cur = conn.cursor()
             cur.execute('DELETE FROM categories WHERE name = ?', (name,))
-            conn.commit()
             return True
-        finally:
-            conn.close()
 
     def get_setting(self, key: str, default: str = None) -> Optional[str]:
-        conn = sqlite3.connect(self.sqlite_path)
-        try:
-            cur = conn.cursor()
-            cur.execute('SELECT value FROM settings WHERE key = ?', (key,))
-            row = cur.fetchone()
-            return row[0] if row else default
-        finally:
-            conn.close()
+        def load():
+            rust = self._rust_backend()
+            if rust is not None:
+                try:
+                    return rust.get_setting(key, None)
+                except Exception as e:
+                    logger.warning(f"Rust get_setting failed, using Python fallback: {e}")
+            with self._transaction() as conn:
+                cur = conn.cursor()
+                cur.execute('SELECT value FROM settings WHERE key = ?', (key,))
+                row = cur.fetchone()
+                return row[0] if row else None
+        value = self._cached(('setting', key), load)
+        return default if value is None else value
 
     def set_setting(self, key: str, value: str):
-        conn = sqlite3.connect(self.sqlite_path)
-        try:
+        with self._transaction('setting') as conn:
+            cur = conn.cursor()
+            cur.execute('''INSERT INTO settings (key, value) VALUES (?, ?)
+                          ON CONFLICT (key) DO UPDATE SET value = excluded.value''', (key, value))
+
+    # provider data keys, stored wrapped by a master key
+    def list_provider_keys(self, master_key_id: str) -> list:
+        """(key_id, provider, wrapped) for every data key wrapped by the given master key."""
+        with self._transaction() as conn:
+            cur = conn.cursor()
+            cur.execute('SELECT key_id, provider, wrapped FROM provider_keys WHERE master_key_id = ? ORDER BY provider',
+                        (master_key_id,))
+            return [(key_id, provider, bytes(wrapped)) for key_id, provider, wrapped in cur.fetchall()]
+
+    def add_provider_key(self, key_id: str, provider: str, master_key_id: str, wrapped: bytes) -> bool:
+        """Store a wrapped data key; False if the provider or key id is already taken under that master key."""
+        with self._transaction() as conn:
+            cur = conn.cursor()
+            cur.execute('''INSERT INTO provider_keys (key_id, provider, master_key_id, wrapped)
+                           VALUES (?, ?, ?, ?) ON CONFLICT DO NOTHING''',
+                        (key_id, provider, master_key_id, bytes(wrapped)))
+            return cur.rowcount == 1
+
+    def count_provider_keys(self, exclude: Iterable[str] = ()) -> int:
+        """Number of stored data keys wrapped by master keys other than those in `exclude`."""
+        exclude = list(exclude)
+        clause = f"WHERE master_key_id NOT IN ({', '.join('?' * len(exclude))})" if exclude else ''
+        with self._transaction() as conn:
+            cur = conn.cursor()
+            cur.execute(f'SELECT COUNT(*) FROM provider_keys {clause}', exclude)
+            return cur.fetchone()[0]
+
+    def prune_provider_keys(self, master_key_id: str) -> int:
+        """Drop data keys wrapped by any master key other than the given one."""
+        with self._transaction() as conn:
             cur = conn.cursor()
-            cur.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)', (key, value))
-            conn.commit()
-        finally:
-            conn.close()
+            cur.execute('DELETE FROM provider_keys WHERE master_key_id != ?', (master_key_id,))
+            return cur.rowcount
 
     def _ensure_metadata_row(self, category: str, provider: str, cfg: str):
-        conn = sqlite3.connect(self.sqlite_path)
-        try:
+        with self._transaction('entries') as conn:
             cur = conn.cursor()
             cur.execute('SELECT 1 FROM metadata WHERE category = ? AND provider = ? AND config_name = ?',
                        (category, provider, cfg))
@@ -265,183 +996,197 @@ class Database:
                     INSERT INTO metadata (category, provider, config_name, info, updated_at)
                     VALUES (?, ?, ?, ?, ?)
                 ''', (category, provider, cfg, '{}', datetime.utcnow()))
-                conn.commit()
-        finally:
-            conn.close()
         with self.lock:
-            data = self._read_json()
             key = f"{provider}_{cfg}"
-            if category not in data:
-                data[category] = {}
-            if key not in data[category]:
-                data[category][key] = {
+            if key not in self._json_data.get(category, {}):
+                self._json_put(category, key, {
                     'provider': provider,
                     'config_name': cfg,
                     'updated_at': datetime.utcnow().isoformat()
-                }
-                self._write_json(data)
+                })
 
     def sync_filesystem_entry(self, category: str, provider: str, cfg: str, has_credential: bool = True):
         self._ensure_metadata_row(category, provider, cfg)
         with self.lock:
-            data = self._read_json()
-            key = f"{provider}_{cfg}"
-            if category in data and key in data[category]:
-                data[category][key]['stored'] = 'filesystem' if has_credential else 'metadata_only'
-                data[category][key]['updated_at'] = datetime.utcnow().isoformat()
-                self._write_json(data)
+            self._json_update(category, f"{provider}_{cfg}",
+                              stored='filesystem' if has_credential else 'metadata_only')
 
     def set_favorite(self, category: str, provider: str, cfg: str, favorite: bool):
         self._ensure_metadata_row(category, provider, cfg)
-        conn = sqlite3.connect(self.sqlite_path)
-        try:
+        with self._transaction('entries') as conn:
             cur = conn.cursor()
             cur.execute('UPDATE metadata SET favorite = ?, updated_at = ? WHERE category = ? AND provider = ? AND config_name = ?',
                        (1 if favorite else 0, datetime.utcnow(), category, provider, cfg))
-            conn.commit()
-        finally:
-            conn.close()
         with self.lock:
-            data = self._read_json()
-            key = f"{provider}_{cfg}"
-            if category in data and key in data[category]:
-                data[category][key]['favorite'] = favorite
-                data[category][key]['updated_at'] = datetime.utcnow().isoformat()
-                self._write_json(data)
+            self._json_update(category, f"{provider}_{cfg}", favorite=favorite)
 
     def set_notes(self, category: str, provider: str, cfg: str, notes: str):
         self._ensure_metadata_row(category, provider, cfg)
-        conn = sqlite3.connect(self.sqlite_path)
-        try:
+        with self._transaction('entries') as conn:
             cur = conn.cursor()
             cur.execute('UPDATE metadata SET notes = ?, updated_at = ? WHERE category = ? AND provider = ? AND config_name = ?',
                        (notes, datetime.utcnow(), category, provider, cfg))
-            conn.commit()
-        finally:
-            conn.close()
         with self.lock:
-            data = self._read_json()
-            key = f"{provider}_{cfg}"
-            if category in data and key in data[category]:
-                data[category][key]['notes'] = notes
-                data[category][key]['updated_at'] = datetime.utcnow().isoformat()
-                self._write_json(data)
+            self._json_update(category, f"{provider}_{cfg}", notes=notes)
 
     def set_expiry(self, category: str, provider: str, cfg: str, expires_at: Optional[str]):
         self._ensure_metadata_row(category, provider, cfg)
-        conn = sqlite3.connect(self.sqlite_path)
-        try:
+        with self._transaction('entries') as conn:
             cur = conn.cursor()
-            cur.execute('UPDATE metadata SET expires_at = ?, updated_at = ? WHERE category = ? AND provider = ? AND config_name = ?',
-                       (expires_at, datetime.utcnow(), category, provider, cfg))
-            conn.commit()
-        finally:
-            conn.close()
+            cur.execute('UPDATE metadata SET expires_at = ?, expires_epoch = ?, updated_at = ? WHERE category = ? AND provider = ? AND config_name = ?',
+                       (expires_at, expiry_to_epoch(expires_at), datetime.utcnow(), category, provider, cfg))
         with self.lock:
-            data = self._read_json()
-            key = f"{provider}_{cfg}"
-            if category in data and key in data[category]:
-                data[category][key]['expires_at'] = expires_at
-                data[category][key]['updated_at'] = datetime.utcnow().isoformat()
-                self._write_json(data)
+            self._json_update(category, f"{provider}_{cfg}", expires_at=expires_at)
 
     def get_all_entries(self, category: str = None) -> list:
-        conn = sqlite3.connect(self.sqlite_path)
-        try:
-            cur = conn.cursor()
+        def load():
+            rust = self._rust_backend()
+            if rust is not None:
+                try:
+                    return rust.get_all_entries(category or None)
+                except Exception as e:
+                    logger.warning(f"Rust get_all_entries failed, using Python fallback: {e}")
             if category:
-                cur.execute('''SELECT category, provider, config_name, info, favorite, notes, expires_at, updated_at 
-                              FROM metadata WHERE category = ? ORDER BY favorite DESC, provider, config_name''', (category,))
+                rows = self._stream(f'''SELECT {self.ENTRY_COLUMNS}
+                                       FROM metadata WHERE category = ? ORDER BY favorite DESC, provider, config_name''', (category,))
             else:
-                cur.execute('''SELECT category, provider, config_name, info, favorite, notes, expires_at, updated_at 
-                              FROM metadata ORDER BY favorite DESC, category, provider, config_name''')
-            rows = cur.fetchall()
-            entries = []
-            for row in rows:
-                entries.append({
-                    'category': row[0],
-                    'provider': row[1],
-                    'config_name': row[2],
-                    'info': json.loads(row[3]) if row[3] else {},
-                    'favorite': bool(row[4]),
-                    'notes': row[5] or '',
-                    'expires_at': row[6],
-                    'updated_at': row[7]
-                })
-            return entries
-        finally:
-            conn.close()
+                rows = self._stream(f'''SELECT {self.ENTRY_COLUMNS}
+                                       FROM metadata ORDER BY favorite DESC, category, provider, config_name''')
+            return [self._entry_from_row(row) for row in rows]
+        # the list is copied but the entry dicts are shared; treat them as read-only
+        return list(self._cached(('entries', category or None), load))
 
-    def search_entries(self, query: str) -> list:
-        conn = sqlite3.connect(self.sqlite_path)
-        try:
+    @staticmethod
+    def _entry_from_row(row) -> Dict[str, Any]:
+        return {
+            'category': row[0],
+            'provider': row[1],
+            'config_name': row[2],
+            'info': json.loads(row[3]) if row[3] else {},
+            'favorite': bool(row[4]),
+            'notes': row[5] or '',
+            'expires_at': row[6],
+            'updated_at': row[7]
+        }
+
+    @staticmethod
+    def entry_key(entry: Dict[str, Any]) -> Tuple[int, str, str, str]:
+        """Keyset cursor for an entry; pass it to iter_entries(after=...) to resume."""
+        return int(entry['favorite']), entry['category'], entry['provider'], entry['config_name']
+
+    def iter_entries(self, category: str = None, after: Optional[Tuple[int, str, str, str]] = None,
+                     limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Stream entries in get_all_entries() order without loading the whole vault.
+
+        Rows are fetched PAGE_SIZE at a time by keyset pagination on
+        (favorite, category, provider, config_name), so every page is an index seek and
+        no cursor is held open between pages. `after` resumes behind an entry_key();
+        `limit` caps the number of entries yielded.
+        """
+        remaining = limit
+        for band in (1, 0):
+            if after is not None and band > after[0]:
+                continue
+            position = after[1:] if after is not None and band == after[0] else None
+            while remaining is None or remaining > 0:
+                size = self.PAGE_SIZE if remaining is None else min(self.PAGE_SIZE, remaining)
+                rows = self._entries_page(category, band, position, size)
+                for row in rows:
+                    yield self._entry_from_row(row)
+                if remaining is not None:
+                    remaining -= len(rows)
+                if len(rows) < size:
+                    break
+                position = tuple(rows[-1][:3])
+
+    def _entries_page(self, category: Optional[str], favorite: int, position: Optional[tuple], size: int) -> list:
+        clauses, params = ['favorite = ?'], [favorite]
+        if category:
+            clauses.append('category = ?')
+            params.append(category)
+            if position is not None:
+                clauses.append('(provider, config_name) > (?, ?)')
+                params.extend(position[1:])
+        elif position is not None:
+            clauses.append('(category, provider, config_name) > (?, ?, ?)')
+            params.extend(position)
+        params.append(size)
+        with self._transaction() as conn:
             cur = conn.cursor()
-            pattern = f'%{query}%'
-            cur.execute('''SELECT category, provider, config_name, info, favorite, notes, expires_at, updated_at 
-                          FROM metadata 
-                          WHERE provider LIKE ? OR config_name LIKE ? OR notes LIKE ?
-                          ORDER BY favorite DESC, provider, config_name''', (pattern, pattern, pattern))
-            rows = cur.fetchall()
-            entries = []
-            for row in rows:
-                entries.append({
-                    'category': row[0],
-                    'provider': row[1],
-                    'config_name': row[2],
-                    'info': json.loads(row[3]) if row[3] else {},
-                    'favorite': bool(row[4]),
-                    'notes': row[5] or '',
-                    'expires_at': row[6],
-                    'updated_at': row[7]
-                })
-            return entries
-        finally:
-            conn.close()
+            cur.execute(f'''SELECT {self.ENTRY_COLUMNS} FROM metadata
+                           WHERE {' AND '.join(clauses)}
+                           ORDER BY category, provider, config_name LIMIT ?''', params)
+            return cur.fetchall()
+
+    def search_entries(self, query: str) -> list:
+        """Search provider, config name, notes and info.
+
+        With FTS5 every word in the query must match the start of a token, and results
+        are ranked by bm25 with provider and config name weighted highest. Without FTS5
+        this is a substring scan.
+        """
+        return list(self.iter_search_entries(query))
+
+    def iter_search_entries(self, query: str) -> Iterator[Dict[str, Any]]:
+        """Streaming form of search_entries(); rows are fetched PAGE_SIZE at a time."""
+        terms = re.findall(r'\w+', query)
+        if self._fts and terms:
+            match = ' '.join(f'"{term}"*' for term in terms)
+            rows = self._stream('''SELECT m.category, m.provider, m.config_name, m.info, m.favorite, m.notes, m.expires_at, m.updated_at
+                                  FROM metadata_fts JOIN metadata m ON m.rowid = metadata_fts.rowid
+                                  WHERE metadata_fts MATCH ?
+                                  ORDER BY m.favorite DESC, bm25(metadata_fts, 10.0, 10.0, 2.0, 1.0)''', (match,))
+        else:
+            rows = self._search_scan(query)
+        for row in rows:
+            yield self._entry_from_row(row)
+
+    def _search_scan(self, query: str) -> Iterator[tuple]:
+        pattern = f'%{query}%'
+        return self._stream(f'''SELECT {self.ENTRY_COLUMNS}
+                               FROM metadata
+                               WHERE provider LIKE ? OR config_name LIKE ? OR notes LIKE ? OR info LIKE ?
+                               ORDER BY favorite DESC, provider, config_name''', (pattern, pattern, pattern, pattern))
 
     def get_expiring_entries(self, days: int = 7) -> list:
-        conn = sqlite3.connect(self.sqlite_path)
-        try:
+        """Entries whose expiry is at most `days` whole days away, including expired ones.
+
+        Uses the indexed expires_epoch column, so the cost is a range scan over the
+        matching rows only.
+        """
+        now = int(datetime.now(timezone.utc).timestamp())
+        # whole days remaining <= days  <=>  expiry before the end of day `days`
+        cutoff = now + (days + 1) * SECONDS_PER_DAY
+        with self._transaction() as conn:
             cur = conn.cursor()
-            cur.execute('''SELECT category, provider, config_name, expires_at 
-                          FROM metadata 
-                          WHERE expires_at IS NOT NULL 
-                          AND expires_at != ''
-                          ORDER BY expires_at''')
-            rows = cur.fetchall()
-            expiring = []
-            now = datetime.utcnow()
-            for row in rows:
-                try:
-                    exp_date = datetime.fromisoformat(row[3].replace('Z', '+00:00').replace('+00:00', ''))
-                    if (exp_date - now).days <= days:
-                        expiring.append({
-                            'category': row[0],
-                            'provider': row[1],
-                            'config_name': row[2],
-                            'expires_at': row[3],
-                            'days_remaining': (exp_date - now).days
-                        })
-                except Exception:
-                    continue
-            return expiring
-        finally:
-            conn.close()
+            cur.execute('''SELECT category, provider, config_name, expires_at, expires_epoch
+                          FROM metadata
+                          WHERE expires_epoch < ?
+                          ORDER BY expires_epoch''', (cutoff,))
+            return [{
+                'category': row[0],
+                'provider': row[1],
+                'config_name': row[2],
+                'expires_at': row[3],
+                'days_remaining': (row[4] - now) // SECONDS_PER_DAY
+            } for row in cur.fetchall()]
 
     def import_from_csv(self, path: str, category: str = 'tokens'):
         import csv
         with open(path, 'r', newline='', encoding='utf-8') as f:
             reader = csv.DictReader(f)
-            count = 0
+            entries = []
             for row in reader:
                 provider = row.get('provider', row.get('Provider', 'Other'))
-                config_name = row.get('config_name', row.get('name', row.get('Name', f'imported_{count}')))
+                config_name = row.get('config_name', row.get('name', row.get('Name', f'imported_{len(entries)}')))
                 notes = row.get('notes', row.get('Notes', ''))
                 expires_at = row.get('expires_at', row.get('Expires', ''))
-                info = {'imported': True, 'source': 'csv'}
-                self.set(category, f"{provider}_{config_name}", info)
-                if notes:
-                    self.set_notes(category, provider, config_name, notes)
-                if expires_at:
-                    self.set_expiry(category, provider, config_name, expires_at)
-                count += 1
-            return count
\ No newline at end of file
+                entries.append({
+                    'category': category,
+                    'provider': provider,
+                    'config_name': config_name,
+                    'info': {'imported': True, 'source': 'csv'},
+                    'notes': notes or None,
+                    'expires_at': expires_at or None,
+                })
+            return self.bulk_upsert(entries)
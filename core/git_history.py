@@ -0,0 +1,546 @@
+import os
+import re
+import mmap
+import zlib
+import struct
+import logging
+from collections import OrderedDict
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from core.scanner import scan_bytes
+
+logger = logging.getLogger('sequential.scanner')
+
+OBJ_COMMIT, OBJ_TREE, OBJ_BLOB, OBJ_TAG = 1, 2, 3, 4
+OBJ_OFS_DELTA, OBJ_REF_DELTA = 6, 7
+_TYPES = {b'commit': OBJ_COMMIT, b'tree': OBJ_TREE, b'blob': OBJ_BLOB, b'tag': OBJ_TAG}
+
+TREE_MODE = b'40000'
+GITLINK_MODE = b'160000'
+IDX_MAGIC = b'\xfftOc'
+
+
+class HistoryHit(NamedTuple):
+    # hex ids; commit and path are None for a blob no commit reaches
+    commit: Optional[str]
+    path: Optional[str]
+    blob: str
+    label: str
+    secret: str
+    offset: int
+
+
+def _varint(data, pos: int) -> Tuple[int, int]:
+    """Little-endian base-128 size from a delta header; returns (value, next position)."""
+    value = shift = 0
+    while True:
+        c = data[pos]
+        pos += 1
+        value |= (c & 0x7f) << shift
+        shift += 7
+        if not c & 0x80:
+            return value, pos
+
+
+def _apply_delta(base: bytes, delta: bytes) -> bytes:
+    src_size, pos = _varint(delta, 0)
+    dst_size, pos = _varint(delta, pos)
+    if src_size != len(base):
+        raise ValueError('Delta does not match its base object')
+    source = memoryview(base)
+    out = bytearray()
+    end = len(delta)
+    while pos < end:
+        op = delta[pos]
+        pos += 1
+        if op & 0x80:
+            # copy from the base: bits 0-3 flag offset bytes, bits 4-6 size bytes
+            offset = size = 0
+            for i in range(4):
+                if op & (1 << i):
+                    offset |= delta[pos] << (8 * i)
+                    pos += 1
+            for i in range(3):
+                if op & (0x10 << i):
+                    size |= delta[pos] << (8 * i)
+                    pos += 1
+            out += source[offset:offset + (size or 0x10000)]
+        elif op:
+            out += delta[pos:pos + op]
+            pos += op
+        else:
+            raise ValueError('Reserved delta opcode')
+    if len(out) != dst_size:
+        raise ValueError('Delta produced the wrong size')
+    return bytes(out)
+
+
+class _Pack:
+    """A packfile and its version 2 .idx, both memory-mapped."""
+
+    def __init__(self, idx_path: str):
+        self.path = idx_path[:-len('.idx')] + '.pack'
+        self._idx = self._map(idx_path)
+        if self._idx[:4] != IDX_MAGIC or struct.unpack_from('>I', self._idx, 4)[0] != 2:
+            raise ValueError(f'{idx_path} is not a version 2 pack index')
+        self._fanout = struct.unpack_from('>256I', self._idx, 8)
+        self.count = self._fanout[255]
+        self._names = 8 + 256 * 4
+        # after the names come a CRC32 per object, then 4-byte offsets, then 8-byte ones
+        self._offsets = self._names + 24 * self.count
+        self._large = self._offsets + 4 * self.count
+        self.data = self._map(self.path)
+
+    @staticmethod
+    def _map(path: str) -> mmap.mmap:
+        with open(path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def find(self, oid: bytes) -> Optional[int]:
+        """Offset of oid in the pack, or None."""
+        lo = self._fanout[oid[0] - 1] if oid[0] else 0
+        hi = self._fanout[oid[0]]
+        idx, names = self._idx, self._names
+        while lo < hi:
+            mid = (lo + hi) // 2
+            name = idx[names + 20 * mid:names + 20 * mid + 20]
+            if name < oid:
+                lo = mid + 1
+            elif name > oid:
+                hi = mid
+            else:
+                offset = struct.unpack_from('>I', idx, self._offsets + 4 * mid)[0]
+                if offset & 0x80000000:
+                    offset = struct.unpack_from('>Q', idx, self._large + 8 * (offset & 0x7fffffff))[0]
+                return offset
+        return None
+
+    def oids(self) -> Iterator[bytes]:
+        for i in range(self.count):
+            yield self._idx[self._names + 20 * i:self._names + 20 * i + 20]
+
+    def header(self, offset: int) -> Tuple[int, int, int]:
+        """(type, inflated size, position after the header) of the entry at offset."""
+        data = self.data
+        c = data[offset]
+        kind, size, shift = (c >> 4) & 7, c & 0x0f, 4
+        pos = offset + 1
+        while c & 0x80:
+            c = data[pos]
+            pos += 1
+            size |= (c & 0x7f) << shift
+            shift += 7
+        return kind, size, pos
+
+    def base_offset(self, offset: int, pos: int) -> Tuple[int, int]:
+        """(base offset, data position) for an OFS_DELTA entry whose header ends at pos."""
+        data = self.data
+        c = data[pos]
+        pos += 1
+        distance = c & 0x7f
+        while c & 0x80:
+            c = data[pos]
+            pos += 1
+            distance = ((distance + 1) << 7) | (c & 0x7f)
+        return offset - distance, pos
+
+    def inflate(self, pos: int, size: int) -> bytes:
+        d = zlib.decompressobj()
+        # deflate adds at most a few bytes per 16 KiB block, so this is usually one read
+        step = size + size // 1000 + 64
+        out = []
+        while not d.eof:
+            chunk = self.data[pos:pos + step]
+            if not chunk:
+                raise ValueError(f'Truncated object in {self.path}')
+            out.append(d.decompress(chunk))
+            pos += step
+        result = b''.join(out)
+        if len(result) != size:
+            raise ValueError(f'Corrupt object in {self.path}')
+        return result
+
+    def close(self):
+        self.data.close()
+        self._idx.close()
+
+
+class GitObjectStore:
+    """Read-only access to a repository's objects: loose, packed and through alternates.
+
+    Delta chains are resolved in the pack, so nothing is shelled out to git. Resolved
+    objects up to CACHE_BYTES in total are kept, since neighbouring blobs tend to share
+    delta bases. Safe to read from several threads.
+    """
+
+    CACHE_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, objects_dir: str):
+        self.dirs = self._object_dirs(objects_dir)
+        self.packs: List[_Pack] = []
+        for d in self.dirs:
+            pack_dir = os.path.join(d, 'pack')
+            if os.path.isdir(pack_dir):
+                for name in sorted(os.listdir(pack_dir)):
+                    if name.endswith('.idx') and os.path.exists(os.path.join(pack_dir, name[:-4] + '.pack')):
+                        self.packs.append(_Pack(os.path.join(pack_dir, name)))
+        self._cache: 'OrderedDict[Tuple[int, int], Tuple[int, bytes]]' = OrderedDict()
+        self._cached = 0
+        self._lock = Lock()
+
+    @staticmethod
+    def _object_dirs(objects_dir: str) -> List[str]:
+        dirs, todo = [], [os.path.abspath(objects_dir)]
+        while todo:
+            d = todo.pop(0)
+            if d in dirs or not os.path.isdir(d):
+                continue
+            dirs.append(d)
+            alternates = os.path.join(d, 'info', 'alternates')
+            if os.path.isfile(alternates):
+                with open(alternates, 'r', encoding='utf-8') as f:
+                    todo.extend(os.path.normpath(os.path.join(d, line.strip())) for line in f
+                                if line.strip() and not line.startswith('#'))
+        return dirs
+
+    def _loose_path(self, oid: bytes) -> Optional[str]:
+        name = oid.hex()
+        for d in self.dirs:
+            path = os.path.join(d, name[:2], name[2:])
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def _locate(self, oid: bytes) -> Optional[Tuple[int, int]]:
+        for i, pack in enumerate(self.packs):
+            offset = pack.find(oid)
+            if offset is not None:
+                return i, offset
+        return None
+
+    def __contains__(self, oid: bytes) -> bool:
+        return self._locate(oid) is not None or self._loose_path(oid) is not None
+
+    def oids(self) -> Iterator[bytes]:
+        """Every object id in the store; an id packed more than once is listed more than once."""
+        for pack in self.packs:
+            yield from pack.oids()
+        for d in self.dirs:
+            for prefix in sorted(os.listdir(d)):
+                if len(prefix) == 2 and os.path.isdir(os.path.join(d, prefix)):
+                    for rest in os.listdir(os.path.join(d, prefix)):
+                        if len(rest) == 38:
+                            yield bytes.fromhex(prefix + rest)
+
+    def read(self, oid: bytes) -> Tuple[int, bytes]:
+        """(type, content) of an object; KeyError if the store does not have it."""
+        location = self._locate(oid)
+        if location is not None:
+            return self._unpack(*location)
+        path = self._loose_path(oid)
+        if path is None:
+            raise KeyError(oid.hex())
+        with open(path, 'rb') as f:
+            raw = zlib.decompress(f.read())
+        head, _, body = raw.partition(b'\0')
+        kind, _, size = head.partition(b' ')
+        if kind not in _TYPES or int(size) != len(body):
+            raise ValueError(f'Corrupt loose object {oid.hex()}')
+        return _TYPES[kind], body
+
+    def kind(self, oid: bytes) -> int:
+        """An object's type without inflating it, where the store allows."""
+        location = self._locate(oid)
+        if location is None:
+            return self.read(oid)[0]
+        pack = self.packs[location[0]]
+        offset = location[1]
+        while True:
+            kind, _, pos = pack.header(offset)
+            if kind == OBJ_OFS_DELTA:
+                offset = pack.base_offset(offset, pos)[0]
+            elif kind == OBJ_REF_DELTA:
+                return self.kind(bytes(pack.data[pos:pos + 20]))
+            else:
+                return kind
+
+    def _unpack(self, index: int, offset: int) -> Tuple[int, bytes]:
+        pack = self.packs[index]
+        # walk down the delta chain to something whole, then apply the deltas back up
+        chain = []
+        while True:
+            cached = self._cache_get((index, offset))
+            if cached is not None:
+                kind, content = cached
+                break
+            kind, size, pos = pack.header(offset)
+            if kind == OBJ_OFS_DELTA:
+                base, pos = pack.base_offset(offset, pos)
+                chain.append((offset, pack.inflate(pos, size)))
+                offset = base
+            elif kind == OBJ_REF_DELTA:
+                chain.append((offset, pack.inflate(pos + 20, size)))
+                kind, content = self.read(bytes(pack.data[pos:pos + 20]))
+                break
+            elif kind in (OBJ_COMMIT, OBJ_TREE, OBJ_BLOB, OBJ_TAG):
+                content = pack.inflate(pos, size)
+                self._cache_put((index, offset), kind, content)
+                break
+            else:
+                raise ValueError(f'Unknown object type {kind} in {pack.path}')
+        for at, delta in reversed(chain):
+            content = _apply_delta(content, delta)
+            self._cache_put((index, at), kind, content)
+        return kind, content
+
+    def _cache_get(self, key):
+        with self._lock:
+            value = self._cache.get(key)
+            if value is not None:
+                self._cache.move_to_end(key)
+            return value
+
+    def _cache_put(self, key, kind: int, content: bytes):
+        if len(content) > self.CACHE_BYTES // 8:
+            return
+        with self._lock:
+            if key in self._cache:
+                return
+            self._cache[key] = (kind, content)
+            self._cached += len(content)
+            while self._cached > self.CACHE_BYTES:
+                _, (_, old) = self._cache.popitem(last=False)
+                self._cached -= len(old)
+
+    def close(self):
+        for pack in self.packs:
+            pack.close()
+        self.packs = []
+        self._cache.clear()
+        self._cached = 0
+
+
+def find_git_dir(path: str) -> Tuple[str, str]:
+    """(git dir, common dir) for a work tree, a bare repository or a linked worktree."""
+    path = os.path.abspath(os.path.expanduser(path))
+    dot_git = os.path.join(path, '.git')
+    if os.path.isdir(dot_git):
+        git_dir = dot_git
+    elif os.path.isfile(dot_git):
+        with open(dot_git, 'r', encoding='utf-8') as f:
+            line = f.readline().strip()
+        if not line.startswith('gitdir:'):
+            raise ValueError(f'Unrecognised .git file in {path}')
+        git_dir = os.path.join(path, line[len('gitdir:'):].strip())
+    elif os.path.isdir(os.path.join(path, 'objects')) and os.path.isfile(os.path.join(path, 'HEAD')):
+        git_dir = path
+    else:
+        raise ValueError(f'{path} is not a git repository')
+    common = git_dir
+    commondir = os.path.join(git_dir, 'commondir')
+    if os.path.isfile(commondir):
+        with open(commondir, 'r', encoding='utf-8') as f:
+            common = os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    config = os.path.join(common, 'config')
+    if os.path.isfile(config):
+        with open(config, 'r', encoding='utf-8', errors='replace') as f:
+            if re.search(r'(?im)^\s*objectformat\s*=\s*sha256', f.read()):
+                raise ValueError('SHA-256 repositories are not supported')
+    return git_dir, common
+
+
+def _ref_tips(git_dir: str, common: str) -> Set[bytes]:
+    """Every object a ref, HEAD or worktree HEAD points at, tags still unpeeled."""
+    refs: Dict[str, str] = {}
+    tips = set()
+    packed = os.path.join(common, 'packed-refs')
+    if os.path.isfile(packed):
+        with open(packed, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith('^'):
+                    tips.add(line[1:])
+                elif line and not line.startswith('#'):
+                    oid, _, name = line.partition(' ')
+                    refs[name] = oid
+    for top, _, files in os.walk(os.path.join(common, 'refs')):
+        for name in files:
+            path = os.path.join(top, name)
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                refs[os.path.relpath(path, common).replace(os.sep, '/')] = f.read().strip()
+    heads = [os.path.join(git_dir, 'HEAD'), os.path.join(common, 'HEAD')]
+    worktrees = os.path.join(common, 'worktrees')
+    if os.path.isdir(worktrees):
+        heads.extend(os.path.join(worktrees, name, 'HEAD') for name in os.listdir(worktrees))
+    for path in heads:
+        if os.path.isfile(path):
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                refs[path] = f.read().strip()
+    for value in refs.values():
+        # symbolic refs: HEAD to a branch, or one ref to another
+        for _ in range(10):
+            if not value.startswith('ref:'):
+                break
+            value = refs.get(value[4:].strip(), '')
+        if re.fullmatch(r'[0-9a-f]{40}', value):
+            tips.add(value)
+    return {bytes.fromhex(oid) for oid in tips}
+
+
+def _parse_commit(data: bytes) -> Tuple[bytes, List[bytes], int]:
+    """(tree, parents, committer time) of a commit object."""
+    tree, parents, when = None, [], 0
+    for line in data.split(b'\n\n', 1)[0].split(b'\n'):
+        if line.startswith(b'tree '):
+            tree = bytes.fromhex(line[5:45].decode('ascii'))
+        elif line.startswith(b'parent '):
+            parents.append(bytes.fromhex(line[7:47].decode('ascii')))
+        elif line.startswith(b'committer '):
+            fields = line.rsplit(b' ', 2)
+            if len(fields) == 3 and fields[1].isdigit():
+                when = int(fields[1])
+    if tree is None:
+        raise ValueError('Commit without a tree')
+    return tree, parents, when
+
+
+def _parse_tree(data: bytes) -> Dict[bytes, Tuple[bytes, bytes]]:
+    """{name: (mode, oid)} for a tree object."""
+    entries = {}
+    pos, end = 0, len(data)
+    while pos < end:
+        space = data.index(b' ', pos)
+        nul = data.index(b'\0', space)
+        entries[data[space + 1:nul]] = (data[pos:space], data[nul + 1:nul + 21])
+        pos = nul + 21
+    return entries
+
+
+class HistoryScanner:
+    """Scan every blob a repository's history ever held, each unique blob once.
+
+    Commits are walked from all refs and worktree HEADs. Each commit's tree is compared
+    with its parents' trees, skipping subtrees whose id matches, and the commit is
+    credited with each (path, blob) that none of its parents had at that path. A
+    root commit, or one whose parents a shallow clone lacks, introduces its whole tree.
+    The unique blobs are then read and scanned in a thread pool, and each hit is
+    reported once per commit and path that introduced its blob. With
+    include_unreachable, blobs that no commit reaches, such as leftovers from an
+    amended commit that gc has not pruned yet, are scanned too.
+    """
+
+    TREE_CACHE = 8192
+
+    def __init__(self, repo: str = '.', workers: Optional[int] = None, include_unreachable: bool = False):
+        self.git_dir, self.common_dir = find_git_dir(repo)
+        self.workers = workers or min(32, (os.cpu_count() or 1) + 4)
+        self.include_unreachable = include_unreachable
+        self._trees: 'OrderedDict[bytes, Dict]' = OrderedDict()
+
+    def scan(self) -> List[HistoryHit]:
+        store = GitObjectStore(os.path.join(self.common_dir, 'objects'))
+        try:
+            commits = self._commits(store)
+            introduced: Dict[bytes, List[Tuple[bytes, bytes]]] = {}
+            for oid, (tree, parents, _) in commits.items():
+                parent_trees = [commits[p][0] for p in parents if p in commits]
+                for path, blob in self._introduced(store, tree, parent_trees, b''):
+                    introduced.setdefault(blob, []).append((oid, path))
+            blobs = list(introduced)
+            if self.include_unreachable:
+                blobs.extend(self._unreachable(store, set(introduced)))
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='seq-history') as pool:
+                found = dict(zip(blobs, pool.map(lambda blob: self._scan_blob(store, blob), blobs)))
+        finally:
+            store.close()
+            self._trees.clear()
+
+        order = {oid: i for i, oid in enumerate(sorted(commits, key=lambda c: -commits[c][2]))}
+        hits = []
+        for blob, secrets in found.items():
+            for label, secret, offset in secrets:
+                for commit, path in introduced.get(blob, [(None, None)]):
+                    hits.append(HistoryHit(commit and commit.hex(), path and path.decode('utf-8', 'replace'),
+                                           blob.hex(), label, secret, offset))
+        hits.sort(key=lambda h: (order.get(bytes.fromhex(h.commit)) if h.commit else len(order),
+                                 h.path or '', h.blob, h.offset))
+        logger.info('Scanned %d blobs from %d commits in %s: %d hits',
+                    len(blobs), len(commits), self.common_dir, len(hits))
+        return hits
+
+    def _commits(self, store: GitObjectStore) -> Dict[bytes, Tuple[bytes, List[bytes], int]]:
+        commits = {}
+        todo = list(_ref_tips(self.git_dir, self.common_dir))
+        while todo:
+            oid = todo.pop()
+            if oid in commits:
+                continue
+            try:
+                kind, data = store.read(oid)
+            except KeyError:
+                # shallow boundary, or a ref to a pruned object
+                continue
+            if kind == OBJ_TAG:
+                match = re.match(rb'object ([0-9a-f]{40})\n', data)
+                if match:
+                    todo.append(bytes.fromhex(match.group(1).decode('ascii')))
+            elif kind == OBJ_COMMIT:
+                commits[oid] = _parse_commit(data)
+                todo.extend(commits[oid][1])
+        return commits
+
+    def _tree(self, store: GitObjectStore, oid: bytes) -> Dict[bytes, Tuple[bytes, bytes]]:
+        tree = self._trees.get(oid)
+        if tree is None:
+            tree = _parse_tree(store.read(oid)[1])
+            self._trees[oid] = tree
+            if len(self._trees) > self.TREE_CACHE:
+                self._trees.popitem(last=False)
+        else:
+            self._trees.move_to_end(oid)
+        return tree
+
+    def _introduced(self, store: GitObjectStore, tree: bytes, parents: List[Optional[bytes]],
+                    prefix: bytes) -> Iterator[Tuple[bytes, bytes]]:
+        """(path, blob) in tree that no parent tree has at the same path."""
+        old_trees = [self._tree(store, p) if p else {} for p in parents]
+        for name, (mode, oid) in self._tree(store, tree).items():
+            olds = [old.get(name) for old in old_trees]
+            if any(old is not None and old[1] == oid for old in olds):
+                continue
+            if mode == TREE_MODE:
+                subtrees = [old[1] if old is not None and old[0] == TREE_MODE else None for old in olds]
+                yield from self._introduced(store, oid, subtrees, prefix + name + b'/')
+            elif mode != GITLINK_MODE:
+                # submodule commits live in another repository
+                yield prefix + name, oid
+
+    @staticmethod
+    def _unreachable(store: GitObjectStore, reached: Set[bytes]) -> List[bytes]:
+        blobs = []
+        for oid in set(store.oids()) - reached:
+            try:
+                if store.kind(oid) == OBJ_BLOB:
+                    blobs.append(oid)
+            except (KeyError, ValueError) as e:
+                logger.warning(f"Skipping unreadable object {oid.hex()}: {e}")
+        return blobs
+
+    @staticmethod
+    def _scan_blob(store: GitObjectStore, oid: bytes) -> List[Tuple[str, str, int]]:
+        try:
+            return scan_bytes(store.read(oid)[1])
+        except KeyError:
+            # partial clones leave out blobs
+            return []
+        except Exception as e:
+            logger.warning(f"Skipping blob {oid.hex()}: {e}")
+            return []
+
+
+def scan_git_history(repo: str = '.', workers: Optional[int] = None,
+                     include_unreachable: bool = False) -> List[HistoryHit]:
+    """Secrets in every commit of the repository at `repo`; see HistoryScanner."""
+    return HistoryScanner(repo, workers, include_unreachable).scan()
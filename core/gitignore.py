@@ -0,0 +1,166 @@
+import os
+import re
+from typing import List, Optional, Tuple
+
+
+def _translate(pattern: str) -> str:
+    """Regex source for one gitignore glob, matched against a '/'-separated relative path."""
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**', i):
+                at_start = i == 0 or pattern[i - 1] == '/'
+                at_end = i + 2 == n or pattern[i + 2] == '/'
+                if at_start and at_end:
+                    if i + 2 == n:
+                        out.append('.*')
+                    else:
+                        # "**/" matches zero or more leading directories
+                        out.append('(?:.*/)?')
+                        i += 1
+                    i += 2
+                    continue
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            first = i + 2 if pattern[i + 1:i + 2] in ('!', '^') else i + 1
+            # a ']' straight after the opening bracket is part of the set
+            end = pattern.find(']', first + 1)
+            if end < 0:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end]
+                if body[:1] in ('!', '^'):
+                    body = '^' + body[1:]
+                out.append('[' + body.replace('\\', '\\\\') + ']')
+                i = end
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+
+class GitIgnore:
+    """gitignore(5) matching for a directory walk.
+
+    Rules from each directory's .gitignore apply beneath that directory, deeper files
+    after shallower ones, and the last matching rule wins, so `!` re-includes. A
+    pattern with an inner or leading slash is anchored to its .gitignore's directory;
+    otherwise it matches the name at any depth. A trailing slash restricts it to
+    directories. As in git, nothing below an ignored directory can be re-included,
+    so callers should not descend into one.
+
+    Paths passed in are relative to `root`, but rules are rooted at the enclosing work
+    tree (the nearest directory upwards holding .git), so a walk of a subdirectory
+    honours .git/info/exclude and every .gitignore between the work tree and `root`.
+    Outside a work tree, `root` stands in for it.
+    """
+
+    FILENAME = '.gitignore'
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.worktree = self.find_worktree(self.root) or self.root
+        prefix = os.path.relpath(self.root, self.worktree).replace(os.sep, '/')
+        self._prefix = '' if prefix == '.' else prefix
+        # (directory relative to the work tree, regex, negated, directories only)
+        self._rules: List[Tuple[str, re.Pattern, bool, bool]] = []
+        self._loaded = set()
+        exclude = os.path.join(self.worktree, '.git', 'info', 'exclude')
+        if os.path.isfile(exclude):
+            self._add_file('', exclude)
+        # root itself lies in an ignored directory, so everything below it is ignored
+        self._excluded = False
+        parts = self._prefix.split('/') if self._prefix else []
+        for depth in range(len(parts)):
+            parent = '/'.join(parts[:depth])
+            self._load(parent)
+            if self._matches('/'.join(parts[:depth + 1]), True):
+                self._excluded = True
+                break
+
+    @staticmethod
+    def find_worktree(path: str) -> Optional[str]:
+        """The nearest directory at or above path containing .git, or None."""
+        path = os.path.abspath(path)
+        while True:
+            # .git is a file in linked worktrees and submodules
+            if os.path.exists(os.path.join(path, '.git')):
+                return path
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+
+    def _full(self, rel_path: str) -> str:
+        if not self._prefix:
+            return rel_path
+        return f'{self._prefix}/{rel_path}' if rel_path else self._prefix
+
+    def load(self, rel_dir: str):
+        """Pick up rel_dir's .gitignore; call for each directory before matching inside it."""
+        self._load(self._full(rel_dir))
+
+    def _load(self, tree_dir: str):
+        if tree_dir in self._loaded:
+            return
+        self._loaded.add(tree_dir)
+        path = os.path.join(self.worktree, tree_dir, self.FILENAME)
+        if os.path.isfile(path):
+            self._add_file(tree_dir, path)
+
+    def _add_file(self, rel_dir: str, path: str):
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                rule = self._parse(rel_dir, line.rstrip('\n').rstrip('\r'))
+                if rule is not None:
+                    self._rules.append(rule)
+
+    @staticmethod
+    def _parse(rel_dir: str, line: str) -> Optional[Tuple[str, re.Pattern, bool, bool]]:
+        # trailing spaces are ignored unless escaped
+        stripped = line.rstrip(' ')
+        if stripped.endswith('\\') and len(stripped) < len(line):
+            stripped += ' '
+        line = stripped
+        if not line or line.startswith('#'):
+            return None
+        negated = line.startswith('!')
+        if negated:
+            line = line[1:]
+        elif line.startswith('\\'):
+            line = line[1:]
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            return None
+        if '/' in line:
+            regex = _translate(line.lstrip('/'))
+        else:
+            regex = '(?:.*/)?' + _translate(line)
+        return rel_dir, re.compile(regex + r'\Z', re.DOTALL), negated, dir_only
+
+    def ignored(self, rel_path: str, is_dir: bool) -> bool:
+        """Whether rel_path, '/'-separated and relative to root, is ignored."""
+        return self._excluded or self._matches(self._full(rel_path), is_dir)
+
+    def _matches(self, rel_path: str, is_dir: bool) -> bool:
+        result = False
+        for base, regex, negated, dir_only in self._rules:
+            if dir_only and not is_dir:
+                continue
+            if base:
+                if not rel_path.startswith(base + '/'):
+                    continue
+                target = rel_path[len(base) + 1:]
+            else:
+                target = rel_path
+            if regex.match(target):
+                result = not negated
+        return result
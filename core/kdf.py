@@ -0,0 +1,96 @@
+import os
+import time
+import struct
+import logging
+from typing import NamedTuple, Optional, Tuple
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives import hashes
+
+logger = logging.getLogger('sequential.security')
+
+try:
+    from rust_core import EncryptionManager as RustEncryptionManager
+    RUST_AVAILABLE = True
+except ImportError as e:
+    logger.warning(f"Rust EncryptionManager not available, using Python fallback: {e}")
+    RUST_AVAILABLE = False
+
+# master_salt layout: magic, PBKDF2 iterations, Argon2 memory (KiB), time cost and
+# parallelism, then the salt. A file without the magic is a bare legacy salt.
+SALT_MAGIC = b'SQK1'
+SALT_HEADER = struct.Struct('>4sIIII')
+
+# calibration never goes below these (OWASP's Argon2id minimum is 19 MiB, t=2)
+PBKDF2_MIN_ITERATIONS = 100_000
+PBKDF2_MAX_ITERATIONS = 10_000_000
+ARGON2_MIN_MEMORY_KIB = 19 * 1024
+ARGON2_MAX_MEMORY_KIB = 1024 * 1024
+ARGON2_MIN_TIME = 2
+
+
+class KdfParams(NamedTuple):
+    pbkdf2_iterations: int = 300_000
+    argon2_memory_kib: int = 64 * 1024
+    argon2_time: int = 3
+    argon2_parallelism: int = 4
+
+    def rust_kwargs(self) -> dict:
+        return self._asdict()
+
+
+DEFAULT_PARAMS = KdfParams()
+
+
+def parse_salt_file(data: bytes) -> Tuple[bytes, KdfParams]:
+    """(salt, params) from master_salt's contents."""
+    if len(data) > SALT_HEADER.size and data.startswith(SALT_MAGIC):
+        _, *params = SALT_HEADER.unpack(data[:SALT_HEADER.size])
+        return data[SALT_HEADER.size:], KdfParams(*params)
+    return data, DEFAULT_PARAMS
+
+
+def serialize_salt_file(salt: bytes, params: KdfParams) -> bytes:
+    return SALT_HEADER.pack(SALT_MAGIC, *params) + salt
+
+
+def load_salt_file(path: str) -> Optional[Tuple[bytes, KdfParams]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return parse_salt_file(f.read())
+
+
+def calibrate(target: float = 0.5, argon2: Optional[bool] = None) -> KdfParams:
+    """Pick KDF parameters that take about `target` seconds to derive a key on this host.
+
+    PBKDF2 iterations scale linearly from a short probe. Argon2id keeps t=3 (t=2 when
+    the budget is tight) and scales memory to fill the budget, since memory is what
+    makes guessing expensive; parallelism follows the CPU count up to 4. Argon2 is only
+    measured when rust_core is available, as nothing else derives Argon2 keys.
+    """
+    probe = 50_000
+    salt = os.urandom(32)
+    start = time.perf_counter()
+    PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=probe).derive(b'calibration')
+    rate = probe / (time.perf_counter() - start)
+    iterations = _clamp(round(rate * target, -3), PBKDF2_MIN_ITERATIONS, PBKDF2_MAX_ITERATIONS)
+    params = DEFAULT_PARAMS._replace(pbkdf2_iterations=iterations)
+
+    if argon2 is None:
+        argon2 = RUST_AVAILABLE
+    if argon2:
+        parallelism = max(1, min(4, os.cpu_count() or 1))
+        memory = DEFAULT_PARAMS.argon2_memory_kib
+        start = time.perf_counter()
+        RustEncryptionManager('calibration', use_argon2=True, salt=salt,
+                              argon2_memory_kib=memory, argon2_time=1, argon2_parallelism=parallelism)
+        passes = target / (time.perf_counter() - start)
+        time_cost = 3 if passes >= 3 else ARGON2_MIN_TIME
+        memory = _clamp(round(memory * passes / time_cost / 1024) * 1024, ARGON2_MIN_MEMORY_KIB, ARGON2_MAX_MEMORY_KIB)
+        params = params._replace(argon2_memory_kib=memory, argon2_time=time_cost, argon2_parallelism=parallelism)
+    logger.info('Calibrated KDF for %.0f ms: %s', target * 1000, params)
+    return params
+
+
+def _clamp(value, low, high) -> int:
+    return int(max(low, min(high, value)))
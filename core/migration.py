@@ -1,5 +1,4 @@
 import os
-import base64
 from typing import Tuple
 
 
@@ -9,7 +8,7 @@ def migrate_filesystem_to_db(db, cfg_manager) -> int:
     Returns the number of migrated entries.
     """
     base = cfg_manager.BASE
-    migrated = 0
+    entries = []
     for category in ('tokens', 'apis'):
         enc_dir = os.path.join(base, category, 'encrypted')
         if not os.path.isdir(enc_dir):
@@ -29,12 +28,10 @@ def migrate_filesystem_to_db(db, cfg_manager) -> int:
                 provider, cfg = name.split('_', 1)
                 with open(path, 'rb') as f:
                     blob = f.read()
-                blob_b64 = base64.b64encode(blob).decode('utf-8')
-                db.set_blob(category, provider, cfg, {'blob': blob_b64})
-                migrated += 1
+                entries.append({'category': category, 'provider': provider, 'config_name': cfg, 'blob': blob})
             except Exception:
                 continue
-    return migrated
+    return db.bulk_upsert(entries)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,293 @@
+import io
+import os
+import uuid
+import logging
+from contextlib import contextmanager
+from functools import lru_cache
+from threading import BoundedSemaphore, local
+from typing import Iterator, Optional
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import ThreadedConnectionPool
+
+from core.database import Database
+
+logger = logging.getLogger('sequential.db')
+
+# SQLite hands timestamps back as text and blobs as bytes; keep Postgres results identical
+TIMESTAMP_TEXT = psycopg2.extensions.new_type((1114,), 'TIMESTAMP_TEXT', lambda value, cur: value)
+BYTEA_BYTES = psycopg2.extensions.new_type(
+    psycopg2.BINARY.values, 'BYTEA_BYTES',
+    lambda value, cur: None if value is None else bytes(psycopg2.BINARY(value, cur)))
+
+# serializes schema creation when several instances start against an empty database
+SCHEMA_LOCK_ID = 0x5e9_0001
+
+
+def _copy_text(value) -> str:
+    """Render one value as a field of COPY's text format."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return '\\\\x' + bytes(value).hex()
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+@lru_cache(maxsize=512)
+def qmark_to_pyformat(query: str) -> str:
+    """Rewrite '?' placeholders as psycopg2's %s and escape literal '%' as '%%'.
+
+    A '?' inside a quoted string or identifier, or in a comment, is left alone.
+    """
+    out = []
+    i, n = 0, len(query)
+    while i < n:
+        c = query[i]
+        if c in ("'", '"'):
+            # doubling the quote escapes it, which this loop reads as two adjacent strings
+            end = query.find(c, i + 1)
+            end = n if end < 0 else end + 1
+            out.append(query[i:end].replace('%', '%%'))
+            i = end
+            continue
+        if query.startswith('--', i):
+            end = query.find('\n', i)
+            end = n if end < 0 else end
+        elif query.startswith('/*', i):
+            end = query.find('*/', i + 2)
+            end = n if end < 0 else end + 2
+        else:
+            out.append('%s' if c == '?' else '%%' if c == '%' else c)
+            i += 1
+            continue
+        out.append(query[i:end].replace('%', '%%'))
+        i = end
+    return ''.join(out)
+
+
+class QmarkCursor(psycopg2.extensions.cursor):
+    """Cursor that accepts the '?' placeholders the shared queries are written with."""
+
+    def execute(self, query, vars=None):
+        # without parameters psycopg2 sends the query as it is, '%' included
+        return super().execute(query if vars is None else qmark_to_pyformat(query), vars)
+
+    def executemany(self, query, vars_list):
+        return super().executemany(qmark_to_pyformat(query), vars_list)
+
+
+class VaultConnection(psycopg2.extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        psycopg2.extensions.register_type(TIMESTAMP_TEXT, self)
+        psycopg2.extensions.register_type(BYTEA_BYTES, self)
+        self.cursor_factory = QmarkCursor
+
+
+class PostgresDatabase(Database):
+    """Database backed by a shared PostgreSQL server instead of the local SQLite file.
+
+    Connections come from a ThreadedConnectionPool; callers block once pool_size
+    connections are checked out instead of failing. Listings and search read through
+    server-side cursors, bulk_upsert() loads rows with COPY, and blobs are bytea.
+    Text keys use COLLATE "C" so ordering and keyset cursors match SQLite.
+
+    The JSON mirror stays local to each instance. Entry listings, search, blobs,
+    categories and settings all read from Postgres and see other instances' writes.
+    """
+    POOL_SIZE = 8
+    COPY_COLUMNS = ('category', 'provider', 'config_name', 'info', 'blob', 'favorite', 'notes',
+                    'expires_at', 'expires_epoch', 'updated_at')
+
+    def __init__(self, sqlite_path: Optional[str] = None, use_psql: bool = True, pg_conn_str: Optional[str] = None,
+                 cache_size: int = 512, pool_size: Optional[int] = None):
+        pg_conn_str = pg_conn_str or os.environ.get('DATABASE_URL')
+        if not pg_conn_str:
+            raise ValueError('Postgres backend needs pg_conn_str or DATABASE_URL')
+        self.pool_size = pool_size or self.POOL_SIZE
+        self._pool = None
+        self._pool_slots = BoundedSemaphore(self.pool_size)
+        super().__init__(sqlite_path, True, pg_conn_str, cache_size)
+
+    def _init_rust(self):
+        # rust_core's Database only speaks SQLite
+        self._rust = None
+        self._use_rust = False
+
+    def _getconn(self):
+        self._pool_slots.acquire()
+        try:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadedConnectionPool(1, self.pool_size, self.pg_conn_str,
+                                                        connection_factory=VaultConnection)
+                pool = self._pool
+            return pool.getconn()
+        except BaseException:
+            self._pool_slots.release()
+            raise
+
+    def _putconn(self, conn):
+        try:
+            with self._pool_lock:
+                pool = self._pool
+            if pool is not None:
+                pool.putconn(conn, close=bool(conn.closed))
+            elif not conn.closed:
+                # the pool was closed while this connection was checked out
+                conn.close()
+        finally:
+            self._pool_slots.release()
+
+    @contextmanager
+    def _connection(self):
+        """Check a connection out of the pool for one unit of work.
+
+        Work nested inside it on the same thread, such as the writes of a batch(),
+        joins the connection already checked out.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+        conn = self._getconn()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._putconn(conn)
+
+    def _stream(self, sql: str, params=()) -> Iterator[tuple]:
+        """Yield rows from a server-side cursor that fetches PAGE_SIZE rows per round trip.
+
+        The cursor runs on the connection the calling thread already uses, so iterating
+        never holds a second pooled connection. Outside a batch() it is declared WITH
+        HOLD, so a write committed while the caller is still iterating does not close it.
+        """
+        in_batch = getattr(self._local, 'batch_depth', 0)
+        with self._connection() as conn:
+            if in_batch:
+                yield from self._server_rows(conn, sql, params)
+                return
+            with conn:
+                yield from self._server_rows(conn, sql, params, hold=True)
+
+    def _server_rows(self, conn, sql: str, params, hold: bool = False) -> Iterator[tuple]:
+        with conn.cursor(name=f'stream_{uuid.uuid4().hex}', withhold=hold) as cur:
+            cur.itersize = self.PAGE_SIZE
+            cur.execute(sql, params)
+            yield from cur
+
+    def close(self):
+        self.compact()
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+        self._local = local()
+
+    def checkpoint(self):
+        """Postgres manages its own WAL; there is no local file to fold it into."""
+
+    def _init_schema(self):
+        with self._transaction() as conn:
+            cur = conn.cursor()
+            cur.execute('SELECT pg_advisory_xact_lock(?)', (SCHEMA_LOCK_ID,))
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS metadata (
+                    category TEXT COLLATE "C" NOT NULL,
+                    provider TEXT COLLATE "C" NOT NULL,
+                    config_name TEXT COLLATE "C" NOT NULL,
+                    info TEXT,
+                    blob BYTEA,
+                    updated_at TIMESTAMP,
+                    favorite INTEGER DEFAULT 0,
+                    notes TEXT,
+                    expires_at TEXT,
+                    expires_epoch BIGINT,
+                    PRIMARY KEY (category, provider, config_name)
+                )
+            ''')
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS categories (
+                    name TEXT COLLATE "C" PRIMARY KEY,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS settings (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            ''')
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS provider_keys (
+                    key_id TEXT COLLATE "C" NOT NULL,
+                    provider TEXT COLLATE "C" NOT NULL,
+                    master_key_id TEXT COLLATE "C" NOT NULL,
+                    wrapped BYTEA NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (key_id, master_key_id),
+                    UNIQUE (provider, master_key_id)
+                )
+            ''')
+            cur.execute('CREATE INDEX IF NOT EXISTS idx_metadata_expires_epoch ON metadata (expires_epoch)')
+            cur.execute('CREATE INDEX IF NOT EXISTS idx_metadata_listing ON metadata (favorite, category, provider, config_name)')
+            cur.execute("INSERT INTO categories (name) VALUES ('tokens'), ('apis') ON CONFLICT (name) DO NOTHING")
+
+    def _upsert_rows(self, conn, rows: list):
+        """COPY the rows into a session-local staging table and merge them in one statement.
+
+        Repeated keys are folded together first, later non-None fields winning, which is
+        what running the SQLite upsert once per row amounts to.
+        """
+        merged = {}
+        for row in rows:
+            key = (row['category'], row['provider'], row['config_name'])
+            previous = merged.get(key)
+            merged[key] = row if previous is None else {**previous, **{k: v for k, v in row.items() if v is not None}}
+        if not merged:
+            return
+        buf = io.StringIO()
+        for row in merged.values():
+            buf.write('\t'.join(_copy_text(row[column]) for column in self.COPY_COLUMNS))
+            buf.write('\n')
+        buf.seek(0)
+        columns = ', '.join(self.COPY_COLUMNS)
+        cur = conn.cursor()
+        cur.execute('''CREATE TEMP TABLE IF NOT EXISTS metadata_stage (
+                           LIKE metadata INCLUDING DEFAULTS,
+                           PRIMARY KEY (category, provider, config_name)
+                       ) ON COMMIT DELETE ROWS''')
+        cur.execute('TRUNCATE metadata_stage')
+        cur.copy_expert(f'COPY metadata_stage ({columns}) FROM STDIN', buf)
+        # EXCLUDED already carries the insert defaults for info and favorite, so updates
+        # look the raw staged value up to tell "not given" from an explicit value
+        cur.execute(f'''
+            INSERT INTO metadata AS m ({columns})
+            SELECT category, provider, config_name, COALESCE(info, '{{}}'), blob, COALESCE(favorite, 0),
+                   notes, expires_at, expires_epoch, updated_at
+            FROM metadata_stage
+            ON CONFLICT (category, provider, config_name) DO UPDATE SET
+                info = COALESCE((SELECT s.info FROM metadata_stage s
+                                 WHERE (s.category, s.provider, s.config_name) = (m.category, m.provider, m.config_name)),
+                                m.info),
+                blob = COALESCE(EXCLUDED.blob, m.blob),
+                favorite = COALESCE((SELECT s.favorite FROM metadata_stage s
+                                     WHERE (s.category, s.provider, s.config_name) = (m.category, m.provider, m.config_name)),
+                                    m.favorite),
+                notes = COALESCE(EXCLUDED.notes, m.notes),
+                expires_at = COALESCE(EXCLUDED.expires_at, m.expires_at),
+                expires_epoch = CASE WHEN EXCLUDED.expires_at IS NULL THEN m.expires_epoch ELSE EXCLUDED.expires_epoch END,
+                updated_at = EXCLUDED.updated_at
+        ''')
+
+    def _search_scan(self, query: str) -> Iterator[tuple]:
+        # ILIKE keeps SQLite's case-insensitive LIKE semantics
+        pattern = f'%{query}%'
+        return self._stream(f'''SELECT {self.ENTRY_COLUMNS}
+                               FROM metadata
+                               WHERE provider ILIKE ? OR config_name ILIKE ? OR notes ILIKE ? OR info ILIKE ?
+                               ORDER BY favorite DESC, provider, config_name''', (pattern, pattern, pattern, pattern))
@@ -0,0 +1,282 @@
+import os
+import json
+import base64
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional, Tuple
+
+from core.security import EncryptionManager
+from core.kdf import KdfParams, DEFAULT_PARAMS, load_salt_file, serialize_salt_file
+from core.crypto_advanced import ProviderKeyring
+
+logger = logging.getLogger('sequential.security')
+
+ROTATION_CHECK = 'sequential-rotation-check'
+
+
+class MasterKeyRotation:
+    """Re-encrypt every stored secret under a new master password, resumably.
+
+    The new salt is generated up front and kept in STATE_FILE next to a check
+    ciphertext, so old and new keys are both derived from explicit salts and
+    master_salt keeps pointing at the old key until every blob is done. Database
+    blobs are streamed in primary-key order, re-encrypted BATCH_SIZE at a time
+    with decrypt_many/encrypt_many and written back in one transaction per batch,
+    after which the position is checkpointed. Swapping master_salt is the commit point;
+    if the process dies before it, calling run() again with the same passwords
+    picks up behind the last checkpoint. Blobs the new key already opens are
+    skipped, so replaying a batch is harmless.
+
+    Provider data keys are rewrapped under the new master key before any blob is
+    touched, and blobs sealed under them are left as they are; the rows wrapped by
+    the old master key are pruned after the salt swap.
+
+    The new key is derived with `kdf_params` (by default the current ones), which are
+    written to master_salt together with the new salt.
+    """
+
+    STATE_FILE = os.path.join(EncryptionManager.BASE, 'rotation.json')
+    BATCH_SIZE = 500
+
+    def __init__(self, db, cfg_manager, progress: Optional[Callable[[str, int, int], None]] = None,
+                 workers: Optional[int] = None, kdf_params: Optional[KdfParams] = None):
+        self.db = db
+        self.cfg_manager = cfg_manager
+        self.progress = progress
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.kdf_params = kdf_params
+
+    def run(self, old_password: str, new_password: str) -> EncryptionManager:
+        """Rotate (or finish an interrupted rotation) and return a manager for the new key."""
+        state = self._load_state()
+        if state is None:
+            old_salt, old_params = self._current_salt()
+            old = EncryptionManager(old_password, salt=old_salt, kdf_params=old_params)
+            keyring = self._keyring(old)
+            sample = next(self.db.iter_blobs(exclude_prefix=EncryptionManager.PROVIDER_KEY_PREFIX), None)
+            if (sample is not None and not self._opens(old, sample[3])) or not keyring.check():
+                keyring.wipe()
+                raise ValueError('Old password verification failed')
+            new_salt, new_params = os.urandom(32), self.kdf_params or old_params
+            new = EncryptionManager(new_password, salt=new_salt, kdf_params=new_params)
+            state = {
+                'old_salt': base64.b64encode(old_salt).decode('ascii'),
+                'new_salt': base64.b64encode(new_salt).decode('ascii'),
+                'old_params': list(old_params),
+                'new_params': list(new_params),
+                'check': base64.b64encode(new.encrypt(ROTATION_CHECK)).decode('ascii'),
+                'after': None,
+                'done': 0,
+            }
+            self._save_state(state)
+        else:
+            old_salt = base64.b64decode(state['old_salt'])
+            new_salt = base64.b64decode(state['new_salt'])
+            # state files from before KDF parameters were stored used the defaults
+            old_params = KdfParams(*state.get('old_params', DEFAULT_PARAMS))
+            new_params = KdfParams(*state.get('new_params', DEFAULT_PARAMS))
+            new = EncryptionManager(new_password, salt=new_salt, kdf_params=new_params)
+            try:
+                new.decrypt(base64.b64decode(state['check']))
+            except Exception:
+                raise ValueError('New password does not match the interrupted rotation')
+            logger.info('Resuming master key rotation after %d blobs', state['done'])
+            old = EncryptionManager(old_password, salt=old_salt, kdf_params=old_params)
+            keyring = self._keyring(old)
+
+        keys = keyring.rewrap(new)
+        if self.progress:
+            self.progress('keys', keys, keys)
+        self._rotate_database(old, new, state)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='seq-rotate') as pool:
+            self._rotate_files(old, new, pool)
+
+        self._replace(EncryptionManager.SALT_FILE, serialize_salt_file(new_salt, new_params))
+        os.remove(self.STATE_FILE)
+        # after the state file, so a resumed rotation still finds the old key's rows
+        self.db.prune_provider_keys(ProviderKeyring.id_for(new.key_encryption_key()))
+        keyring.wipe()
+        old.lock()
+        logger.info('Master key rotation complete (%d blobs)', state['done'])
+        return new
+
+    def _keyring(self, old) -> ProviderKeyring:
+        try:
+            return ProviderKeyring.for_manager(self.db, old)
+        except ValueError:
+            raise ValueError('Old password verification failed')
+
+    def _rotate_database(self, old, new, state: dict):
+        # blobs under provider data keys only needed their keys rewrapped
+        skip = EncryptionManager.PROVIDER_KEY_PREFIX
+        total = self.db.count_blobs(exclude_prefix=skip)
+        after = tuple(state['after']) if state['after'] else None
+        batch = []
+        for row in self.db.iter_blobs(after=after, exclude_prefix=skip):
+            batch.append(row)
+            if len(batch) >= self.BATCH_SIZE:
+                self._flush(old, new, state, batch, total)
+                batch = []
+        if batch:
+            self._flush(old, new, state, batch, total)
+
+    def _flush(self, old, new, state: dict, batch: list, total: int):
+        blobs = [row[3] for row in batch]
+        plains = old.decrypt_many(blobs, strict=False)
+        # what the old key cannot open must already be under the new one
+        missed = [blob for blob, plain in zip(blobs, plains) if plain is None]
+        if missed and None in new.decrypt_many(missed, strict=False):
+            raise ValueError('Old password verification failed')
+        todo = [(row, plain) for row, plain in zip(batch, plains) if plain is not None]
+        ciphers = new.encrypt_many([plain for _, plain in todo])
+        self.db.bulk_upsert({'category': category, 'provider': provider, 'config_name': cfg, 'blob': cipher}
+                            for ((category, provider, cfg, _), _), cipher in zip(todo, ciphers))
+        state['after'] = list(batch[-1][:3])
+        state['done'] += len(batch)
+        self._save_state(state)
+        if self.progress:
+            self.progress('database', state['done'], total)
+
+    @staticmethod
+    def _rotate_blob(old, new, blob: bytes) -> Optional[bytes]:
+        """New ciphertext for blob, or None if it needs no re-encryption."""
+        if new.uses_provider_key(blob):
+            return None
+        try:
+            return new.encrypt(old.decrypt(blob))
+        except Exception:
+            if MasterKeyRotation._opens(new, blob):
+                return None
+            raise ValueError('Old password verification failed')
+
+    @staticmethod
+    def _opens(manager, blob: bytes) -> bool:
+        try:
+            manager.decrypt(blob)
+            return True
+        except Exception:
+            return False
+
+    def _rotate_files(self, old, new, pool: ThreadPoolExecutor):
+        paths = list(self._encrypted_files())
+        done = 0
+        for _ in pool.map(lambda path: self._rotate_file(old, new, path), paths):
+            done += 1
+            if self.progress and (done % self.BATCH_SIZE == 0 or done == len(paths)):
+                self.progress('files', done, len(paths))
+
+    def _encrypted_files(self) -> Iterable[str]:
+        for category in ('tokens', 'apis'):
+            enc_dir = os.path.join(self.cfg_manager.BASE, category, 'encrypted')
+            if not os.path.isdir(enc_dir):
+                continue
+            for fname in os.listdir(enc_dir):
+                if not fname.endswith('.tmp'):
+                    yield os.path.join(enc_dir, fname)
+
+    def _rotate_file(self, old, new, path: str):
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            cipher = self._rotate_blob(old, new, raw)
+            if cipher is not None:
+                self._replace(path, cipher)
+        except Exception as e:
+            logger.warning(f"Skipping {path} during rotation: {e}")
+
+    def _load_state(self) -> Optional[dict]:
+        if not os.path.exists(self.STATE_FILE):
+            return None
+        with open(self.STATE_FILE, 'r') as f:
+            return json.load(f)
+
+    def _save_state(self, state: dict):
+        self._replace(self.STATE_FILE, json.dumps(state).encode('utf-8'))
+
+    @staticmethod
+    def _current_salt() -> Tuple[bytes, KdfParams]:
+        stored = load_salt_file(EncryptionManager.SALT_FILE)
+        if stored is not None:
+            return stored
+        # nothing can be encrypted under a salt that was never written
+        salt = os.urandom(32)
+        MasterKeyRotation._replace(EncryptionManager.SALT_FILE, serialize_salt_file(salt, DEFAULT_PARAMS))
+        return salt, DEFAULT_PARAMS
+
+    @staticmethod
+    def _replace(path: str, data: bytes):
+        """Write data to path atomically: a crash leaves either the old or the new file."""
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+
+class EnvelopeUpgrader:
+    """Background re-encryption of legacy blobs into the current envelope format.
+
+    Legacy Fernet tokens and headerless Rust AES-GCM blobs are decrypted and written
+    back through encrypt(), BATCH_SIZE at a time. With a keyring attached, blobs sealed
+    under the master key are moved to their provider's data key the same way. Blobs
+    already under a provider data key are filtered out by the query. Writes go through
+    Database.replace_blobs(), which skips any blob changed since it was read. Blobs
+    that fail to decrypt are left as they are.
+    """
+
+    BATCH_SIZE = 500
+
+    def __init__(self, db, encryption, pause: float = 0.0):
+        self.db = db
+        self.encryption = encryption
+        self.pause = pause
+        self.upgraded = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> 'EnvelopeUpgrader':
+        self._thread = threading.Thread(target=self._run_logged, name='seq-upgrade', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run_logged(self):
+        try:
+            self.run()
+        except Exception as e:
+            logger.warning(f"Envelope upgrade stopped: {e}")
+
+    def run(self) -> int:
+        """Upgrade every legacy blob in the calling thread; returns how many were rewritten."""
+        # provider-key blobs are always current, so the database never returns them
+        skip = EncryptionManager.PROVIDER_KEY_PREFIX
+        if not self.db.count_blobs(exclude_prefix=skip):
+            return self.upgraded
+        batch = []
+        for row in self.db.iter_blobs(exclude_prefix=skip):
+            if self._stop.is_set():
+                break
+            if not self.encryption.is_current(row[3]):
+                batch.append(row)
+            if len(batch) >= self.BATCH_SIZE:
+                self._write(batch)
+                batch = []
+        self._write(batch)
+        if self.upgraded:
+            logger.info('Upgraded %d legacy blobs to the envelope format', self.upgraded)
+        return self.upgraded
+
+    def _write(self, batch: list):
+        plains = self.encryption.decrypt_many([row[3] for row in batch], strict=False)
+        todo = [(row, plain) for row, plain in zip(batch, plains) if plain is not None]
+        if todo:
+            ciphers = self.encryption.encrypt_many([plain for _, plain in todo], providers=[row[1] for row, _ in todo])
+            self.upgraded += self.db.replace_blobs(row + (cipher,) for (row, _), cipher in zip(todo, ciphers))
+            if self.pause:
+                self._stop.wait(self.pause)
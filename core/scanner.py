@@ -1,22 +1,57 @@
+import os
 import re
+import json
+import mmap
+import time
+import heapq
+import hashlib
 import logging
-from typing import List, Tuple
+import sqlite3
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from core.gitignore import GitIgnore
 
 logger = logging.getLogger('sequential.scanner')
 
 try:
-    from rust_core import scan_text_for_secrets as rust_scan_text, scan_files as rust_scan_files
+    from rust_core import (scan_text_for_secrets as rust_scan_text, scan_files as rust_scan_files,
+                           scan_file_chunked as rust_scan_file_chunked, scan_bytes as rust_scan_bytes,
+                           scan_directory as rust_scan_directory, stream_text as rust_stream_text,
+                           stream_files as rust_stream_files)
     RUST_AVAILABLE = True
 except ImportError as e:
     logger.warning(f"Rust scanner not available, using Python fallback: {e}")
     RUST_AVAILABLE = False
 
-CANDIDATE_PATTERNS = [
-    (r'AIza[0-9A-Za-z\-_]{35}', 'Google API Key'),
-    (r'sk-[A-Za-z0-9]{48}', 'OpenAI Secret'),
-    (r'ghp_[A-Za-z0-9]{36}', 'GitHub PAT'),
-    (r'([MN][A-Za-z0-9_-]{23}\.[A-Za-z0-9_-]{6}\.[A-Za-z0-9_-]{27})', 'Discord Token')
-]
+# shared with rust_core, which embeds the same file at build time
+PATTERNS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'secret_patterns.json')
+
+
+class SecretPattern(NamedTuple):
+    id: str
+    label: str
+    regex: str
+    # substrings every match contains; a pattern is only tried on text containing one
+    literals: Tuple[str, ...]
+
+
+def load_patterns(path: str = PATTERNS_FILE) -> List[SecretPattern]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return [SecretPattern(p['id'], p['label'], p['regex'], tuple(p['literals'])) for p in json.load(f)]
+
+
+PATTERNS = load_patterns()
+CANDIDATE_PATTERNS = [(p.regex, p.label) for p in PATTERNS]
+_REGEXES = [re.compile(p.regex) for p in PATTERNS]
+_BYTE_REGEXES = [re.compile(p.regex.encode('ascii')) for p in PATTERNS]
+_BYTE_LITERALS = [tuple(lit.encode('ascii') for lit in p.literals) for p in PATTERNS]
+
+# bytes scanned per window of a memory-mapped file
+CHUNK_SIZE = 8 * 1024 * 1024
+# window overlap, and so the longest secret guaranteed to be found whole
+MAX_SECRET_LEN = 4096
 
 
 def scan_text_for_secrets(text: str) -> List[Tuple[str, str]]:
@@ -25,11 +60,120 @@ def scan_text_for_secrets(text: str) -> List[Tuple[str, str]]:
             return rust_scan_text(text)
         except Exception as e:
             logger.warning(f"Rust scan_text_for_secrets failed, using Python fallback: {e}")
-    hits = []
-    for pattern, label in CANDIDATE_PATTERNS:
-        for m in re.findall(pattern, text):
-            hits.append((label, m))
-    return hits
+    return [(PATTERNS[i].label, m.group()) for i, m in _matches(text, 0, len(text))]
+
+
+def _active(text, start: int = 0, end: int = None) -> Tuple[int, ...]:
+    """Indexes of the patterns whose literals occur in text[start:end]."""
+    binary = not isinstance(text, str)
+    return tuple(i for i, p in enumerate(PATTERNS)
+                 if not p.literals
+                 or any(text.find(lit, start, end) >= 0 for lit in (_BYTE_LITERALS[i] if binary else p.literals)))
+
+
+def _matches(text, start: int, end: int) -> Iterator[Tuple[int, 're.Match']]:
+    """(pattern index, match) for text[start:end], as one alternation of the registry would find them.
+
+    That is leftmost-first: the next match is the one starting earliest after the
+    previous match, ties going to the pattern listed first. rust_core compiles the
+    registry into exactly that alternation. CPython's re, though, stops skipping ahead
+    on literal prefixes once the branches are capturing groups, which made a
+    named-group alternation several times slower than separate searches. So each pattern
+    the literal prefilter lets through is searched on its own, with the fast literal
+    skip, and the results are merged in position order.
+    """
+    regexes = _REGEXES if isinstance(text, str) else _BYTE_REGEXES
+    heap = []
+    for i in _active(text, start, end):
+        m = regexes[i].search(text, start, end)
+        if m:
+            heap.append((m.start(), i, m))
+    heapq.heapify(heap)
+    pos = start
+    while heap:
+        first, i, m = heap[0]
+        if first >= pos:
+            yield i, m
+            pos = m.end()
+        # the alternation resumes at pos, so a match starting before it is searched again from there
+        m = regexes[i].search(text, pos, end)
+        if m:
+            heapq.heapreplace(heap, (m.start(), i, m))
+        else:
+            heapq.heappop(heap)
+
+
+def scan_file_chunked(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[str, str, int]]:
+    """Yield (label, secret, byte offset) for every secret in the file.
+
+    The file is memory-mapped and scanned in windows of chunk_size bytes overlapping
+    by MAX_SECRET_LEN, so memory use does not grow with the file and nothing is
+    skipped for its size or encoding. A match belongs to the window it starts in.
+    """
+    if RUST_AVAILABLE:
+        try:
+            yield from rust_scan_file_chunked(path, chunk_size)
+            return
+        except Exception as e:
+            logger.warning(f"Rust scan_file_chunked failed, using Python fallback: {e}")
+    data = _map_file(path)
+    if data is None:
+        return
+    with data:
+        for i, m in _scan_chunked(data, max(1, chunk_size)):
+            yield PATTERNS[i].label, m.group().decode('utf-8', 'replace'), m.start()
+
+
+def _map_file(path: str) -> Optional[mmap.mmap]:
+    """A read-only mapping of the file, advised for one sequential pass; None if it is empty."""
+    with open(path, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None
+    if hasattr(mmap, 'MADV_SEQUENTIAL'):
+        data.madvise(mmap.MADV_SEQUENTIAL)
+    return data
+
+
+def scan_bytes(data: bytes) -> List[Tuple[str, str, int]]:
+    """(label, secret, byte offset) for every secret in an in-memory buffer, whatever its encoding."""
+    if RUST_AVAILABLE:
+        try:
+            return rust_scan_bytes(data)
+        except Exception as e:
+            logger.warning(f"Rust scan_bytes failed, using Python fallback: {e}")
+    return [(PATTERNS[i].label, m.group().decode('utf-8', 'replace'), m.start()) for i, m in _matches(data, 0, len(data))]
+
+
+def _scan_chunked(data, chunk_size: int, lines: Optional['_Lines'] = None) -> Iterator[Tuple[int, 're.Match']]:
+    # where the last match ended: a single pass over the whole file would not
+    # report a match starting inside an earlier one
+    resume = 0
+    released = 0
+    for start in range(0, len(data), chunk_size):
+        owned_end = min(start + chunk_size, len(data))
+        window_end = min(owned_end + MAX_SECRET_LEN, len(data))
+        # pos/endpos search the mapping in place, without copying the window
+        for i, m in _matches(data, max(start, resume), window_end):
+            if m.start() >= owned_end:
+                break
+            resume = m.end()
+            yield i, m
+        if lines is not None:
+            # count newlines while the window is still resident
+            lines.advance(owned_end)
+        released = _release(data, released, owned_end)
+
+
+def _release(data, start: int, end: int) -> int:
+    """Drop the scanned pages in [start, end) from memory; returns where releasing stopped."""
+    end -= end % mmap.PAGESIZE
+    if end > start and hasattr(mmap, 'MADV_DONTNEED'):
+        # a read-only file mapping just faults the pages back in if touched again
+        data.madvise(mmap.MADV_DONTNEED, start, end - start)
+        return end
+    return start
 
 
 def scan_files(paths: List[str]) -> List[Tuple[str, str, str]]:
@@ -41,11 +185,285 @@ def scan_files(paths: List[str]) -> List[Tuple[str, str, str]]:
     results = []
     for p in paths:
         try:
-            with open(p, 'r', errors='ignore') as f:
-                txt = f.read()
-            hits = scan_text_for_secrets(txt)
-            for label, secret in hits:
+            for label, secret, _ in scan_file_chunked(p):
                 results.append((p, label, secret))
         except Exception:
             continue
     return results
+
+
+class SecretHit(NamedTuple):
+    # None for text scans
+    path: Optional[str]
+    # 1-based; the column counts bytes, as in the UTF-8 encoding of text
+    line: int
+    column: int
+    offset: int
+    # SecretPattern.id
+    pattern: str
+    secret: str
+
+
+def iter_scan_text(text: str) -> Iterator[SecretHit]:
+    """Yield a SecretHit for each secret in text as it is found."""
+    if RUST_AVAILABLE:
+        try:
+            return map(SecretHit._make, rust_stream_text(text))
+        except Exception as e:
+            logger.warning(f"Rust stream_text failed, using Python fallback: {e}")
+    return _iter_text(text)
+
+
+def _iter_text(text: str) -> Iterator[SecretHit]:
+    lines = _Lines(text)
+    for i, m in _matches(text, 0, len(text)):
+        yield SecretHit(None, *lines.locate(m.start()), PATTERNS[i].id, m.group())
+
+
+def iter_scan_files(paths: Iterable[str], workers: Optional[int] = None) -> Iterator[SecretHit]:
+    """Yield a SecretHit for each secret in the files as it is found.
+
+    With rust_core the files are scanned on `workers` threads (one per CPU by default)
+    while the caller consumes hits, which arrive in order within a file but interleaved
+    across files; the scan stops once the iterator is dropped. The Python fallback
+    scans one file at a time, between calls to next(). Unreadable files are skipped,
+    as in scan_files().
+    """
+    if RUST_AVAILABLE:
+        try:
+            return map(SecretHit._make, rust_stream_files(list(paths), workers))
+        except Exception as e:
+            logger.warning(f"Rust stream_files failed, using Python fallback: {e}")
+    return _iter_files(paths)
+
+
+def _iter_files(paths: Iterable[str]) -> Iterator[SecretHit]:
+    for path in paths:
+        try:
+            data = _map_file(path) if os.path.isfile(path) else None
+        except OSError:
+            continue
+        if data is None:
+            continue
+        with data:
+            lines = _Lines(data)
+            for i, m in _scan_chunked(data, CHUNK_SIZE, lines):
+                yield SecretHit(path, *lines.locate(m.start()), PATTERNS[i].id, m.group().decode('utf-8', 'replace'))
+
+
+class _Lines:
+    """Line, byte column and byte offset for increasing positions in a str or bytes-like."""
+
+    def __init__(self, data):
+        self.data = data
+        self.text = isinstance(data, str)
+        self.newline = '\n' if self.text else b'\n'
+        self.pos = 0
+        self.line = 1
+        self.line_start = 0
+        # UTF-8 length of data[:pos] for text
+        self.offset = 0
+
+    def advance(self, to: int):
+        if to <= self.pos:
+            return
+        span = self.data[self.pos:to]
+        newlines = span.count(self.newline)
+        if newlines:
+            self.line += newlines
+            self.line_start = self.pos + span.rfind(self.newline) + 1
+        if self.text:
+            self.offset += _utf8_len(span)
+        self.pos = to
+
+    def locate(self, pos: int) -> Tuple[int, int, int]:
+        """(line, column, byte offset) of pos, which must not be before the last one."""
+        self.advance(pos)
+        if self.text:
+            return self.line, _utf8_len(self.data[self.line_start:pos]) + 1, self.offset
+        return self.line, pos - self.line_start + 1, pos
+
+
+def _utf8_len(text: str) -> int:
+    return len(text.encode('utf-8', 'surrogatepass'))
+
+
+# what scan_directory() looks at, as in rust_core's scan_directory
+SCANNED_EXTENSIONS = frozenset({
+    'py', 'js', 'ts', 'jsx', 'tsx', 'json', 'yaml', 'yml', 'env', 'sh', 'bash', 'zsh', 'config', 'cfg',
+    'ini', 'toml', 'xml', 'properties', 'rb', 'go', 'rs', 'java', 'kt', 'swift', 'php', 'cs', 'cpp', 'c',
+    'h', 'hpp',
+})
+
+
+def _scannable(name: str) -> bool:
+    return name.startswith('.env') or ('.' in name and name.rpartition('.')[2] in SCANNED_EXTENSIONS)
+
+
+class ScanCache:
+    """Files known to be free of secrets, kept in SQLite between scan_directory() runs.
+
+    Only clean files are recorded, by inode, size, mtime and content hash, so nothing
+    a scan finds is ever written to disk; a file with hits is rescanned every run. A
+    recorded file whose inode, size and mtime are unchanged is skipped unopened.
+    Otherwise it is hashed and skipped if that content is known clean (a checkout
+    that only touched mtimes, or a copy of another clean file). Everything is
+    dropped when secret_patterns.json changes.
+    """
+
+    # resolved at import, in the app's data directory, so scanning from elsewhere
+    # does not leave a cache in the current directory
+    PATH = os.path.join(os.path.abspath('.sequential'), 'scan_cache.db')
+
+    def __init__(self, path: str = PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        # shared by the scanning threads
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = Lock()
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        with open(PATTERNS_FILE, 'rb') as f:
+            fingerprint = hashlib.sha256(f.read()).hexdigest()
+        legacy = self._conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'results'").fetchone()
+        with self._conn:
+            if legacy:
+                # earlier caches stored every hit, secret included
+                self._conn.execute('DROP TABLE results')
+                self._conn.execute('DELETE FROM files')
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS files (
+                                      path TEXT PRIMARY KEY, inode INTEGER, size INTEGER,
+                                      mtime_ns INTEGER, digest TEXT)''')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS clean (digest TEXT PRIMARY KEY)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'patterns'").fetchone()
+            if row is None or row[0] != fingerprint:
+                self._conn.execute('DELETE FROM files')
+                self._conn.execute('DELETE FROM clean')
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('patterns', ?)", (fingerprint,))
+        if legacy:
+            # rewrite the file so the dropped pages do not linger on disk
+            self._conn.execute('VACUUM')
+
+    def files_under(self, root: str) -> Dict[str, tuple]:
+        """path -> (inode, size, mtime_ns, digest) for every clean file cached below root."""
+        prefix = os.path.join(root, '')
+        with self._lock:
+            rows = self._conn.execute('SELECT path, inode, size, mtime_ns, digest FROM files WHERE path >= ? AND path < ?',
+                                      (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))).fetchall()
+        return {path: tuple(rest) for path, *rest in rows}
+
+    def is_clean(self, digest: str) -> bool:
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM clean WHERE digest = ?', (digest,)).fetchone() is not None
+
+    def update(self, root: str, files: list, dirty: set, seen: set, recursive: bool = True):
+        """Record clean (path, inode, size, mtime_ns, digest) rows, and forget files in dirty
+        and cached files below root (directly in it, if not recursive) that were not seen."""
+        stale = [(path,) for path in self.files_under(root)
+                 if path in dirty or (path not in seen and (recursive or os.path.dirname(path) == root))]
+        with self._conn:
+            self._conn.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)', files)
+            self._conn.executemany('INSERT OR IGNORE INTO clean VALUES (?)', ((row[4],) for row in files))
+            self._conn.executemany('DELETE FROM files WHERE path = ?', stale)
+            if stale:
+                self._conn.execute('DELETE FROM clean WHERE digest NOT IN (SELECT digest FROM files)')
+
+    def close(self):
+        self._conn.close()
+
+
+def _digest(path: str) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _walk(root: str, recursive: bool, ignore: Optional[GitIgnore]) -> Iterator[Tuple[str, os.stat_result]]:
+    """(path, stat) for scannable regular files below root, never following symlinks."""
+    stack = [('', root)]
+    while stack:
+        rel_dir, abs_dir = stack.pop()
+        if ignore is not None:
+            ignore.load(rel_dir)
+        try:
+            with os.scandir(abs_dir) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            logger.warning(f"Skipping {abs_dir}: {e}")
+            continue
+        subdirs = []
+        for entry in entries:
+            rel = f'{rel_dir}/{entry.name}' if rel_dir else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive and entry.name != '.git' and not (ignore and ignore.ignored(rel, True)):
+                        subdirs.append((rel, entry.path))
+                elif entry.is_file(follow_symlinks=False) and _scannable(entry.name):
+                    if not (ignore and ignore.ignored(rel, False)):
+                        yield entry.path, entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+        stack.extend(reversed(subdirs))
+
+
+def scan_directory(path: str, recursive: bool = True, respect_gitignore: bool = True,
+                   cache: Union[ScanCache, bool] = True, workers: Optional[int] = None) -> List[Tuple[str, str, str]]:
+    """(path, label, secret) for the files below `path` that the scanner looks at.
+
+    Files matched by the enclosing repository's .gitignore files (and its
+    .git/info/exclude) are skipped unless respect_gitignore is False. With a cache (True means a ScanCache in .sequential),
+    files found clean on an earlier run and unchanged since are not read again. The
+    rest are scanned across `workers` threads, which run in parallel when rust_core
+    is available.
+    """
+    if RUST_AVAILABLE and not respect_gitignore and not cache:
+        try:
+            return rust_scan_directory(path, recursive)
+        except Exception as e:
+            logger.warning(f"Rust scan_directory failed, using Python fallback: {e}")
+
+    started = time.perf_counter()
+    store = ScanCache() if cache is True else (cache or None)
+    root = os.path.abspath(path)
+    known = store.files_under(root) if store is not None else {}
+    found = {}
+    order = []
+    changed = []
+    for file_path, st in _walk(path, recursive, GitIgnore(path) if respect_gitignore else None):
+        key = os.path.abspath(file_path)
+        order.append((file_path, key))
+        row = known.get(key)
+        if row is None or row[:3] != (st.st_ino, st.st_size, st.st_mtime_ns):
+            changed.append((file_path, key, st))
+
+    def scan(item):
+        file_path, key, st = item
+        try:
+            # the hash only serves the cache
+            digest = _digest(file_path) if store is not None else None
+            hits = [] if digest is not None and store.is_clean(digest) else list(scan_file_chunked(file_path))
+            return key, (key, st.st_ino, st.st_size, st.st_mtime_ns, digest), hits
+        except OSError as e:
+            logger.warning(f"Skipping {file_path}: {e}")
+            return key, None, []
+
+    rows, dirty = [], set()
+    with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) + 4),
+                            thread_name_prefix='seq-scan') as pool:
+        for key, row, hits in pool.map(scan, changed):
+            if hits:
+                found[key] = hits
+                dirty.add(key)
+            elif row is not None:
+                rows.append(row)
+
+    if store is not None:
+        store.update(root, rows, dirty, {key for _, key in order}, recursive)
+        if cache is True:
+            store.close()
+    logger.info('Scanned %d files under %s (%d changed) in %.2fs', len(order), path, len(changed),
+                time.perf_counter() - started)
+    return [(file_path, label, secret) for file_path, key in order for label, secret, _ in found.get(key, ())]
@@ -1,18 +1,43 @@
 import ctypes
+import ctypes.util
+import mmap
 import sys
 import os
+import time
 import logging
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Hashable, Optional
 
 logger = logging.getLogger('sequential.secure_memory')
 
 try:
-    from rust_core import SecureMemory as RustSecureMemory
+    from rust_core import SecureMemory as RustSecureMemory, SecureArena as RustSecureArena
     RUST_AVAILABLE = True
 except ImportError as e:
     logger.warning(f"Rust SecureMemory not available, using Python fallback: {e}")
     RUST_AVAILABLE = False
 
 
+def _libc():
+    try:
+        return ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    except OSError:
+        return None
+
+
+def _address(buf) -> int:
+    """Address of the first byte of a writable buffer (bytearray, mmap)."""
+    return ctypes.addressof((ctypes.c_char * len(buf)).from_buffer(buf))
+
+
+def _mlock(address: int, size: int) -> bool:
+    libc = _libc()
+    if libc is None or not hasattr(libc, 'mlock'):
+        return False
+    return libc.mlock(ctypes.c_void_p(address), ctypes.c_size_t(size)) == 0
+
+
 def secure_erase(byte_arr: bytearray):
     """Attempt to overwrite the contents of a bytearray in place to minimize memory remnants.
     
@@ -22,8 +47,8 @@ def secure_erase(byte_arr: bytearray):
     if not isinstance(byte_arr, bytearray):
         raise TypeError("secure_erase only accepts bytearray, not bytes (immutable)")
     
-    for i in range(len(byte_arr)):
-        byte_arr[i] = 0
+    if byte_arr:
+        ctypes.memset(_address(byte_arr), 0, len(byte_arr))
 
 
 def allocate_secure_bytes(size: int) -> bytearray:
@@ -39,24 +64,157 @@ def allocate_secure_bytes(size: int) -> bytearray:
             logger.warning(f"Rust allocate_secure_bytes failed, using Python fallback: {e}")
     arr = bytearray(os.urandom(size))
     try:
-        if sys.platform.startswith('linux'):
-            libc = ctypes.CDLL('libc.so.6')
-            libc.mlock(ctypes.c_void_p(id(arr)), ctypes.c_size_t(len(arr)))
+        # lock the buffer itself; id() is the address of the object header
+        if arr and sys.platform.startswith('linux'):
+            _mlock(_address(arr), len(arr))
     except Exception:
         pass
     return arr
 
 
+class SecureArena:
+    """A region locked into RAM once and handed out in fixed-size slots.
+
+    alloc() copies a secret into the first run of free slots large enough for it
+    and returns a handle; read(), zero() and free() take that handle. Zeroing is a
+    single memset over the run, and no call after construction touches mlock, so
+    short-lived secrets cost no syscalls. alloc() returns None when the arena is
+    full. stats() reports slot usage, the high-water mark and failed allocations.
+
+    Uses the Rust arena when available. The Python fallback maps an anonymous
+    region, excluded from core dumps where the platform allows.
+    """
+
+    SLOT_SIZE = 64
+    SLOTS = 1024
+
+    def __init__(self, slot_size: int = SLOT_SIZE, slots: int = SLOTS):
+        if slot_size <= 0 or slots <= 0:
+            raise ValueError('slot_size and slots must be positive')
+        self.slot_size = slot_size
+        self.slots = slots
+        self._use_rust = False
+        if RUST_AVAILABLE:
+            try:
+                self._rust = RustSecureArena(slot_size, slots)
+                self._use_rust = True
+                return
+            except Exception as e:
+                logger.warning(f"Rust SecureArena initialization failed, using Python fallback: {e}")
+
+        self._lock = Lock()
+        if hasattr(mmap, 'MAP_PRIVATE'):
+            # private, so a forked child's secrets are not zeroed when the parent frees its own
+            self._map = mmap.mmap(-1, slot_size * slots, flags=mmap.MAP_PRIVATE | mmap.MAP_ANONYMOUS)
+        else:
+            self._map = mmap.mmap(-1, slot_size * slots)
+        if hasattr(mmap, 'MADV_DONTDUMP'):
+            try:
+                self._map.madvise(mmap.MADV_DONTDUMP)
+            except OSError:
+                pass
+        self._buf = (ctypes.c_char * len(self._map)).from_buffer(self._map)
+        self._base = ctypes.addressof(self._buf)
+        self._locked = _mlock(self._base, len(self._map))
+        self._used = bytearray(slots)
+        # handle -> length in bytes
+        self._lens = {}
+        self._used_slots = self._peak = self._allocations = self._failures = 0
+
+    def _span(self, length: int) -> int:
+        return max(1, -(-length // self.slot_size))
+
+    def alloc(self, data: bytes) -> Optional[int]:
+        if self._use_rust:
+            return self._rust.alloc(data)
+        need = self._span(len(data))
+        with self._lock:
+            start = self._used.find(bytes(need))
+            if start < 0:
+                self._failures += 1
+                return None
+            self._used[start:start + need] = b'\x01' * need
+            self._lens[start] = len(data)
+            self._used_slots += need
+            self._peak = max(self._peak, self._used_slots)
+            self._allocations += 1
+        offset = start * self.slot_size
+        self._map[offset:offset + len(data)] = data
+        return start
+
+    def _len(self, handle: int) -> int:
+        length = self._lens.get(handle)
+        if length is None:
+            raise KeyError(f'No secret at slot {handle}')
+        return length
+
+    def read(self, handle: int) -> bytes:
+        if self._use_rust:
+            return self._rust.read(handle)
+        offset = handle * self.slot_size
+        return self._map[offset:offset + self._len(handle)]
+
+    def zero(self, handle: int):
+        """Zero the secret's slots but keep them allocated."""
+        if self._use_rust:
+            return self._rust.zero(handle)
+        span = self._span(self._len(handle)) * self.slot_size
+        ctypes.memset(self._base + handle * self.slot_size, 0, span)
+
+    def free(self, handle: int):
+        """Zero the secret's slots and return them to the arena."""
+        if self._use_rust:
+            return self._rust.free(handle)
+        with self._lock:
+            self.zero(handle)
+            need = self._span(self._lens.pop(handle))
+            self._used[handle:handle + need] = bytes(need)
+            self._used_slots -= need
+
+    def stats(self) -> Dict[str, int]:
+        if self._use_rust:
+            return self._rust.stats()
+        with self._lock:
+            return {'slot_size': self.slot_size, 'slots': self.slots, 'used': self._used_slots,
+                    'peak': self._peak, 'live': len(self._lens), 'allocations': self._allocations,
+                    'failures': self._failures, 'locked': self._locked}
+
+
+_default_arena = None
+_default_arena_lock = Lock()
+
+
+def default_arena() -> Optional[SecureArena]:
+    """The process-wide arena SecureMemory draws from, or None if it cannot be created."""
+    global _default_arena
+    if _default_arena is None:
+        with _default_arena_lock:
+            if _default_arena is None:
+                try:
+                    _default_arena = SecureArena()
+                except Exception as e:
+                    logger.warning(f"Secure arena unavailable, allocating secrets individually: {e}")
+                    _default_arena = False
+    return _default_arena or None
+
+
 class SecureMemory:
     """Wrapper for Rust SecureMemory class with automatic zeroization.
     
     Note: This provides a Python-friendly interface that accepts bytes directly.
     The Rust implementation provides true memory protection with mlock.
+    Secrets are placed in the shared default_arena() when it has room, which
+    avoids an allocation and mlock call per secret; otherwise each gets its own buffer.
     """
     
-    def __init__(self, data: bytes):
+    def __init__(self, data: bytes, arena: Optional[SecureArena] = None):
         self._initialized = False
         self._use_rust = False
+        self._arena = arena or default_arena()
+        self._handle = self._arena.alloc(data) if self._arena is not None else None
+        if self._handle is not None:
+            self._initialized = True
+            return
         
         if RUST_AVAILABLE:
             try:
@@ -72,6 +230,8 @@ class SecureMemory:
         self._initialized = True
     
     def get_data(self) -> bytes:
+        if self._handle is not None:
+            return self._arena.read(self._handle)
         if self._use_rust:
             return self._rust.as_bytes()
         return bytes(self._data)
@@ -79,17 +239,98 @@ class SecureMemory:
     def zeroize(self):
         if not self._initialized:
             return
-        if self._use_rust:
+        if self._handle is not None:
+            self._arena.zero(self._handle)
+        elif self._use_rust:
             self._rust.clear()
         else:
-            for i in range(len(self._data)):
-                self._data[i] = 0
+            secure_erase(self._data)
     
     def __len__(self):
+        if self._handle is not None:
+            return len(self._arena.read(self._handle))
         if self._use_rust:
             return self._rust.len()
         return len(self._data)
     
     def __del__(self):
         if hasattr(self, '_initialized') and self._initialized:
-            self.zeroize()
+            if self._handle is not None:
+                handle, self._handle = self._handle, None
+                self._arena.free(handle)
+            else:
+                self.zeroize()
+
+
+class SecretCache:
+    """Short-lived cache of decrypted secrets, each held in a SecureMemory.
+
+    Entries expire `ttl` seconds after they were stored and at most `maxsize` are
+    kept, least recently used going first. Every way out of the cache (expiry,
+    eviction, invalidate() on write, clear() on lock) zeroizes the entry.
+    """
+
+    TTL = 60.0
+    MAXSIZE = 64
+
+    def __init__(self, ttl: float = TTL, maxsize: int = MAXSIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                entry[1].zeroize()
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1].get_data().decode('utf-8')
+
+    def put(self, key: Hashable, value: str):
+        if not self.maxsize or self.ttl <= 0:
+            return
+        secret = SecureMemory(value.encode('utf-8'))
+        now = time.monotonic()
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                old[1].zeroize()
+            self._entries[key] = (now + self.ttl, secret)
+            self._purge(now)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)[1][1].zeroize()
+
+    def purge(self):
+        """Zeroize expired entries now rather than when they are next looked up."""
+        with self._lock:
+            self._purge(time.monotonic())
+
+    def _purge(self, now: float):
+        for key in [key for key, (expires, _) in self._entries.items() if expires <= now]:
+            self._entries.pop(key)[1].zeroize()
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry[1].zeroize()
+
+    def clear(self):
+        with self._lock:
+            entries, self._entries = self._entries, OrderedDict()
+        for _, secret in entries.values():
+            secret.zeroize()
+
+    def cache_info(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self._entries), 'maxsize': self.maxsize}
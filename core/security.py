@@ -1,13 +1,22 @@
 import os
 import json
 import base64
+import time
+import struct
 import getpass
+import hashlib
 import logging
-from typing import Optional
-from cryptography.fernet import Fernet
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives import hashes
 from datetime import datetime
+from core.secure_memory import SecureMemory
+from core.kdf import KdfParams, DEFAULT_PARAMS, load_salt_file, serialize_salt_file
 
 logger = logging.getLogger('sequential.security')
 
@@ -28,15 +37,57 @@ class EncryptionManager:
     - lockout protection (simple local file tracking)
     
     Uses Rust implementation when available for improved security (Argon2id).
+    Only the active backend's key is derived at startup; with Rust active, the
+    PBKDF2/Fernet key is derived on first access to `key`, i.e. when a legacy
+    Fernet blob is decrypted or rotated. Derivation times land in `kdf_timings`.
+
+    KDF cost parameters are stored in master_salt ahead of the salt (see core.kdf);
+    a bare legacy salt file means the defaults. They change only through rotation.
+
+    encrypt() output starts with a versioned envelope header naming the cipher, the
+    KDF and the key id (a hash of the salt), which decrypt() dispatches on; the header
+    is authenticated as AES-GCM associated data. Headerless blobs are legacy: Fernet
+    tokens, or raw nonce||AES-GCM from the Rust backend.
+
+    With a ProviderKeyring attached (use_keyring), encrypt(plaintext, provider) seals
+    under that provider's data key instead; the header then carries the data key's id.
     """
 
     BASE = '.sequential'
     SALT_FILE = os.path.join(BASE, 'master_salt')
     LOCK_FILE = os.path.join(BASE, 'lockout.json')
     LOCK_THRESHOLD = 5
+    PBKDF2_ITERATIONS = DEFAULT_PARAMS.pbkdf2_iterations
+    # a Fernet token is urlsafe base64 of a 0x80 version byte and a 64-bit timestamp
+    FERNET_PREFIX = b'gAAAAA'
+    # envelope header: magic, version, algorithm, KDF, key id
+    ENVELOPE = struct.Struct('>3sBBB4s')
+    ENVELOPE_MAGIC = b'SQE'
+    ENVELOPE_VERSION = 1
+    ALG_AES_GCM = 1
+    ALG_FERNET = 2
+    KDF_ARGON2ID = 1
+    KDF_PBKDF2 = 2
+    KDF_PROVIDER_KEY = 3
+    PROVIDER_KEY_PREFIX = ENVELOPE_MAGIC + bytes([ENVELOPE_VERSION, ALG_AES_GCM, KDF_PROVIDER_KEY])
+    # below this many items a thread pool costs more than it saves
+    PARALLEL_MIN = 64
+
+    def __init__(self, master_password: Optional[str] = None, salt: Optional[bytes] = None,
+                 kdf_params: Optional[KdfParams] = None):
+        """`salt` overrides .sequential/master_salt, which is then neither read nor created.
 
-    def __init__(self, master_password: Optional[str] = None):
+        `kdf_params` defaults to those stored with the salt, or DEFAULT_PARAMS for a new one.
+        """
         os.makedirs(self.BASE, exist_ok=True)
+        if salt is None:
+            stored = load_salt_file(self.SALT_FILE)
+            if stored is None:
+                salt, kdf_params = os.urandom(32), kdf_params or DEFAULT_PARAMS
+                with open(self.SALT_FILE, 'wb') as f:
+                    f.write(serialize_salt_file(salt, kdf_params))
+            else:
+                salt, kdf_params = stored[0], kdf_params or stored[1]
         
         pwd = master_password or os.environ.get('MASTER_PASSWORD')
         if pwd is None:
@@ -47,18 +98,82 @@ class EncryptionManager:
         
         self._use_rust = False
         self._rust = None
-        self.key = self._derive_key(pwd)
+        self._key = None
+        self._key_lock = Lock()
+        self._legacy_password = None
+        self._salt = salt
+        self.kdf_params = kdf_params or DEFAULT_PARAMS
+        self.keyring = None
+        self.kdf_timings = {}
         
         if RUST_AVAILABLE:
             try:
-                self._rust = RustEncryptionManager(pwd, use_argon2=True)
+                self._rust = self._timed('argon2id', lambda: RustEncryptionManager(
+                    pwd, use_argon2=True, salt=salt, **self.kdf_params.rust_kwargs()))
                 self._use_rust = True
                 logger.info("Using Rust EncryptionManager with Argon2id")
             except Exception as e:
                 logger.warning(f"Rust EncryptionManager initialization failed, using Python fallback: {e}")
+        
+        if self._use_rust:
+            self._legacy_password = SecureMemory(pwd.encode('utf-8'))
+        else:
+            self.key = self._timed('pbkdf2', lambda: self._derive_key(pwd, salt))
+        self.key_id = hashlib.sha256(b'sequential-key-id' + salt).digest()[:4]
 
-    def _derive_key(self, master_password: Optional[str]) -> bytes:
-        pwd = master_password or os.environ.get('MASTER_PASSWORD')
+    @property
+    def key(self) -> bytes:
+        """The PBKDF2-derived Fernet key, derived on first use when Rust is active."""
+        if self._key is None:
+            with self._key_lock:
+                if self._key is None:
+                    if self._legacy_password is None:
+                        raise RuntimeError('EncryptionManager is locked')
+                    pwd = self._legacy_password.get_data().decode('utf-8')
+                    self.key = self._timed('pbkdf2', lambda: self._derive_key(pwd, self._salt))
+                    self._legacy_password.zeroize()
+                    self._legacy_password = None
+        return self._key.get_data()
+
+    @key.setter
+    def key(self, value: bytes):
+        if self._key is not None:
+            self._key.zeroize()
+        self._key = SecureMemory(value)
+
+    def lock(self):
+        """Wipe every copy of the key this manager holds; later encrypt/decrypt calls fail."""
+        with self._key_lock:
+            for secret in (self._key, self._legacy_password):
+                if secret is not None:
+                    secret.zeroize()
+            self._key = None
+            self._legacy_password = None
+            self._rust = None
+            self._use_rust = False
+            if self.keyring is not None:
+                self.keyring.wipe()
+                self.keyring = None
+
+    def use_keyring(self, keyring):
+        """Encrypt provider-tagged plaintexts under the keyring's per-provider data keys."""
+        self.keyring = keyring
+
+    def key_encryption_key(self) -> bytes:
+        """A key derived from the master key for wrapping provider data keys."""
+        master = bytes(self._rust.key) if self._use_rust else self._aes_key()
+        return HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b'sequential-kek').derive(master)
+
+    def _timed(self, name: str, derive: Callable):
+        start = time.perf_counter()
+        result = derive()
+        elapsed = time.perf_counter() - start
+        self.kdf_timings[name] = elapsed
+        logger.info('Derived %s key in %.0f ms', name, elapsed * 1000)
+        return result
+
+    def _derive_key(self, master_password: Optional[str], salt: bytes) -> bytes:
+        pwd = master_password if master_password is not None else os.environ.get('MASTER_PASSWORD')
         if pwd is None:
             try:
                 pwd = getpass.getpass('Enter master password: ')
@@ -66,31 +181,192 @@ class EncryptionManager:
                 pwd = 'default_master_password'
         pwdb = pwd.encode('utf-8')
 
-        if os.path.exists(self.SALT_FILE):
-            salt = open(self.SALT_FILE, 'rb').read()
-        else:
-            salt = os.urandom(32)
-            with open(self.SALT_FILE, 'wb') as f:
-                f.write(salt)
-
         kdf = PBKDF2HMAC(
             algorithm=hashes.SHA256(),
             length=32,
             salt=salt,
-            iterations=300000,
+            iterations=self.kdf_params.pbkdf2_iterations,
         )
         return base64.urlsafe_b64encode(kdf.derive(pwdb))
 
-    def encrypt(self, plaintext: str) -> bytes:
+    def encrypt(self, plaintext: str, provider: Optional[str] = None) -> bytes:
+        if provider is not None and self.keyring is not None:
+            return self._seal_for(provider, plaintext)
         if self._use_rust:
-            return self._rust.encrypt(plaintext)
-        return Fernet(self.key).encrypt(plaintext.encode('utf-8'))
+            header = self._envelope(self.ALG_AES_GCM, self.KDF_ARGON2ID)
+            return header + bytes(self._rust.encrypt(plaintext, header))
+        header = self._envelope(self.ALG_AES_GCM, self.KDF_PBKDF2)
+        nonce = os.urandom(12)
+        return header + nonce + AESGCM(self._aes_key()).encrypt(nonce, plaintext.encode('utf-8'), header)
 
     def decrypt(self, ciphertext: bytes) -> str:
+        data = self._as_bytes(ciphertext)
+        envelope = self.envelope_of(data)
+        if envelope is None:
+            return self._decrypt_legacy(data)
+        alg, kdf, key_id = envelope
+        if alg == self.ALG_AES_GCM and kdf == self.KDF_PROVIDER_KEY:
+            if self.keyring is None:
+                raise ValueError('Blob is sealed with a provider data key but no keyring is attached')
+            key = self.keyring.key_for(key_id.hex())
+            body = data[self.ENVELOPE.size:]
+            return AESGCM(key).decrypt(body[:12], body[12:], data[:self.ENVELOPE.size]).decode('utf-8')
+        if key_id != self.key_id:
+            raise ValueError('Blob was encrypted under a different master key')
+        header, body = data[:self.ENVELOPE.size], data[self.ENVELOPE.size:]
+        if alg == self.ALG_AES_GCM and kdf == self.KDF_ARGON2ID:
+            if not self._use_rust:
+                raise ValueError('Argon2id-keyed blobs need rust_core')
+            return self._rust.decrypt(body, header)
+        if alg == self.ALG_AES_GCM and kdf == self.KDF_PBKDF2:
+            return AESGCM(self._aes_key()).decrypt(body[:12], body[12:], header).decode('utf-8')
+        if alg == self.ALG_FERNET and kdf == self.KDF_PBKDF2:
+            return Fernet(self.key).decrypt(body).decode('utf-8')
+        raise ValueError(f'Unsupported envelope algorithm {alg} / KDF {kdf}')
+
+    def encrypt_many(self, plaintexts: List[str], providers: Optional[List[str]] = None) -> List[bytes]:
+        """encrypt() for a whole list, in order; `providers` pairs each item with its provider.
+
+        The Rust backend seals the list on its own threads with the GIL released; the
+        Python fallback and provider data keys spread it over a thread pool.
+        """
+        plaintexts = list(plaintexts)
+        if providers is not None and self.keyring is not None:
+            return self._map(lambda pair: self._seal_for(*pair), list(zip(providers, plaintexts)))
         if self._use_rust:
-            return self._rust.decrypt(ciphertext)
+            header = self._envelope(self.ALG_AES_GCM, self.KDF_ARGON2ID)
+            try:
+                return [header + bytes(c) for c in self._rust.encrypt_many(plaintexts, header)]
+            except Exception as e:
+                logger.warning(f"Rust encrypt_many failed, using Python fallback: {e}")
+                return [self.encrypt(p) for p in plaintexts]
+        header = self._envelope(self.ALG_AES_GCM, self.KDF_PBKDF2)
+        aead = AESGCM(self._aes_key())
+
+        def seal(plaintext: str) -> bytes:
+            nonce = os.urandom(12)
+            return header + nonce + aead.encrypt(nonce, plaintext.encode('utf-8'), header)
+        return self._map(seal, plaintexts)
+
+    def decrypt_many(self, ciphertexts: List[bytes], strict: bool = True) -> List[Optional[str]]:
+        """decrypt() for a whole list, in order.
+
+        Blobs in the current format are opened in one parallel batch, anything else
+        item by item. With strict=False a blob that fails to decrypt yields None
+        instead of raising.
+        """
+        data = [self._as_bytes(c) for c in ciphertexts]
+        out = [None] * len(data)
+        master = self.envelope_of(self._master_envelope())
+        current = [i for i, blob in enumerate(data) if self.envelope_of(blob) == master]
+        if current:
+            for i, plain in zip(current, self._open_many([data[i][self.ENVELOPE.size:] for i in current])):
+                out[i] = plain
+        rest = [i for i, plain in enumerate(out) if plain is None]
+
+        def open_one(blob: bytes):
+            try:
+                return self.decrypt(blob)
+            except Exception as e:
+                return e
+        for i, plain in zip(rest, self._map(open_one, [data[i] for i in rest])):
+            if isinstance(plain, Exception):
+                if strict:
+                    raise plain
+                plain = None
+            out[i] = plain
+        return out
+
+    def _open_many(self, bodies: List[bytes]) -> List[Optional[str]]:
+        """Open current-format envelope bodies; failures come back as None."""
+        if self._use_rust:
+            header = self._envelope(self.ALG_AES_GCM, self.KDF_ARGON2ID)
+            try:
+                return self._rust.decrypt_many(bodies, header)
+            except Exception as e:
+                logger.warning(f"Rust decrypt_many failed, using Python fallback: {e}")
+                return [None] * len(bodies)
+        header = self._envelope(self.ALG_AES_GCM, self.KDF_PBKDF2)
+        aead = AESGCM(self._aes_key())
+
+        def open_body(body: bytes) -> Optional[str]:
+            try:
+                return aead.decrypt(body[:12], body[12:], header).decode('utf-8')
+            except Exception:
+                return None
+        return self._map(open_body, bodies)
+
+    def _map(self, fn: Callable, items: list) -> list:
+        """list(map(fn, items)), run in contiguous chunks on a thread pool when items is long."""
+        workers = os.cpu_count() or 1
+        if len(items) < self.PARALLEL_MIN or workers == 1:
+            return [fn(item) for item in items]
+        size = -(-len(items) // workers)
+        chunks = [items[i:i + size] for i in range(0, len(items), size)]
+        with ThreadPoolExecutor(max_workers=len(chunks), thread_name_prefix='seq-crypto') as pool:
+            return [result for chunk in pool.map(lambda chunk: [fn(item) for item in chunk], chunks) for result in chunk]
+
+    @staticmethod
+    def _as_bytes(ciphertext) -> bytes:
+        return ciphertext.encode('latin-1') if isinstance(ciphertext, str) else bytes(ciphertext)
+
+    def envelope_of(self, ciphertext) -> Optional[tuple]:
+        """(algorithm, kdf, key_id) from the blob's envelope header, or None for a legacy blob."""
+        head = bytes(ciphertext[:self.ENVELOPE.size])
+        if len(head) < self.ENVELOPE.size:
+            return None
+        magic, version, alg, kdf, key_id = self.ENVELOPE.unpack(head)
+        if magic != self.ENVELOPE_MAGIC or version != self.ENVELOPE_VERSION:
+            return None
+        return alg, kdf, key_id
+
+    def is_current(self, ciphertext) -> bool:
+        """True if the blob is already in the format encrypt() writes now under this key.
+
+        Provider-key blobs always count as current; with a keyring attached, blobs
+        sealed directly under the master key do not.
+        """
+        if self.uses_provider_key(ciphertext):
+            return True
+        return self.keyring is None and self.envelope_of(ciphertext) == self.envelope_of(self._master_envelope())
+
+    def uses_provider_key(self, ciphertext) -> bool:
+        return bytes(ciphertext[:len(self.PROVIDER_KEY_PREFIX)]) == self.PROVIDER_KEY_PREFIX
+
+    def _master_envelope(self) -> bytes:
+        return self._envelope(self.ALG_AES_GCM, self.KDF_ARGON2ID if self._use_rust else self.KDF_PBKDF2)
+
+    def _envelope(self, alg: int, kdf: int, key_id: Optional[bytes] = None) -> bytes:
+        return self.ENVELOPE.pack(self.ENVELOPE_MAGIC, self.ENVELOPE_VERSION, alg, kdf,
+                                  self.key_id if key_id is None else key_id)
+
+    def _seal_for(self, provider: str, plaintext: str) -> bytes:
+        key_id, key = self.keyring.data_key(provider)
+        header = self._envelope(self.ALG_AES_GCM, self.KDF_PROVIDER_KEY, bytes.fromhex(key_id))
+        nonce = os.urandom(12)
+        return header + nonce + AESGCM(key).encrypt(nonce, plaintext.encode('utf-8'), header)
+
+    def _aes_key(self) -> bytes:
+        # the raw PBKDF2 output, which is also what rust_core uses with use_argon2=False
+        return base64.urlsafe_b64decode(self.key)
+
+    def _decrypt_legacy(self, ciphertext: bytes) -> str:
+        if self._use_rust:
+            if not self._is_fernet(ciphertext):
+                return self._rust.decrypt(ciphertext)
+            try:
+                return Fernet(self.key).decrypt(ciphertext).decode('utf-8')
+            except InvalidToken:
+                # an AES-GCM nonce that happens to look like a Fernet header
+                return self._rust.decrypt(ciphertext)
         return Fernet(self.key).decrypt(ciphertext).decode('utf-8')
 
+    def _is_fernet(self, ciphertext) -> bool:
+        head = ciphertext[:len(self.FERNET_PREFIX)]
+        if isinstance(head, str):
+            head = head.encode('ascii', 'ignore')
+        return bytes(head) == self.FERNET_PREFIX
+
     def _read_lock(self) -> dict:
         try:
             with open(self.LOCK_FILE, 'r') as f:
@@ -126,74 +402,35 @@ class EncryptionManager:
             return False
         return data.get('fails', 0) >= self.LOCK_THRESHOLD
 
-    def rotate_master_password(self, old_password: str, new_password: str, db, cfg_manager):
-        """Re-derive new key and re-encrypt all stored blobs (filesystem + sqlite).
+    def rotate_master_password(self, old_password: str, new_password: str, db, cfg_manager,
+                               progress: Optional[Callable[[str, int, int], None]] = None,
+                               kdf_params: Optional[KdfParams] = None):
+        """Re-encrypt every stored secret (sqlite + filesystem) under new_password.
 
-        This operation reads every encrypted blob, decrypts with the old key, then re-encrypts
-        with the new key. It must be called with correct old_password.
+        Runs a MasterKeyRotation: blobs are re-encrypted across a thread pool, written
+        back in batched transactions and checkpointed, so an interrupted rotation resumes
+        when called again with the same passwords. `progress(phase, done, total)` is
+        called after every batch. Provider data keys are only rewrapped, so blobs
+        sealed under them are not touched. `kdf_params` (e.g. from core.kdf.calibrate)
+        applies to the new key; by default the current parameters carry over. Afterwards
+        this manager uses the new key.
         """
-        old_key = self._derive_key(old_password)
-        test_fernet = Fernet(old_key)
-        all_meta = db.list_all()
-        sample = None
-        for cat, entries in all_meta.items():
-            for k, meta in entries.items():
-                blob = meta.get('blob') or None
-                if blob:
-                    sample = (cat, k, blob)
-                    break
-            if sample:
-                break
-
-        if sample:
-            try:
-                base = base64.b64decode(sample[2])
-                test_fernet.decrypt(base)
-            except Exception as e:
-                raise ValueError('Old password verification failed')
-
-        new_salt = os.urandom(32)
-        with open(self.SALT_FILE, 'wb') as f:
-            f.write(new_salt)
+        from core.rotation import MasterKeyRotation
+        from core.crypto_advanced import ProviderKeyring
+        rotated = MasterKeyRotation(db, cfg_manager, progress=progress,
+                                    kdf_params=kdf_params).run(old_password, new_password)
+        if self.keyring is not None:
+            rotated.use_keyring(ProviderKeyring.for_manager(db, rotated))
+        self._adopt(rotated)
 
-        new_kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=new_salt,
-            iterations=300000,
-        )
-        new_key = base64.urlsafe_b64encode(new_kdf.derive(new_password.encode('utf-8')))
-
-        for category, entries in all_meta.items():
-            for key_name, meta in entries.items():
-                parts = key_name.split('_', 1)
-                if len(parts) != 2:
-                    continue
-                provider, cfg = parts
-                blob_entry = db.get_blob_entry(category, provider, cfg)
-                if blob_entry and blob_entry.get('blob'):
-                    raw = base64.b64decode(blob_entry['blob'])
-                    old_plain = Fernet(old_key).decrypt(raw)
-                    new_cipher = Fernet(new_key).encrypt(old_plain)
-                    db.set_blob(category, provider, cfg, {'blob': base64.b64encode(new_cipher).decode('utf-8')})
-        for category in ('tokens', 'apis'):
-            enc_dir = os.path.join(cfg_manager.BASE, category, 'encrypted')
-            if not os.path.isdir(enc_dir):
-                continue
-            for fname in os.listdir(enc_dir):
-                path = os.path.join(enc_dir, fname)
-                try:
-                    raw = open(path, 'rb').read()
-                    plain = Fernet(old_key).decrypt(raw)
-                    new_cipher = Fernet(new_key).encrypt(plain)
-                    with open(path, 'wb') as f:
-                        f.write(new_cipher)
-                except Exception:
-                    continue
-
-        self.key = new_key
-        if self._use_rust and RUST_AVAILABLE:
-            try:
-                self._rust = RustEncryptionManager(new_password, use_argon2=True)
-            except Exception as e:
-                logger.warning(f"Failed to reinitialize Rust EncryptionManager after rotation: {e}")
+    def _adopt(self, other: 'EncryptionManager'):
+        """Wipe this manager's key and take over other's."""
+        self.lock()
+        with self._key_lock:
+            self._rust, self._use_rust = other._rust, other._use_rust
+            self._key, self._legacy_password = other._key, other._legacy_password
+            self._salt, self.kdf_params = other._salt, other.kdf_params
+            self.key_id = other.key_id
+            self.keyring = other.keyring
+            self.kdf_timings = other.kdf_timings
+            other._key = other._legacy_password = other._rust = other.keyring = None
@@ -1,5 +1,4 @@
 import os
-import base64
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, simpledialog
 from datetime import datetime, timedelta
@@ -11,12 +10,15 @@ try:
 except ImportError:
     HAS_BOOTSTRAP = False
 
+from core.agent import lock_running_agent
 from core.security import EncryptionManager
 from core.configs import ConfigManager
 from core.database import Database
 from core.migration import migrate_filesystem_to_db
 from core.audit import AuditLogger
 from core.backup import BackupManager
+from core.rotation import EnvelopeUpgrader
+from core.crypto_advanced import ProviderKeyring
 from core.clipboard import secure_copy
 from core.validators import validate_discord_token, validate_github_token
 
@@ -146,9 +148,15 @@ class CredentialGUI:
             raise SystemExit("No master password provided")
 
         self.encryption = EncryptionManager(master_password)
+        try:
+            self.encryption.use_keyring(ProviderKeyring.for_manager(self.db, self.encryption))
+        except ValueError:
+            self.encryption.lock()
+            raise SystemExit("Wrong master password")
         self.cfg = ConfigManager(self.db, self.encryption)
         self.audit = AuditLogger(self.encryption)
         self.backup = BackupManager(self.encryption, self.db)
+        self.upgrader = EnvelopeUpgrader(self.db, self.encryption).start()
 
         self.root = tb.Window(themename=saved_theme) if self.style else tk.Tk()
         self.root.title('Sequential Credential Manager')
@@ -199,6 +207,7 @@ class CredentialGUI:
         def check_lock():
             if self.locked:
                 return
+            self.cfg.secrets.purge()
             timeout = self.AUTO_LOCK_OPTIONS.get(self.auto_lock_var.get(), 0)
             if timeout > 0:
                 elapsed = (datetime.now() - self.last_activity).total_seconds()
@@ -211,6 +220,7 @@ class CredentialGUI:
         if self.locked:
             return
         self.locked = True
+        self.cfg.secrets.clear()
         self.lock_overlay = tk.Toplevel(self.root)
         self.lock_overlay.transient(self.root)
         self.lock_overlay.grab_set()
@@ -466,19 +476,13 @@ class CredentialGUI:
         self.config_var.set(config_name)
         self.category_var.set(category)
         
-        blob_entry = self.db.get_blob_entry(category, provider, config_name)
-        if blob_entry and blob_entry.get('blob'):
-            try:
-                data = self.encryption.decrypt(base64.b64decode(blob_entry['blob']))
-                self.data_var.set(data)
-                self.store_in_db.set(True)
-            except Exception:
-                self.data_var.set('')
-                self.store_in_db.set(True)
-        else:
-            token = self.cfg.load_from_filesystem(category, provider, config_name)
-            self.data_var.set(token or '')
-            self.store_in_db.set(False)
+        try:
+            token, in_db = self.cfg.load_secret(category, provider, config_name)
+        except Exception:
+            token, in_db = None, True
+        self.data_var.set(token or '')
+        self.store_in_db.set(in_db)
+        if not in_db:
             self.db.sync_filesystem_entry(category, provider, config_name, has_credential=token is not None)
         
         entries = self.db.get_all_entries(category)
@@ -629,31 +633,32 @@ class CredentialGUI:
         has_existing_blob = False
         
         if is_existing:
-            existing_blob = self.db.get_blob_entry(category, provider, cfg)
-            has_existing_blob = existing_blob and existing_blob.get('blob')
+            has_existing_blob = self.db.get_blob_bytes(category, provider, cfg) is not None
             if not has_existing_blob:
                 existing_token = self.cfg.load_from_filesystem(category, provider, cfg)
                 has_existing_blob = existing_token is not None
 
-        if value:
-            encrypted = self.encryption.encrypt(value)
-            if self.store_in_db.get():
-                blob = base64.b64encode(encrypted).decode('utf-8')
-                meta = {'blob': blob}
-                self.db.set_blob(category, provider, cfg, meta)
-            else:
-                path_meta = self.cfg.save_to_filesystem(category, provider, cfg, encrypted)
-                self.db.set(category, f"{provider}_{cfg}", path_meta)
-        elif not is_existing:
-            self.db.set(category, f"{provider}_{cfg}", {'placeholder': True})
-
         notes = self.notes_text.get('1.0', 'end').strip()
         expiry = self.expiry_var.get().strip()
         favorite = self.favorite_var.get()
-        
-        self.db.set_favorite(category, provider, cfg, favorite)
-        self.db.set_notes(category, provider, cfg, notes)
-        self.db.set_expiry(category, provider, cfg, expiry if expiry else None)
+
+        # sealed before the batch: a first-use provider data key must be committed
+        # even if the batch is rolled back
+        encrypted = self.encryption.encrypt(value, provider=provider) if value else None
+        self.cfg.forget(category, provider, cfg)
+        with self.db.batch():
+            if value:
+                if self.store_in_db.get():
+                    self.db.set_blob_bytes(category, provider, cfg, encrypted, {})
+                else:
+                    path_meta = self.cfg.save_to_filesystem(category, provider, cfg, encrypted)
+                    self.db.set(category, f"{provider}_{cfg}", path_meta)
+            elif not is_existing:
+                self.db.set(category, f"{provider}_{cfg}", {'placeholder': True})
+
+            self.db.set_favorite(category, provider, cfg, favorite)
+            self.db.set_notes(category, provider, cfg, notes)
+            self.db.set_expiry(category, provider, cfg, expiry if expiry else None)
 
         self.audit.log_event('save', {'category': category, 'provider': provider, 'config': cfg})
         self.set_status(f"Saved {cfg}")
@@ -669,6 +674,7 @@ class CredentialGUI:
             return
             
         if messagebox.askyesno('Confirm', f'Delete {cfg}?'):
+            self.cfg.forget(category, provider, cfg)
             self.db.delete(category, f"{provider}_{cfg}")
             self.cfg.delete_filesystem(category, provider, cfg)
             self.audit.log_event('delete', {'category': category, 'provider': provider, 'config': cfg})
@@ -693,6 +699,7 @@ class CredentialGUI:
         if not file_path:
             return
         self.db.import_from_file(file_path)
+        self.cfg.secrets.clear()
         self.audit.log_event('import', {'path': file_path})
         messagebox.showinfo('Import', 'Import complete')
         self.refresh_credential_list()
@@ -727,6 +734,11 @@ class CredentialGUI:
             if not messagebox.askyesno('Weak Password', 'The new password is weak. Continue anyway?'):
                 return
         
+        try:
+            lock_running_agent()
+        except ConnectionError as e:
+            messagebox.showerror('Error', f'Cannot rotate while an agent is running: {e}')
+            return
         try:
             self.encryption.rotate_master_password(old_pw, new_pw, self.db, self.cfg)
             self.audit.log_event('rotate_master', {})
@@ -744,6 +756,7 @@ class CredentialGUI:
         if not file_path:
             return
         self.backup.restore_backup(file_path)
+        self.cfg.secrets.clear()
         self.audit.log_event('backup_restore', {'path': file_path})
         messagebox.showinfo('Restore', 'Backup restored')
         self.refresh_credential_list()
@@ -1,16 +1,19 @@
 use pyo3::prelude::*;
-use pyo3::types::{PyDict, PyList};
+use pyo3::types::{PyBytes, PyDict, PyList};
 use rusqlite::{Connection, params};
+use rusqlite::types::ValueRef;
 use parking_lot::Mutex;
 use serde::{Deserialize, Serialize};
 use serde_json::{self, Value as JsonValue};
 use std::fs;
 use std::path::Path;
+use std::time::Duration;
 use chrono::{DateTime, Utc};
 use base64::{Engine as _, engine::general_purpose::STANDARD};
 
 const JSON_FILE: &str = "server_settings.json";
 const SQLITE_FILE: &str = "server_settings.db";
+const STATEMENT_CACHE_SIZE: usize = 256;
 
 #[derive(Debug, Clone, Serialize, Deserialize)]
 struct EntryInfo {
@@ -23,6 +26,7 @@ pub struct Database {
     json_path: String,
     sqlite_path: String,
     lock: Mutex<()>,
+    conn: Mutex<Connection>,
 }
 
 #[pymethods]
@@ -33,10 +37,13 @@ impl Database {
         let json_path = JSON_FILE.to_string();
         let sqlite_path = sqlite_path.unwrap_or_else(|| SQLITE_FILE.to_string());
         
+        let conn = Self::open_connection(&sqlite_path)?;
+        
         let db = Database {
             json_path: json_path.clone(),
             sqlite_path: sqlite_path.clone(),
             lock: Mutex::new(()),
+            conn: Mutex::new(conn),
         };
         
         db.init_json()?;
@@ -155,11 +162,9 @@ impl Database {
     }
     
     fn get_blob_entry(&self, py: Python, category: &str, provider: &str, cfg: &str) -> PyResult<Option<PyObject>> {
-        let conn = Connection::open(&self.sqlite_path).map_err(|e| {
-            PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e))
-        })?;
+        let conn = self.conn.lock();
         
-        let mut stmt = conn.prepare(
+        let mut stmt = conn.prepare_cached(
             "SELECT info, blob, updated_at FROM metadata WHERE category=? AND provider=? AND config_name=?"
         ).map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e)))?;
         
@@ -179,7 +184,7 @@ impl Database {
                 
                 dict.set_item("info", json_to_pyobject(py, &info)?)?;
                 
-                if let Some(blob_data) = blob {
+                if let Some(blob_data) = blob.filter(|b: &Vec<u8>| !b.is_empty()) {
                     dict.set_item("blob", STANDARD.encode(&blob_data))?;
                 } else {
                     dict.set_item("blob", py.None())?;
@@ -194,12 +199,32 @@ impl Database {
         }
     }
     
+    fn get_blob_bytes(&self, py: Python, category: &str, provider: &str, cfg: &str) -> PyResult<Option<PyObject>> {
+        let conn = self.conn.lock();
+        
+        let mut stmt = conn.prepare_cached(
+            "SELECT blob FROM metadata WHERE category=? AND provider=? AND config_name=?"
+        ).map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e)))?;
+        
+        // copy straight from SQLite's buffer into the bytes object
+        let result: rusqlite::Result<Option<PyObject>> = stmt.query_row(params![category, provider, cfg], |row| {
+            Ok(match row.get_ref(0)? {
+                ValueRef::Blob(blob) if !blob.is_empty() => Some(PyBytes::new(py, blob).into()),
+                _ => None,
+            })
+        });
+        
+        match result {
+            Ok(blob) => Ok(blob),
+            Err(rusqlite::Error::QueryReturnedNoRows) => Ok(None),
+            Err(e) => Err(PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e))),
+        }
+    }
+    
     fn list_categories(&self) -> PyResult<Vec<String>> {
-        let conn = Connection::open(&self.sqlite_path).map_err(|e| {
-            PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e))
-        })?;
+        let conn = self.conn.lock();
         
-        let mut stmt = conn.prepare("SELECT name FROM categories ORDER BY name")
+        let mut stmt = conn.prepare_cached("SELECT name FROM categories ORDER BY name")
             .map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e)))?;
         
         let categories: Vec<String> = stmt.query_map([], |row| row.get(0))
@@ -211,9 +236,7 @@ impl Database {
     }
     
     fn add_category(&self, name: &str) -> PyResult<()> {
-        let conn = Connection::open(&self.sqlite_path).map_err(|e| {
-            PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e))
-        })?;
+        let conn = self.conn.lock();
         
         conn.execute(
             "INSERT OR IGNORE INTO categories (name) VALUES (?)",
@@ -228,9 +251,7 @@ impl Database {
             return Ok(false);
         }
         
-        let conn = Connection::open(&self.sqlite_path).map_err(|e| {
-            PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e))
-        })?;
+        let conn = self.conn.lock();
         
         conn.execute("DELETE FROM categories WHERE name = ?", params![name])
             .map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e)))?;
@@ -239,11 +260,9 @@ impl Database {
     }
     
     fn get_setting(&self, key: &str, default: Option<String>) -> PyResult<Option<String>> {
-        let conn = Connection::open(&self.sqlite_path).map_err(|e| {
-            PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e))
-        })?;
+        let conn = self.conn.lock();
         
-        let mut stmt = conn.prepare("SELECT value FROM settings WHERE key = ?")
+        let mut stmt = conn.prepare_cached("SELECT value FROM settings WHERE key = ?")
             .map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e)))?;
         
         match stmt.query_row(params![key], |row| row.get::<_, String>(0)) {
@@ -254,9 +273,7 @@ impl Database {
     }
     
     fn set_setting(&self, key: &str, value: &str) -> PyResult<()> {
-        let conn = Connection::open(&self.sqlite_path).map_err(|e| {
-            PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e))
-        })?;
+        let conn = self.conn.lock();
         
         conn.execute(
             "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
@@ -269,14 +286,13 @@ impl Database {
     fn set_favorite(&self, category: &str, provider: &str, cfg: &str, favorite: bool) -> PyResult<()> {
         self.ensure_metadata_row(category, provider, cfg)?;
         
-        let conn = Connection::open(&self.sqlite_path).map_err(|e| {
-            PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e))
-        })?;
+        let conn = self.conn.lock();
         
         conn.execute(
             "UPDATE metadata SET favorite = ?, updated_at = ? WHERE category = ? AND provider = ? AND config_name = ?",
             params![favorite as i32, Utc::now().to_rfc3339(), category, provider, cfg]
         ).map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e)))?;
+        drop(conn);
         
         self.update_json_field(category, provider, cfg, "favorite", JsonValue::Bool(favorite))?;
         
@@ -286,14 +302,13 @@ impl Database {
     fn set_notes(&self, category: &str, provider: &str, cfg: &str, notes: &str) -> PyResult<()> {
         self.ensure_metadata_row(category, provider, cfg)?;
         
-        let conn = Connection::open(&self.sqlite_path).map_err(|e| {
-            PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e))
-        })?;
+        let conn = self.conn.lock();
         
         conn.execute(
             "UPDATE metadata SET notes = ?, updated_at = ? WHERE category = ? AND provider = ? AND config_name = ?",
             params![notes, Utc::now().to_rfc3339(), category, provider, cfg]
         ).map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e)))?;
+        drop(conn);
         
         self.update_json_field(category, provider, cfg, "notes", JsonValue::String(notes.to_string()))?;
         
@@ -303,14 +318,13 @@ impl Database {
     fn set_expiry(&self, category: &str, provider: &str, cfg: &str, expires_at: Option<String>) -> PyResult<()> {
         self.ensure_metadata_row(category, provider, cfg)?;
         
-        let conn = Connection::open(&self.sqlite_path).map_err(|e| {
-            PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e))
-        })?;
+        let conn = self.conn.lock();
         
         conn.execute(
             "UPDATE metadata SET expires_at = ?, updated_at = ? WHERE category = ? AND provider = ? AND config_name = ?",
             params![expires_at.as_deref(), Utc::now().to_rfc3339(), category, provider, cfg]
         ).map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e)))?;
+        drop(conn);
         
         let json_value = expires_at.map(JsonValue::String).unwrap_or(JsonValue::Null);
         self.update_json_field(category, provider, cfg, "expires_at", json_value)?;
@@ -319,9 +333,7 @@ impl Database {
     }
     
     fn get_all_entries(&self, py: Python, category: Option<String>) -> PyResult<PyObject> {
-        let conn = Connection::open(&self.sqlite_path).map_err(|e| {
-            PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e))
-        })?;
+        let conn = self.conn.lock();
         
         let entries = PyList::empty(py);
         
@@ -341,7 +353,7 @@ impl Database {
         }
         
         let results: Vec<RowTuple> = if let Some(ref cat) = category {
-            let mut stmt = conn.prepare(
+            let mut stmt = conn.prepare_cached(
                 "SELECT category, provider, config_name, info, favorite, notes, expires_at, updated_at 
                  FROM metadata WHERE category = ? ORDER BY favorite DESC, provider, config_name"
             ).map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e)))?;
@@ -350,7 +362,7 @@ impl Database {
                 .map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e)))?;
             mapped.filter_map(|r| r.ok()).collect()
         } else {
-            let mut stmt = conn.prepare(
+            let mut stmt = conn.prepare_cached(
                 "SELECT category, provider, config_name, info, favorite, notes, expires_at, updated_at 
                  FROM metadata ORDER BY favorite DESC, category, provider, config_name"
             ).map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e)))?;
@@ -384,13 +396,11 @@ impl Database {
     }
     
     fn search_entries(&self, py: Python, query: &str) -> PyResult<PyObject> {
-        let conn = Connection::open(&self.sqlite_path).map_err(|e| {
-            PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e))
-        })?;
+        let conn = self.conn.lock();
         
         let pattern = format!("%{}%", query);
         
-        let mut stmt = conn.prepare(
+        let mut stmt = conn.prepare_cached(
             "SELECT category, provider, config_name, info, favorite, notes, expires_at, updated_at 
              FROM metadata 
              WHERE provider LIKE ? OR config_name LIKE ? OR notes LIKE ?
@@ -440,11 +450,9 @@ impl Database {
     fn get_expiring_entries(&self, py: Python, days: Option<i64>) -> PyResult<PyObject> {
         let days = days.unwrap_or(7);
         
-        let conn = Connection::open(&self.sqlite_path).map_err(|e| {
-            PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e))
-        })?;
+        let conn = self.conn.lock();
         
-        let mut stmt = conn.prepare(
+        let mut stmt = conn.prepare_cached(
             "SELECT category, provider, config_name, expires_at 
              FROM metadata 
              WHERE expires_at IS NOT NULL AND expires_at != ''
@@ -540,6 +548,23 @@ impl Database {
 }
 
 impl Database {
+    /// Open the long-lived connection shared by every method, tuned like the Python pool.
+    fn open_connection(sqlite_path: &str) -> PyResult<Connection> {
+        let conn = Connection::open(sqlite_path).map_err(|e| {
+            PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e))
+        })?;
+        
+        conn.pragma_update_and_check(None, "journal_mode", "WAL", |row| row.get::<_, String>(0))
+            .map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e)))?;
+        conn.pragma_update(None, "synchronous", "NORMAL")
+            .map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e)))?;
+        conn.busy_timeout(Duration::from_secs(5))
+            .map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e)))?;
+        conn.set_prepared_statement_cache_capacity(STATEMENT_CACHE_SIZE);
+        
+        Ok(conn)
+    }
+    
     fn init_json(&self) -> PyResult<()> {
         if !Path::new(&self.json_path).exists() {
             fs::write(&self.json_path, "{}")
@@ -549,9 +574,7 @@ impl Database {
     }
     
     fn init_sqlite(&self) -> PyResult<()> {
-        let conn = Connection::open(&self.sqlite_path).map_err(|e| {
-            PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e))
-        })?;
+        let conn = self.conn.lock();
         
         conn.execute_batch(
             "CREATE TABLE IF NOT EXISTS metadata (
@@ -627,9 +650,7 @@ impl Database {
     }
     
     fn sqlite_upsert(&self, category: &str, provider: &str, cfg: &str, info_text: &str, blob_bytes: Option<&[u8]>) -> PyResult<()> {
-        let conn = Connection::open(&self.sqlite_path).map_err(|e| {
-            PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e))
-        })?;
+        let conn = self.conn.lock();
         
         conn.execute(
             "INSERT INTO metadata (category, provider, config_name, info, blob, updated_at)
@@ -645,9 +666,7 @@ impl Database {
     }
     
     fn sqlite_delete(&self, category: &str, provider: &str, cfg: &str) -> PyResult<()> {
-        let conn = Connection::open(&self.sqlite_path).map_err(|e| {
-            PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e))
-        })?;
+        let conn = self.conn.lock();
         
         conn.execute(
             "DELETE FROM metadata WHERE category=? AND provider=? AND config_name=?",
@@ -658,9 +677,7 @@ impl Database {
     }
     
     fn ensure_metadata_row(&self, category: &str, provider: &str, cfg: &str) -> PyResult<()> {
-        let conn = Connection::open(&self.sqlite_path).map_err(|e| {
-            PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e))
-        })?;
+        let conn = self.conn.lock();
         
         let exists: bool = conn.query_row(
             "SELECT 1 FROM metadata WHERE category = ? AND provider = ? AND config_name = ?",
@@ -674,6 +691,8 @@ impl Database {
                 params![category, provider, cfg, "{}", Utc::now().to_rfc3339()]
             ).map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("SQLite error: {}", e)))?;
         }
+        // set() takes the JSON lock before the connection; never hold both the other way round
+        drop(conn);
         
         let _guard = self.lock.lock();
         let mut data = self.read_json()?;
@@ -7,8 +7,11 @@ mod crypto_advanced;
 mod database;
 mod validators;
 
-use secure_memory::SecureMemory;
-use scanner::{scan_text_for_secrets, scan_files};
+use secure_memory::{SecureMemory, SecureArena};
+use scanner::{
+    scan_text_for_secrets, scan_files, scan_file_chunked, scan_bytes, scan_directory, stream_text, stream_files,
+    SecretStream,
+};
 use security::EncryptionManager;
 use crypto_advanced::AdvancedCrypto;
 use database::Database;
@@ -23,12 +26,19 @@ use validators::{
 #[pymodule]
 fn rust_core(_py: Python, m: &PyModule) -> PyResult<()> {
     m.add_class::<SecureMemory>()?;
+    m.add_class::<SecureArena>()?;
     m.add_class::<EncryptionManager>()?;
     m.add_class::<AdvancedCrypto>()?;
     m.add_class::<Database>()?;
+    m.add_class::<SecretStream>()?;
     
     m.add_function(wrap_pyfunction!(scan_text_for_secrets, m)?)?;
     m.add_function(wrap_pyfunction!(scan_files, m)?)?;
+    m.add_function(wrap_pyfunction!(scan_file_chunked, m)?)?;
+    m.add_function(wrap_pyfunction!(scan_bytes, m)?)?;
+    m.add_function(wrap_pyfunction!(scan_directory, m)?)?;
+    m.add_function(wrap_pyfunction!(stream_text, m)?)?;
+    m.add_function(wrap_pyfunction!(stream_files, m)?)?;
     
     m.add_function(wrap_pyfunction!(validate_discord_token, m)?)?;
     m.add_function(wrap_pyfunction!(validate_github_token, m)?)?;
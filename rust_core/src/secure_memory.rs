@@ -1,5 +1,5 @@
 use pyo3::prelude::*;
-use pyo3::types::PyBytes;
+use pyo3::types::{PyBytes, PyDict};
 use zeroize::Zeroize;
 use std::ptr;
 
@@ -123,6 +123,128 @@ impl Drop for SecureMemory {
     }
 }
 
+/// One mlocked region carved into fixed-size slots. A secret takes a run of
+/// consecutive slots; handles are the index of the run's first slot.
+#[pyclass]
+pub struct SecureArena {
+    buf: Box<[u8]>,
+    slot_size: usize,
+    // per slot: length in bytes of the secret starting there, else None
+    lens: Vec<Option<usize>>,
+    used: Vec<bool>,
+    used_slots: usize,
+    peak_slots: usize,
+    allocations: u64,
+    failures: u64,
+    locked: bool,
+}
+
+#[pymethods]
+impl SecureArena {
+    #[new]
+    #[pyo3(signature = (slot_size=64, slots=1024))]
+    fn new(slot_size: usize, slots: usize) -> PyResult<Self> {
+        if slot_size == 0 || slots == 0 {
+            return Err(PyErr::new::<pyo3::exceptions::PyValueError, _>(
+                "slot_size and slots must be positive"
+            ));
+        }
+        let buf = vec![0u8; slot_size * slots].into_boxed_slice();
+        let locked = SecureMemory::lock_memory(&buf);
+        Ok(SecureArena {
+            buf,
+            slot_size,
+            lens: vec![None; slots],
+            used: vec![false; slots],
+            used_slots: 0,
+            peak_slots: 0,
+            allocations: 0,
+            failures: 0,
+            locked,
+        })
+    }
+
+    /// Copy data into the first free run of slots; None when no run is large enough.
+    fn alloc(&mut self, data: &[u8]) -> Option<usize> {
+        let need = std::cmp::max(1, (data.len() + self.slot_size - 1) / self.slot_size);
+        let mut run = 0;
+        for i in 0..self.used.len() {
+            run = if self.used[i] { 0 } else { run + 1 };
+            if run == need {
+                let start = i + 1 - need;
+                self.used[start..=i].iter_mut().for_each(|u| *u = true);
+                self.lens[start] = Some(data.len());
+                let offset = start * self.slot_size;
+                self.buf[offset..offset + data.len()].copy_from_slice(data);
+                self.used_slots += need;
+                self.peak_slots = std::cmp::max(self.peak_slots, self.used_slots);
+                self.allocations += 1;
+                return Some(start);
+            }
+        }
+        self.failures += 1;
+        None
+    }
+
+    fn read<'py>(&self, py: Python<'py>, handle: usize) -> PyResult<&'py PyBytes> {
+        let len = self.len_of(handle)?;
+        let offset = handle * self.slot_size;
+        Ok(PyBytes::new(py, &self.buf[offset..offset + len]))
+    }
+
+    /// Zero the secret's slots but keep them allocated.
+    fn zero(&mut self, handle: usize) -> PyResult<()> {
+        let len = self.len_of(handle)?;
+        let (offset, span) = (handle * self.slot_size, self.slots_for(len) * self.slot_size);
+        self.buf[offset..offset + span].zeroize();
+        Ok(())
+    }
+
+    /// Zero the secret's slots and return them to the arena.
+    fn free(&mut self, handle: usize) -> PyResult<()> {
+        self.zero(handle)?;
+        let need = self.slots_for(self.len_of(handle)?);
+        self.used[handle..handle + need].iter_mut().for_each(|u| *u = false);
+        self.lens[handle] = None;
+        self.used_slots -= need;
+        Ok(())
+    }
+
+    fn stats<'py>(&self, py: Python<'py>) -> PyResult<&'py PyDict> {
+        let stats = PyDict::new(py);
+        stats.set_item("slot_size", self.slot_size)?;
+        stats.set_item("slots", self.used.len())?;
+        stats.set_item("used", self.used_slots)?;
+        stats.set_item("peak", self.peak_slots)?;
+        stats.set_item("live", self.lens.iter().filter(|l| l.is_some()).count())?;
+        stats.set_item("allocations", self.allocations)?;
+        stats.set_item("failures", self.failures)?;
+        stats.set_item("locked", self.locked)?;
+        Ok(stats)
+    }
+}
+
+impl SecureArena {
+    fn slots_for(&self, len: usize) -> usize {
+        std::cmp::max(1, (len + self.slot_size - 1) / self.slot_size)
+    }
+
+    fn len_of(&self, handle: usize) -> PyResult<usize> {
+        self.lens.get(handle).copied().flatten().ok_or_else(|| {
+            PyErr::new::<pyo3::exceptions::PyKeyError, _>(format!("No secret at slot {}", handle))
+        })
+    }
+}
+
+impl Drop for SecureArena {
+    fn drop(&mut self) {
+        self.buf.zeroize();
+        if self.locked {
+            SecureMemory::unlock_memory(&self.buf);
+        }
+    }
+}
+
 #[cfg(test)]
 mod tests {
     use super::*;
@@ -146,4 +268,17 @@ mod tests {
         mem.clear();
         assert!(mem.data.iter().all(|&b| b == 0));
     }
+
+    #[test]
+    fn test_secure_arena_alloc_free() {
+        let mut arena = SecureArena::new(16, 4).unwrap();
+        let a = arena.alloc(b"0123456789abcdefXY").unwrap();
+        let b = arena.alloc(b"short").unwrap();
+        assert_eq!((a, b), (0, 2));
+        assert_eq!(arena.alloc(&[1u8; 32]), None);
+        arena.free(a).unwrap();
+        assert!(arena.buf[..32].iter().all(|&b| b == 0));
+        assert_eq!(arena.alloc(&[1u8; 32]), Some(0));
+        assert!(arena.free(1).is_err());
+    }
 }
@@ -2,10 +2,11 @@ use pyo3::prelude::*;
 use pyo3::types::PyBytes;
 use argon2::Argon2;
 use aes_gcm::{
-    aead::{Aead, KeyInit},
+    aead::{Aead, KeyInit, Payload},
     Aes256Gcm, Nonce,
 };
 use rand::RngCore;
+use rayon::prelude::*;
 use sha2::Sha256;
 use pbkdf2::pbkdf2_hmac;
 use base64::{Engine as _, engine::general_purpose::URL_SAFE};
@@ -24,6 +25,56 @@ const PBKDF2_ITERATIONS: u32 = 300_000;
 const ARGON2_MEMORY_COST: u32 = 65536;
 const ARGON2_TIME_COST: u32 = 3;
 const ARGON2_PARALLELISM: u32 = 4;
+const SALT_MAGIC: &[u8; 4] = b"SQK1";
+
+/// Per-vault KDF cost parameters. master_salt stores them ahead of the salt as
+/// b"SQK1" and four big-endian u32s; a file without the magic is a bare legacy
+/// salt and uses the defaults.
+#[derive(Clone, Copy, Debug, PartialEq)]
+struct KdfParams {
+    pbkdf2_iterations: u32,
+    argon2_memory_kib: u32,
+    argon2_time: u32,
+    argon2_parallelism: u32,
+}
+
+impl Default for KdfParams {
+    fn default() -> Self {
+        KdfParams {
+            pbkdf2_iterations: PBKDF2_ITERATIONS,
+            argon2_memory_kib: ARGON2_MEMORY_COST,
+            argon2_time: ARGON2_TIME_COST,
+            argon2_parallelism: ARGON2_PARALLELISM,
+        }
+    }
+}
+
+impl KdfParams {
+    fn parse(file: &[u8]) -> (KdfParams, Vec<u8>) {
+        if file.len() > 20 && &file[..4] == SALT_MAGIC {
+            let word = |i: usize| u32::from_be_bytes([file[4 + 4 * i], file[5 + 4 * i], file[6 + 4 * i], file[7 + 4 * i]]);
+            let params = KdfParams {
+                pbkdf2_iterations: word(0),
+                argon2_memory_kib: word(1),
+                argon2_time: word(2),
+                argon2_parallelism: word(3),
+            };
+            (params, file[20..].to_vec())
+        } else {
+            (KdfParams::default(), file.to_vec())
+        }
+    }
+    
+    fn serialize(&self, salt: &[u8]) -> Vec<u8> {
+        let mut out = Vec::with_capacity(20 + salt.len());
+        out.extend_from_slice(SALT_MAGIC);
+        for word in [self.pbkdf2_iterations, self.argon2_memory_kib, self.argon2_time, self.argon2_parallelism] {
+            out.extend_from_slice(&word.to_be_bytes());
+        }
+        out.extend_from_slice(salt);
+        out
+    }
+}
 
 #[derive(Debug, Serialize, Deserialize)]
 struct LockState {
@@ -44,13 +95,23 @@ impl Default for LockState {
 pub struct EncryptionManager {
     key: Mutex<Vec<u8>>,
     use_argon2: bool,
+    params: KdfParams,
 }
 
 #[pymethods]
 impl EncryptionManager {
     #[new]
-    #[pyo3(signature = (master_password=None, use_argon2=true))]
-    fn new(master_password: Option<&str>, use_argon2: bool) -> PyResult<Self> {
+    #[pyo3(signature = (master_password=None, use_argon2=true, salt=None, pbkdf2_iterations=None,
+                        argon2_memory_kib=None, argon2_time=None, argon2_parallelism=None))]
+    fn new(
+        master_password: Option<&str>,
+        use_argon2: bool,
+        salt: Option<&[u8]>,
+        pbkdf2_iterations: Option<u32>,
+        argon2_memory_kib: Option<u32>,
+        argon2_time: Option<u32>,
+        argon2_parallelism: Option<u32>,
+    ) -> PyResult<Self> {
         fs::create_dir_all(BASE_DIR).map_err(|e| {
             PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("Failed to create base dir: {}", e))
         })?;
@@ -60,19 +121,32 @@ impl EncryptionManager {
             .or_else(|| std::env::var("MASTER_PASSWORD").ok())
             .unwrap_or_else(|| "default_master_password".to_string());
         
+        // an explicit salt leaves master_salt untouched, e.g. while a rotation is in progress
+        let (mut params, salt) = match salt {
+            Some(salt) => (KdfParams::default(), salt.to_vec()),
+            None => Self::get_or_create_salt()?,
+        };
+        if let Some(v) = pbkdf2_iterations { params.pbkdf2_iterations = v; }
+        if let Some(v) = argon2_memory_kib { params.argon2_memory_kib = v; }
+        if let Some(v) = argon2_time { params.argon2_time = v; }
+        if let Some(v) = argon2_parallelism { params.argon2_parallelism = v; }
+        
         let key = if use_argon2 {
-            Self::derive_key_argon2(&password)?
+            Self::derive_key_argon2_with_salt(&password, &salt, &params)?
         } else {
-            Self::derive_key_pbkdf2(&password)?
+            Self::derive_key_pbkdf2_with_salt(&password, &salt, &params)?
         };
         
         Ok(EncryptionManager {
             key: Mutex::new(key),
             use_argon2,
+            params,
         })
     }
     
-    fn encrypt<'py>(&self, py: Python<'py>, plaintext: &str) -> PyResult<&'py PyBytes> {
+    /// `aad` is authenticated but not encrypted; the Python side passes the envelope header.
+    #[pyo3(signature = (plaintext, aad=None))]
+    fn encrypt<'py>(&self, py: Python<'py>, plaintext: &str, aad: Option<&[u8]>) -> PyResult<&'py PyBytes> {
         let key = self.key.lock();
         let cipher = Aes256Gcm::new_from_slice(&key[..32])
             .map_err(|e| PyErr::new::<pyo3::exceptions::PyValueError, _>(format!("Invalid key: {}", e)))?;
@@ -82,7 +156,7 @@ impl EncryptionManager {
         let nonce = Nonce::from_slice(&nonce_bytes);
         
         let ciphertext = cipher
-            .encrypt(nonce, plaintext.as_bytes())
+            .encrypt(nonce, Payload { msg: plaintext.as_bytes(), aad: aad.unwrap_or(&[]) })
             .map_err(|e| PyErr::new::<pyo3::exceptions::PyValueError, _>(format!("Encryption failed: {}", e)))?;
         
         let mut result = Vec::with_capacity(12 + ciphertext.len());
@@ -92,7 +166,8 @@ impl EncryptionManager {
         Ok(PyBytes::new(py, &result))
     }
     
-    fn decrypt(&self, ciphertext: &[u8]) -> PyResult<String> {
+    #[pyo3(signature = (ciphertext, aad=None))]
+    fn decrypt(&self, ciphertext: &[u8], aad: Option<&[u8]>) -> PyResult<String> {
         if ciphertext.len() < 12 {
             return Err(PyErr::new::<pyo3::exceptions::PyValueError, _>(
                 "Ciphertext too short"
@@ -105,7 +180,7 @@ impl EncryptionManager {
         
         let nonce = Nonce::from_slice(&ciphertext[..12]);
         let plaintext = cipher
-            .decrypt(nonce, &ciphertext[12..])
+            .decrypt(nonce, Payload { msg: &ciphertext[12..], aad: aad.unwrap_or(&[]) })
             .map_err(|e| PyErr::new::<pyo3::exceptions::PyValueError, _>(format!("Decryption failed: {}", e)))?;
         
         String::from_utf8(plaintext)
@@ -114,7 +189,7 @@ impl EncryptionManager {
     
     fn encrypt_base64(&self, plaintext: &str) -> PyResult<String> {
         Python::with_gil(|py| {
-            let encrypted = self.encrypt(py, plaintext)?;
+            let encrypted = self.encrypt(py, plaintext, None)?;
             Ok(URL_SAFE.encode(encrypted.as_bytes()))
         })
     }
@@ -122,7 +197,53 @@ impl EncryptionManager {
     fn decrypt_base64(&self, ciphertext_b64: &str) -> PyResult<String> {
         let ciphertext = URL_SAFE.decode(ciphertext_b64)
             .map_err(|e| PyErr::new::<pyo3::exceptions::PyValueError, _>(format!("Invalid base64: {}", e)))?;
-        self.decrypt(&ciphertext)
+        self.decrypt(&ciphertext, None)
+    }
+    
+    /// encrypt() over a whole list: the GIL is released and the items are sealed on rayon's pool.
+    #[pyo3(signature = (plaintexts, aad=None))]
+    fn encrypt_many<'py>(&self, py: Python<'py>, plaintexts: Vec<&str>, aad: Option<&[u8]>) -> PyResult<Vec<&'py PyBytes>> {
+        let cipher = self.cipher()?;
+        let aad = aad.unwrap_or(&[]);
+        let sealed: Result<Vec<Vec<u8>>, String> = py.allow_threads(|| {
+            plaintexts
+                .par_iter()
+                .map(|plaintext| {
+                    let mut nonce_bytes = [0u8; 12];
+                    rand::thread_rng().fill_bytes(&mut nonce_bytes);
+                    let ciphertext = cipher
+                        .encrypt(Nonce::from_slice(&nonce_bytes), Payload { msg: plaintext.as_bytes(), aad })
+                        .map_err(|e| format!("Encryption failed: {}", e))?;
+                    let mut result = Vec::with_capacity(12 + ciphertext.len());
+                    result.extend_from_slice(&nonce_bytes);
+                    result.extend_from_slice(&ciphertext);
+                    Ok(result)
+                })
+                .collect()
+        });
+        let sealed = sealed.map_err(|e| PyErr::new::<pyo3::exceptions::PyValueError, _>(e))?;
+        Ok(sealed.iter().map(|c| PyBytes::new(py, c)).collect())
+    }
+    
+    /// decrypt() over a whole list with the GIL released; items that fail come back as None.
+    #[pyo3(signature = (ciphertexts, aad=None))]
+    fn decrypt_many(&self, py: Python<'_>, ciphertexts: Vec<&[u8]>, aad: Option<&[u8]>) -> PyResult<Vec<Option<String>>> {
+        let cipher = self.cipher()?;
+        let aad = aad.unwrap_or(&[]);
+        Ok(py.allow_threads(|| {
+            ciphertexts
+                .par_iter()
+                .map(|ciphertext| {
+                    if ciphertext.len() < 12 {
+                        return None;
+                    }
+                    cipher
+                        .decrypt(Nonce::from_slice(&ciphertext[..12]), Payload { msg: &ciphertext[12..], aad })
+                        .ok()
+                        .and_then(|plaintext| String::from_utf8(plaintext).ok())
+                })
+                .collect()
+        }))
     }
     
     fn record_failed_attempt(&self) -> PyResult<()> {
@@ -160,10 +281,11 @@ impl EncryptionManager {
     }
     
     fn rotate_master_password(&mut self, old_password: &str, new_password: &str) -> PyResult<()> {
+        let (_, old_salt) = Self::get_or_create_salt()?;
         let old_key = if self.use_argon2 {
-            Self::derive_key_argon2(old_password)?
+            Self::derive_key_argon2_with_salt(old_password, &old_salt, &self.params)?
         } else {
-            Self::derive_key_pbkdf2(old_password)?
+            Self::derive_key_pbkdf2_with_salt(old_password, &old_salt, &self.params)?
         };
         
         {
@@ -177,13 +299,13 @@ impl EncryptionManager {
         
         let mut new_salt = [0u8; 32];
         rand::thread_rng().fill_bytes(&mut new_salt);
-        fs::write(SALT_FILE, &new_salt)
+        fs::write(SALT_FILE, self.params.serialize(&new_salt))
             .map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("Failed to write salt: {}", e)))?;
         
         let new_key = if self.use_argon2 {
-            Self::derive_key_argon2_with_salt(new_password, &new_salt)?
+            Self::derive_key_argon2_with_salt(new_password, &new_salt, &self.params)?
         } else {
-            Self::derive_key_pbkdf2_with_salt(new_password, &new_salt)?
+            Self::derive_key_pbkdf2_with_salt(new_password, &new_salt, &self.params)?
         };
         
         let mut key = self.key.lock();
@@ -205,45 +327,43 @@ impl EncryptionManager {
 }
 
 impl EncryptionManager {
-    fn get_or_create_salt() -> PyResult<Vec<u8>> {
+    fn cipher(&self) -> PyResult<Aes256Gcm> {
+        let key = self.key.lock();
+        Aes256Gcm::new_from_slice(&key[..32])
+            .map_err(|e| PyErr::new::<pyo3::exceptions::PyValueError, _>(format!("Invalid key: {}", e)))
+    }
+    
+    fn get_or_create_salt() -> PyResult<(KdfParams, Vec<u8>)> {
         if Path::new(SALT_FILE).exists() {
-            fs::read(SALT_FILE)
-                .map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("Failed to read salt: {}", e)))
+            let file = fs::read(SALT_FILE)
+                .map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("Failed to read salt: {}", e)))?;
+            Ok(KdfParams::parse(&file))
         } else {
             let mut salt = vec![0u8; 32];
             rand::thread_rng().fill_bytes(&mut salt);
-            fs::write(SALT_FILE, &salt)
+            let params = KdfParams::default();
+            fs::write(SALT_FILE, params.serialize(&salt))
                 .map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(format!("Failed to write salt: {}", e)))?;
-            Ok(salt)
+            Ok((params, salt))
         }
     }
     
-    fn derive_key_pbkdf2(password: &str) -> PyResult<Vec<u8>> {
-        let salt = Self::get_or_create_salt()?;
-        Self::derive_key_pbkdf2_with_salt(password, &salt)
-    }
-    
-    fn derive_key_pbkdf2_with_salt(password: &str, salt: &[u8]) -> PyResult<Vec<u8>> {
+    fn derive_key_pbkdf2_with_salt(password: &str, salt: &[u8], kdf: &KdfParams) -> PyResult<Vec<u8>> {
         let mut key = vec![0u8; 32];
         pbkdf2_hmac::<Sha256>(
             password.as_bytes(),
             salt,
-            PBKDF2_ITERATIONS,
+            kdf.pbkdf2_iterations,
             &mut key,
         );
         Ok(key)
     }
     
-    fn derive_key_argon2(password: &str) -> PyResult<Vec<u8>> {
-        let salt = Self::get_or_create_salt()?;
-        Self::derive_key_argon2_with_salt(password, &salt)
-    }
-    
-    fn derive_key_argon2_with_salt(password: &str, salt: &[u8]) -> PyResult<Vec<u8>> {
+    fn derive_key_argon2_with_salt(password: &str, salt: &[u8], kdf: &KdfParams) -> PyResult<Vec<u8>> {
         let params = argon2::Params::new(
-            ARGON2_MEMORY_COST,
-            ARGON2_TIME_COST,
-            ARGON2_PARALLELISM,
+            kdf.argon2_memory_kib,
+            kdf.argon2_time,
+            kdf.argon2_parallelism,
             Some(32),
         ).map_err(|e| PyErr::new::<pyo3::exceptions::PyValueError, _>(format!("Invalid Argon2 params: {}", e)))?;
         
@@ -285,16 +405,53 @@ mod tests {
     
     #[test]
     fn test_encrypt_decrypt() {
-        let manager = EncryptionManager::new(Some("test_password"), false).unwrap();
+        let manager = EncryptionManager::new(Some("test_password"), false, None, None, None, None, None).unwrap();
         let plaintext = "Hello, World!";
         let encrypted = manager.encrypt_base64(plaintext).unwrap();
         let decrypted = manager.decrypt_base64(&encrypted).unwrap();
         assert_eq!(plaintext, decrypted);
     }
     
+    #[test]
+    fn test_aad_is_authenticated() {
+        let manager = EncryptionManager::new(Some("test_password"), false, Some(&[7u8; 32]), None, None, None, None).unwrap();
+        Python::with_gil(|py| {
+            let encrypted = manager.encrypt(py, "secret", Some(b"header")).unwrap().as_bytes().to_vec();
+            assert_eq!(manager.decrypt(&encrypted, Some(b"header")).unwrap(), "secret");
+            assert!(manager.decrypt(&encrypted, Some(b"other")).is_err());
+            assert!(manager.decrypt(&encrypted, None).is_err());
+        });
+    }
+    
+    #[test]
+    fn test_many_matches_single() {
+        let manager = EncryptionManager::new(Some("test_password"), false, Some(&[7u8; 32]), None, None, None, None).unwrap();
+        Python::with_gil(|py| {
+            let sealed: Vec<Vec<u8>> = manager
+                .encrypt_many(py, vec!["a", "bb", "ccc"], Some(b"header"))
+                .unwrap()
+                .iter()
+                .map(|c| c.as_bytes().to_vec())
+                .collect();
+            assert_eq!(manager.decrypt(&sealed[1], Some(b"header")).unwrap(), "bb");
+            let mut inputs: Vec<&[u8]> = sealed.iter().map(|c| c.as_slice()).collect();
+            inputs.push(b"short");
+            let opened = manager.decrypt_many(py, inputs, Some(b"header")).unwrap();
+            assert_eq!(opened, vec![Some("a".to_string()), Some("bb".to_string()), Some("ccc".to_string()), None]);
+        });
+    }
+    
+    #[test]
+    fn test_kdf_params_round_trip() {
+        let params = KdfParams { pbkdf2_iterations: 123_456, argon2_memory_kib: 19456, argon2_time: 2, argon2_parallelism: 1 };
+        let salt = [9u8; 32];
+        assert_eq!(KdfParams::parse(&params.serialize(&salt)), (params, salt.to_vec()));
+        assert_eq!(KdfParams::parse(&salt), (KdfParams::default(), salt.to_vec()));
+    }
+    
     #[test]
     fn test_lockout() {
-        let manager = EncryptionManager::new(Some("test_password"), false).unwrap();
+        let manager = EncryptionManager::new(Some("test_password"), false, None, None, None, None, None).unwrap();
         assert!(!manager.is_locked());
     }
 }
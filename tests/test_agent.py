@@ -0,0 +1,44 @@
+import os
+import socket
+
+import pytest
+
+from core.agent import AgentServer, lock_running_agent
+from core.backup import BackupManager
+from core.database import Database
+
+
+class _Sealer:
+    def encrypt(self, plaintext, provider=None):
+        return plaintext.encode('utf-8')
+
+
+def test_requests_after_lock_are_refused(workdir):
+    server = AgentServer(_Sealer(), path=str(workdir / 'agent.sock'))
+    assert server.dispatch({'op': 'encrypt', 'plaintext': 'x'})['ok']
+    assert server.dispatch({'op': 'lock'}) == {'ok': True}
+    # the serve loop only notices the lock on its next tick
+    reply = server.dispatch({'op': 'encrypt', 'plaintext': 'x'})
+    assert not reply['ok'] and 'locked' in reply['error']
+
+
+def test_backup_skips_a_running_agents_socket(workdir):
+    backup = BackupManager(_Sealer(), Database())
+    server = AgentServer(_Sealer())
+    server.bind()
+    try:
+        assert os.path.exists(server.path)
+        path = backup.create_backup()
+    finally:
+        server._server.server_close()
+    assert os.path.exists(path)
+
+
+def test_lock_running_agent_refuses_a_dead_socket(workdir):
+    assert lock_running_agent(str(workdir / 'none.sock')) is False
+    path = str(workdir / 'dead.sock')
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.close()
+    with pytest.raises(ConnectionError):
+        lock_running_agent(path)
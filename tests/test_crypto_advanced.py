@@ -0,0 +1,47 @@
+import pytest
+
+from core.crypto_advanced import AdvancedCrypto, ProviderKeyring
+from core.database import Database
+
+KEK = b'\x02' * 32
+WRONG_KEK = b'\x03' * 32
+LEGACY_ID = b'\x01' * 4
+
+
+def test_wipe_zeroes_the_key_encryption_key(workdir):
+    keyring = ProviderKeyring(Database(), KEK)
+    key_id, key = keyring.data_key('github')
+    assert keyring.key_for(key_id) == key
+    crypto = keyring._crypto
+    keyring.wipe()
+    assert keyring._crypto is None
+    assert crypto.master_key == bytearray(32)
+    assert crypto.cache_info()['size'] == 0
+
+
+def test_wrong_key_cannot_store_data_keys(workdir):
+    db = Database()
+    # opened while the table is still empty, so only creating a key can catch it
+    early = ProviderKeyring(db, WRONG_KEK, LEGACY_ID)
+    ProviderKeyring(db, KEK, LEGACY_ID).data_key('github')
+    with pytest.raises(ValueError):
+        early.data_key('gitlab')
+    with pytest.raises(ValueError):
+        ProviderKeyring(db, WRONG_KEK, LEGACY_ID)
+    keyring = ProviderKeyring(db, KEK, LEGACY_ID)
+    key_id, key = keyring.data_key('gitlab')
+    assert keyring.check() and keyring.key_for(key_id) == key
+
+
+def test_legacy_rows_are_adopted_and_strays_ignored(workdir):
+    db = Database()
+    legacy = LEGACY_ID.hex()
+    db.add_provider_key('aaaaaaaa', 'github', legacy, AdvancedCrypto(KEK).wrap_provider_key(b'\x04' * 32))
+    # written by a session that mistyped the password
+    db.add_provider_key('bbbbbbbb', 'gitlab', legacy, AdvancedCrypto(WRONG_KEK).wrap_provider_key(b'\x05' * 32))
+    keyring = ProviderKeyring(db, KEK, LEGACY_ID)
+    assert keyring.key_for('aaaaaaaa') == b'\x04' * 32
+    key_id, key = keyring.data_key('gitlab')
+    assert key_id != 'bbbbbbbb' and keyring.key_for(key_id) == key
+    with pytest.raises(ValueError):
+        ProviderKeyring(db, WRONG_KEK, LEGACY_ID)
@@ -0,0 +1,83 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+from core.database import Database
+
+# metadata, categories and settings as they were before the FTS index, expiry epochs
+# and provider keys were added
+LEGACY_SCHEMA = '''
+    CREATE TABLE metadata (
+        category TEXT NOT NULL,
+        provider TEXT NOT NULL,
+        config_name TEXT NOT NULL,
+        info TEXT,
+        blob BLOB,
+        updated_at TIMESTAMP,
+        favorite INTEGER DEFAULT 0,
+        notes TEXT,
+        expires_at TIMESTAMP,
+        PRIMARY KEY (category, provider, config_name)
+    );
+    CREATE TABLE categories (name TEXT PRIMARY KEY, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+    CREATE TABLE settings (key TEXT PRIMARY KEY, value TEXT);
+'''
+
+
+def _write_legacy_db(path, expires_at):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executescript(LEGACY_SCHEMA)
+        conn.execute("INSERT INTO metadata (category, provider, config_name, info, notes, expires_at) "
+                     "VALUES ('tokens', 'github', 'ci', '{}', 'deploy key', ?)", (expires_at,))
+    conn.close()
+
+
+def test_reload_upgrades_a_restored_legacy_database(workdir):
+    db = Database()
+    # what BackupManager.restore_backup does: close, replace the file, reload
+    db.close()
+    for suffix in ('', '-wal', '-shm'):
+        path = workdir / (Database.SQLITE_FILE + suffix)
+        if path.exists():
+            path.unlink()
+    soon = (datetime.now(timezone.utc) + timedelta(days=2)).isoformat()
+    _write_legacy_db(Database.SQLITE_FILE, soon)
+    db.reload()
+
+    assert [row['config_name'] for row in db.search_entries('deploy')] == ['ci']
+    assert [row['config_name'] for row in db.get_expiring_entries(7)] == ['ci']
+    assert db.list_provider_keys('any') == []
+    db.close()
+
+
+def test_connections_of_finished_threads_are_closed(workdir):
+    db = Database(cache_size=0)
+    for _ in range(20):
+        thread = threading.Thread(target=db.list_categories)
+        thread.start()
+        thread.join()
+    # this thread's connection and the last worker's, which the next new thread prunes
+    assert len(db._connections) == 2
+    db.close()
+
+
+def test_compaction_keeps_records_other_instances_appended(workdir):
+    first, second = Database(), Database()
+    first.set('api', 'github_prod', {'region': 'eu'})
+    second.set('api', 'gitlab_ci', {'region': 'us'})
+    first.compact()
+    assert set(Database().list_all()['api']) == {'github_prod', 'gitlab_ci'}
+    first.close()
+    second.close()
+
+
+def test_writes_after_another_instance_compacted_reach_the_new_journal(workdir):
+    first, second = Database(), Database()
+    second.set('api', 'gitlab_ci', {})
+    second.compact()
+    first.set('api', 'github_prod', {})
+    assert set(first.list_all()['api']) == {'github_prod', 'gitlab_ci'}
+    assert set(Database().list_all()['api']) == {'github_prod', 'gitlab_ci'}
+    first.close()
+    second.close()
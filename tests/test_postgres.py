@@ -0,0 +1,73 @@
+import os
+import glob
+import shutil
+import subprocess
+
+import pytest
+
+pytest.importorskip('psycopg2')
+
+from core.postgres import PostgresDatabase, qmark_to_pyformat  # noqa: E402
+
+# point this at a scratch database to run the server tests against an existing server
+DSN_ENV = 'SEQ_TEST_PG_DSN'
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('SELECT ? WHERE a = ?', 'SELECT %s WHERE a = %s'),
+    ("SELECT 'what?' WHERE a LIKE 'a%' AND b = ?", "SELECT 'what?' WHERE a LIKE 'a%%' AND b = %s"),
+    ("SELECT 'it''s ?', \"col?\" FROM t WHERE c = ?", "SELECT 'it''s ?', \"col?\" FROM t WHERE c = %s"),
+    ('SELECT 5 % ? -- why?\nFROM t /* ? */', 'SELECT 5 %% %s -- why?\nFROM t /* ? */'),
+])
+def test_qmark_to_pyformat(query, expected):
+    assert qmark_to_pyformat(query) == expected
+
+
+def _tool(name):
+    found = shutil.which(name) or sorted(glob.glob(f'/usr/lib/postgresql/*/bin/{name}'))
+    return found if isinstance(found, str) else (found[-1] if found else None)
+
+
+@pytest.fixture(scope='module')
+def dsn(tmp_path_factory):
+    if os.environ.get(DSN_ENV):
+        yield os.environ[DSN_ENV]
+        return
+    initdb, pg_ctl = _tool('initdb'), _tool('pg_ctl')
+    if not initdb or not pg_ctl or os.geteuid() == 0:
+        pytest.skip(f'no PostgreSQL server: set {DSN_ENV} or install initdb/pg_ctl (not as root)')
+    cluster = tmp_path_factory.mktemp('pg')
+    data = str(cluster / 'data')
+    subprocess.run([initdb, '-D', data, '-A', 'trust', '-U', 'postgres'], check=True, capture_output=True)
+    subprocess.run([pg_ctl, '-D', data, '-l', str(cluster / 'log'), '-w',
+                    '-o', f"-k {cluster} -c listen_addresses=''", 'start'], check=True, capture_output=True)
+    try:
+        yield f'host={cluster} dbname=postgres user=postgres'
+    finally:
+        subprocess.run([pg_ctl, '-D', data, '-m', 'immediate', 'stop'], capture_output=True)
+
+
+@pytest.fixture
+def pg(dsn, workdir):
+    db = PostgresDatabase(pg_conn_str=dsn, cache_size=0, pool_size=1)
+    with db._transaction() as conn:
+        conn.cursor().execute('TRUNCATE metadata, settings')
+    yield db
+    db.close()
+
+
+def test_literal_question_marks_and_percents(pg):
+    rows = list(pg._stream("SELECT ? || 'what?' WHERE 'abc' LIKE 'a%'", ('so ',)))
+    assert rows == [('so what?',)]
+
+
+def test_writes_while_iterating_share_one_connection(pg):
+    pg.bulk_upsert({'category': 'tokens', 'provider': 'p', 'config_name': f'c{i:04d}', 'info': {}}
+                   for i in range(pg.PAGE_SIZE * 2 + 10))
+    # with a pool of one, a second checkout for the stream would block forever
+    seen = 0
+    for entry in pg.iter_entries():
+        pg.set_setting('last', entry['config_name'])
+        seen += 1
+    assert seen == pg.PAGE_SIZE * 2 + 10
+    assert pg.get_setting('last') == f'c{seen - 1:04d}'
@@ -0,0 +1,29 @@
+from core.database import Database
+from core.rotation import EnvelopeUpgrader
+from core.security import EncryptionManager
+
+
+class _Encryption:
+    """Reports every blob as legacy and records what it is asked to decrypt."""
+
+    def __init__(self):
+        self.decrypted = []
+
+    def is_current(self, ciphertext):
+        return False
+
+    def decrypt_many(self, blobs, strict=True):
+        self.decrypted.extend(blobs)
+        return [None] * len(blobs)
+
+
+def test_upgrader_never_reads_provider_key_blobs(workdir):
+    db = Database()
+    db.set_blob_bytes('api', 'github', 'default', EncryptionManager.PROVIDER_KEY_PREFIX + b'sealed')
+    enc = _Encryption()
+    assert EnvelopeUpgrader(db, enc).run() == 0
+    assert enc.decrypted == []
+
+    db.set_blob_bytes('api', 'gitlab', 'default', EncryptionManager.FERNET_PREFIX + b'legacy')
+    EnvelopeUpgrader(db, enc).run()
+    assert enc.decrypted == [EncryptionManager.FERNET_PREFIX + b'legacy']
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from core.database import Database, RUST_AVAILABLE
+
+pytestmark = pytest.mark.skipif(not RUST_AVAILABLE, reason='rust_core is not built')
+
+# every read that Database routes through rust_core
+READS = {
+    'get_blob_entry': lambda db: db.get_blob_entry('apis', 'provider1', 'config1'),
+    'get_blob_entry[missing]': lambda db: db.get_blob_entry('apis', 'provider1', 'nope'),
+    'get_blob_bytes': lambda db: db.get_blob_bytes('apis', 'provider1', 'config1'),
+    'list_categories': lambda db: db.list_categories(),
+    'get_setting': lambda db: db.get_setting('theme'),
+    'get_setting[default]': lambda db: db.get_setting('missing', 'fallback'),
+    'get_all_entries': lambda db: db.get_all_entries(),
+    'get_all_entries[tokens]': lambda db: db.get_all_entries('tokens'),
+}
+
+
+def populate(db: Database, entries: int):
+    db.add_category('ssh')
+    db.set_setting('theme', 'dark')
+    db.bulk_upsert({
+        'category': ('tokens', 'apis', 'ssh')[i % 3],
+        'provider': f'provider{i % 50}',
+        'config_name': f'config{i}',
+        'info': {'index': i, 'tags': ['parity', str(i % 7)]},
+        'blob': os.urandom(64),
+        'favorite': i % 11 == 0,
+        'notes': f'note {i}' if i % 2 else None,
+        'expires_at': f'2030-01-{i % 28 + 1:02d}T00:00:00' if i % 5 == 0 else None,
+    } for i in range(entries))
+
+
+@pytest.fixture(scope='module')
+def db(tmp_path_factory):
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('parity'))
+    db = Database(cache_size=0)
+    populate(db, 500)
+    yield db
+    db.close()
+    os.chdir(cwd)
+
+
+@pytest.mark.parametrize('read', READS.values(), ids=list(READS))
+def test_rust_matches_python(db, read):
+    db._use_rust = False
+    expected = read(db)
+    db._use_rust = True
+    assert read(db) == expected
@@ -0,0 +1,70 @@
+import sqlite3
+
+from core import scanner
+from core.scanner import ScanCache, scan_directory
+
+TOKEN = 'ghp_' + 'a1B2' * 9
+
+
+def _tree(root):
+    (root / 'src').mkdir()
+    (root / 'src' / 'leak.py').write_text(f'TOKEN = "{TOKEN}"\n')
+    (root / 'src' / 'clean.py').write_text('x = 1\n')
+    return root / 'src'
+
+
+def _dump(path):
+    conn = sqlite3.connect(path)
+    try:
+        return '\n'.join(line for line in conn.iterdump())
+    finally:
+        conn.close()
+
+
+def test_cache_never_stores_hits(workdir):
+    src = _tree(workdir)
+    cache_path = str(workdir / 'cache.db')
+    first = scan_directory(str(src), cache=ScanCache(cache_path))
+    second = scan_directory(str(src), cache=ScanCache(cache_path))
+    assert [hit[1:] for hit in first] == [hit[1:] for hit in second] == [('GitHub PAT', TOKEN)]
+    dump = _dump(cache_path)
+    assert TOKEN not in dump
+    assert 'clean.py' in dump and 'leak.py' not in dump
+
+
+def test_cache_drops_legacy_results(workdir):
+    cache_path = str(workdir / 'cache.db')
+    conn = sqlite3.connect(cache_path)
+    with conn:
+        conn.execute('CREATE TABLE files (path TEXT PRIMARY KEY, inode INTEGER, size INTEGER, '
+                     'mtime_ns INTEGER, digest TEXT)')
+        conn.execute('CREATE TABLE results (digest TEXT PRIMARY KEY, hits TEXT)')
+        conn.execute('INSERT INTO results VALUES (?, ?)', ('d', f'[["GitHub PAT", "{TOKEN}", 0]]'))
+    conn.close()
+    ScanCache(cache_path).close()
+    with open(cache_path, 'rb') as f:
+        assert TOKEN.encode() not in f.read()
+
+
+def test_uncached_scan_does_not_hash(workdir, monkeypatch):
+    src = _tree(workdir)
+
+    def fail(path):
+        raise AssertionError(f'hashed {path}')
+
+    monkeypatch.setattr(scanner, '_digest', fail)
+    assert [hit[1:] for hit in scan_directory(str(src), cache=False)] == [('GitHub PAT', TOKEN)]
+
+
+def test_subdirectory_scan_uses_the_repository_ignore_rules(workdir):
+    (workdir / '.git' / 'info').mkdir(parents=True)
+    (workdir / '.git' / 'info' / 'exclude').write_text('local.py\n')
+    (workdir / '.gitignore').write_text('*.env\nbuild/\n/src/anchored.py\n')
+    src = _tree(workdir)
+    for name in ('local.py', 'prod.env', 'anchored.py'):
+        (src / name).write_text(f'TOKEN = "{TOKEN}"\n')
+    (workdir / 'build').mkdir()
+    (workdir / 'build' / 'out.py').write_text(f'TOKEN = "{TOKEN}"\n')
+    hits = scan_directory(str(src), cache=False)
+    assert [hit[0] for hit in hits] == [str(src / 'leak.py')]
+    assert scan_directory(str(workdir / 'build'), cache=False) == []
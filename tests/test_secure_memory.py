@@ -0,0 +1,17 @@
+import os
+
+import pytest
+
+from core.secure_memory import SecureArena
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork()')
+def test_arena_secrets_survive_a_forked_process_freeing_them():
+    arena = SecureArena(slots=4)
+    handle = arena.alloc(b'secret')
+    pid = os.fork()
+    if pid == 0:
+        arena.free(handle)
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert arena.read(handle) == b'secret'